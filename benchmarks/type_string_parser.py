@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2019 Cody J. Hanson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Benchmarks parsing pg_table_def type strings, as every catalog reflection does.
+
+The catalog is a synthetic dump with the mix of types of a typical warehouse:
+mostly varchars of a few hundred distinct lengths, then integers, timestamps,
+decimals and booleans. It's parsed once by trying every type's
+from_pg_table_def in turn, as get_type_from_string used to, and once with
+the memoized TypeStringParser.
+
+Usage (with schematic installed): python benchmarks/type_string_parser.py [number of columns]
+"""
+import random
+import sys
+import timeit
+from schematic.schematics.redshift_schematic import *
+
+TYPE_WEIGHTS = [
+    (lambda: "character varying({})".format(random.choice([32, 64, 256, 512, 65535] +
+                                                          list(range(1, 300)))), 40),
+    (lambda: "bigint", 12),
+    (lambda: "integer", 10),
+    (lambda: "smallint", 3),
+    (lambda: "timestamp without time zone", 10),
+    (lambda: "timestamp with time zone", 3),
+    (lambda: "date", 5),
+    (lambda: "numeric({},{})".format(random.choice([10, 12, 18, 38]),
+                                     random.choice([0, 2, 4, 6])), 8),
+    (lambda: "double precision", 3),
+    (lambda: "real", 1),
+    (lambda: "boolean", 4),
+    (lambda: "character({})".format(random.choice([1, 2, 3, 8, 36])), 1)]
+
+
+def catalog_type_strings(columns):
+    random.seed(0)
+    makers, weights = zip(*TYPE_WEIGHTS)
+    return [maker() for maker in random.choices(makers, weights, k=columns)]
+
+
+def parse_by_lattice(type_strings):
+    column_types = list(TYPE_STRING_PARSER.column_types.values())
+    for type_string in type_strings:
+        for column_type in column_types:
+            try:
+                column_type.from_pg_table_def(type_string)
+                break
+            except ValueError:
+                continue
+
+
+def parse_memoized(type_strings):
+    parser = TypeStringParser(list(TYPE_STRING_PARSER.column_types.values()))
+    for type_string in type_strings:
+        parser.parse(type_string)
+
+
+if __name__ == "__main__":
+    columns = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    type_strings = catalog_type_strings(columns)
+    print("{} columns, {} distinct type strings".format(columns, len(set(type_strings))))
+    for name, parse in [("lattice", parse_by_lattice), ("memoized", parse_memoized)]:
+        seconds = min(timeit.repeat(lambda: parse(type_strings), number=1, repeat=5))
+        print("{:>8}: {:.3f}s ({:.0f} columns/s)".format(name, seconds, columns / seconds))
@@ -21,5 +21,7 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 from .common import *
+from .sketches import *
 from .base import *
+from .validate import *
 from .cli import *
@@ -21,11 +21,17 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 import click
+import csv
+import itertools
+import tempfile
+import time
+from collections import Counter
 from psycopg2 import sql
 from abc import ABC
 from csv import DictReader
 from queue import Queue
-from schematic import NameSqlMixin, DictableMixin
+from schematic import (NameSqlMixin, DictableMixin, DistinctBudget, DistinctTracker,
+                       DEFAULT_DISTINCT_MEMORY_LIMIT)
 
 
 class ColumnTypeNotFoundError(Exception):
@@ -47,6 +53,9 @@ class TableColumnType(ABC, NameSqlMixin, DictableMixin):
       name: The name of the type
       next_less_restrictive: The TableColumnType which is next less restrictive
       parameter: Instance parameter for this class. E.g., '256' for a VARCHAR(256)
+      formats: Sequence of (format, validator) tuples for the formats values of this
+               type can be written in, e.g. ('YYYY-MM-DD', re.compile(...).match).
+               Each validator returns a truthy value for values in its format.
 
     TODO(Cody): Comparisons of incomparable operands should raise an exception
     TODO(Cody): Factor out the "most to least restrictive" iterator logic into a method on this class.
@@ -55,6 +64,7 @@ class TableColumnType(ABC, NameSqlMixin, DictableMixin):
     name = "TableColumnType"
     next_less_restrictive = None
     parameterized = False
+    formats = ()
 
     def __init__(self, parameter=None):
         if parameter is not None and not self.parameterized:
@@ -87,6 +97,78 @@ class TableColumnType(ABC, NameSqlMixin, DictableMixin):
                 return True
         return False
 
+    @classmethod
+    def lattice(cls):
+        """Get this class and the classes above it in the
+        next_less_restrictive linked list, most restrictive first.
+
+        Returns:
+          A list of TableColumnType classes
+        """
+        classes = []
+        nlr = cls
+        while nlr:
+            classes.append(nlr)
+            nlr = nlr.next_less_restrictive
+        return classes
+
+    @classmethod
+    def holding(cls, *column_types):
+        """Get the most restrictive instance of this class that can
+        hold every value of the given types.
+
+        Args:
+          column_types: TableColumnType instances whose classes are at or below
+                        this class in the next_less_restrictive linked list
+        Returns:
+          An instance of this class, or None if no instance can hold them all
+        Raises:
+          NotImplementedError: Parameterized subclasses should implement this.
+        """
+        if cls.parameterized:
+            raise NotImplementedError
+        return cls()
+
+    def common_type(self, other):
+        """Get the most restrictive type that can hold every value of
+        this type and of other, e.g. for widening a column of this type
+        so it also fits values of other.
+
+        Args:
+          other: A TableColumnType
+        Returns:
+          A TableColumnType, or None if the types have no common type
+        """
+        other_lattice = type(other).lattice()
+        for column_type in type(self).lattice():
+            if column_type in other_lattice:
+                common = column_type.holding(self, other)
+                if common is not None:
+                    return common
+        return None
+
+    def can_hold(self, other):
+        """Check whether every value of type other fits in this type.
+
+        Args:
+          other: A TableColumnType
+        Returns:
+          A bool
+        """
+        common_type = self.common_type(other)
+        return common_type is not None and common_type.is_same(self)
+
+    def is_same(self, other):
+        """Check whether other is exactly this type, comparing every attribute
+        rather than just the parameter as == does.
+
+        Args:
+          other: A TableColumnType
+        Returns:
+          A bool
+        """
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
     def get_depth(self):
         """Get the distance between this TableColumnType
         and the least restrictive TableColumnType in its
@@ -167,6 +249,22 @@ class TableColumnType(ABC, NameSqlMixin, DictableMixin):
         else:
             return cls()
 
+    def converter(self, datetime_format=None):
+        """Compile a function that converts values of this type from strings
+        to Python objects, so rows can be converted without checking each
+        value's type.
+
+        Args:
+          datetime_format: For date and time types, the format every value
+                           is written in, or None if unknown
+        Returns:
+          A function from a non-null string value to a Python object,
+          raising ValueError for values that don't fit this type. Subclasses
+          should override this; by default values are left as strings.
+        """
+        return str
+
+
 class TableColumn(ABC, DictableMixin, NameSqlMixin):
     """DB-agnostic base class for storing info about a column in a table.
 
@@ -189,6 +287,14 @@ class TableColumn(ABC, DictableMixin, NameSqlMixin):
         return isinstance(self, type(
             other)) and self.name == other.name and self.column_type == other.column_type
 
+    def converter(self):
+        """Compile a function that converts this column's values from strings.
+
+        Returns:
+          A function, see TableColumnType.converter
+        """
+        return self.column_type.converter()
+
 
 class TableDefinition(ABC, DictableMixin, NameSqlMixin):
     """DB-agnostic base class for storing info about a table
@@ -266,6 +372,80 @@ class TableDefinition(ABC, DictableMixin, NameSqlMixin):
         """Get a list of column names for this table."""
         return [col.name for col in self.columns]
 
+    def get_column(self, name):
+        """Get the column with the given name, ignoring case.
+
+        Returns:
+          A TableColumn, or None if there's no such column
+        """
+        for col in self.columns:
+            if col.name.upper() == name.upper():
+                return col
+        return None
+
+    def diff(self, other):
+        """Compare this table with the columns another definition of it needs,
+        e.g. one inferred from a new file for a table reflected from the database.
+
+        Columns of this table that other doesn't have are left alone.
+
+        Args:
+          other: A TableDefinition
+        Returns:
+          A list of ColumnChanges, in the order of other's columns
+        Raises:
+          ValueError: If a column's existing and needed types have no common type
+        """
+        changes = []
+        for column in other.columns:
+            existing = self.get_column(column.name)
+            if existing is None:
+                changes.append(ColumnChange(column.name, None, column, column.column_type))
+                continue
+            column_type = existing.column_type.common_type(column.column_type)
+            if column_type is None:
+                raise ValueError("No type can hold both {} and {} for column {}".format(
+                    existing.column_type, column.column_type, column.name))
+            if not column_type.is_same(existing.column_type):
+                changes.append(ColumnChange(existing.name, existing, column, column_type))
+        return changes
+
+    def null_string_sets(self):
+        """Get the values to treat as null for each column.
+
+        Returns:
+          A list of frozensets, one for each column. Empty by default.
+        """
+        return [frozenset() for column in self.columns]
+
+    def converters(self):
+        """Compile a converter for each column, see TableColumnType.converter.
+
+        Returns:
+          A tuple of functions, one for each column
+        """
+        return tuple(column.converter() for column in self.columns)
+
+    def typed_rows(self, rows):
+        """Convert rows of string values, e.g. from get_rows() of the
+        definition this one was inferred from, to Python objects of each
+        column's type. Null strings are converted to None.
+
+        The converters are compiled once, so each value is converted with a
+        single call rather than by checking its column's type.
+
+        Args:
+          rows: An iterable of tuples of string values, in column order
+        Yields:
+          Tuples of converted values
+        Raises:
+          ValueError: If a value doesn't fit its column's type
+        """
+        columns = tuple(zip(self.converters(), self.null_string_sets()))
+        for row in rows:
+            yield tuple(None if value in null_strings else convert(value)
+                        for (convert, null_strings), value in zip(columns, row))
+
     def get_rows(self, *args, **kwargs):
         """Generator for rows of the table described by this TableDefinition.
 
@@ -277,6 +457,15 @@ class TableDefinition(ABC, DictableMixin, NameSqlMixin):
         """
         raise NotImplementedError
 
+    def load_rows(self, *args, **kwargs):
+        """Load rows into the table described by this TableDefinition
+            in the destination specified in *args and **kwargs
+
+        Raises:
+          NotImplementedError: Subclasses should implement this.
+        """
+        raise NotImplementedError
+
     @classmethod
     def from_source(cls, *args, **kwargs):
         """Instantiate from an implementation-specific source (e.g., a CSV file or a DB connection
@@ -287,6 +476,439 @@ class TableDefinition(ABC, DictableMixin, NameSqlMixin):
         raise NotImplementedError
 
 
+class ColumnChange(DictableMixin):
+    """A change a table needs to fit another definition of it (see TableDefinition.diff).
+
+    Attributes:
+      name: The name of the column
+      existing: The existing TableColumn, or None if the column needs to be added
+      required: The TableColumn the other definition has
+      column_type: The TableColumnType the column needs, which can hold
+                   the values of both the existing and required types
+    """
+
+    def __init__(self, name, existing, required, column_type):
+        self.name = name
+        self.existing = existing
+        self.required = required
+        self.column_type = column_type
+
+    def is_addition(self):
+        return self.existing is None
+
+    def __repr__(self):
+        if self.is_addition():
+            return "add {} {}".format(self.name, self.column_type)
+        return "widen {} {} -> {}".format(self.name, self.existing.column_type,
+                                         self.column_type)
+
+
+class LoadStats(DictableMixin):
+    """Running totals for rows loaded into a table.
+
+    Attributes:
+      rows: The number of rows loaded
+      bytes: The number of bytes of data loaded
+      batches: The number of batches the rows were loaded in
+      seconds: Seconds between starting the load and the end of the latest batch
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.bytes = 0
+        self.batches = 0
+        self.seconds = 0.0
+        self._started = time.monotonic()
+
+    def to_dict(self):
+        return {k: v for k, v in vars(self).items() if not k.startswith("_")}
+
+    def add_batch(self, rows, num_bytes):
+        """Record a batch that finished loading.
+
+        Args:
+          rows: The number of rows in the batch
+          num_bytes: The size of the batch's data, in bytes
+        """
+        self.rows += rows
+        self.bytes += num_bytes
+        self.batches += 1
+        self.seconds = time.monotonic() - self._started
+
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def bytes_per_second(self):
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+
+class AdaptiveBatchSize(DictableMixin):
+    """Tunes the size of each batch of a load from how fast the batches go.
+
+    Starting small, the size grows by growth after every batch that moves
+    more bytes per second than the best batch so far by at least plateau,
+    up to max_size. Once throughput stops improving, the size settles on the
+    best one seen. Batches slower than slow_seconds and errors (see backoff)
+    shrink it again, down to min_size. One instance can be reused across
+    loads into the same cluster, so what it learned carries over.
+
+    Attributes:
+      size: The size of the next batch, in bytes
+      settled: Whether throughput has stopped improving
+      batches: A list of dicts describing each batch recorded, newest last
+    """
+
+    def __init__(self,
+                 initial_size=1024 * 1024,
+                 min_size=64 * 1024,
+                 max_size=256 * 1024 * 1024,
+                 growth=2.0,
+                 plateau=0.05,
+                 slow_seconds=60.0,
+                 max_history=100):
+        """
+        Args:
+          initial_size: The size of the first batch, in bytes
+          min_size: The smallest batch to back off to, in bytes
+          max_size: The largest batch to grow to, in bytes, e.g. to cap memory use
+          growth: What to multiply the size by while throughput improves
+          plateau: The fraction by which throughput has to improve to keep growing
+          slow_seconds: How long a batch can take before the size is cut back
+          max_history: The number of batches to keep in batches
+        """
+        self.min_size = min(min_size, max_size)
+        self.max_size = max_size
+        self.size = self._clamp(initial_size)
+        self.growth = growth
+        self.plateau = plateau
+        self.slow_seconds = slow_seconds
+        self.max_history = max_history
+        self.settled = False
+        self.best_size = None
+        self.best_bytes_per_second = 0.0
+        self.batches = []
+
+    def _clamp(self, size):
+        return int(max(self.min_size, min(size, self.max_size)))
+
+    def record(self, rows, num_bytes, seconds):
+        """Record a batch that finished loading and choose the next size.
+
+        Args:
+          rows: The number of rows in the batch
+          num_bytes: The size of the batch's data, in bytes
+          seconds: How long the batch took to load
+        """
+        bytes_per_second = num_bytes / seconds if seconds else float("inf")
+        self.batches.append({"size": self.size,
+                             "rows": rows,
+                             "bytes": num_bytes,
+                             "seconds": seconds,
+                             "rows_per_second": rows / seconds if seconds else float("inf"),
+                             "bytes_per_second": bytes_per_second})
+        del self.batches[:-self.max_history]
+        if seconds > self.slow_seconds:
+            self.backoff()
+            return
+        # A batch the buffer didn't fill says nothing about the size
+        if num_bytes < self.size / 2:
+            return
+        if bytes_per_second > self.best_bytes_per_second * (1 + self.plateau):
+            self.best_bytes_per_second = bytes_per_second
+            self.best_size = self.size
+            if not self.settled:
+                self.size = self._clamp(self.size * self.growth)
+        elif not self.settled:
+            self.settled = True
+            self.size = self.best_size
+
+    def backoff(self):
+        """Cut the size back after an error or a slow batch, and start
+        looking for the best size again from there."""
+        self.size = self._clamp(self.size / self.growth)
+        self.settled = False
+        self.best_size = None
+        self.best_bytes_per_second = 0.0
+
+
+class MergeStats(LoadStats):
+    """Running totals for rows merged into a table.
+
+    Attributes:
+      replaced: The number of existing rows the merge replaced
+    """
+
+    def __init__(self):
+        super(MergeStats, self).__init__()
+        self.replaced = 0
+
+    def add_stats(self, other):
+        """Add the totals of a schematic.LoadStats for rows loaded as part of the merge."""
+        self.rows += other.rows
+        self.bytes += other.bytes
+        self.batches += other.batches
+        self.seconds = time.monotonic() - self._started
+
+
+class ColumnProfile(DictableMixin):
+    """Statistics gathered about a column while scanning its values.
+
+    Attributes:
+      name: The name of the column
+      column_type: The most restrictive TableColumnType that fits every
+                   non-null value seen so far
+      row_count: The number of values seen
+      null_count: The number of values seen that were null strings
+      distinct: A schematic.DistinctTracker for the non-null values,
+                or None if distinct values aren't being tracked
+      tolerance: The number (an int) or fraction of rows (a float) whose values
+                 may be rejected rather than widening column_type, or None to
+                 never reject values
+      max_rejects: The most values sampled for each group of types that may
+                   be rejected, if tolerance is a fraction
+      buckets: list of TypeBuckets for the non-null values, most restrictive first,
+               or None if this column has no tolerance
+      samples: A temporary file of bucket_index,row_number,value records for the
+               values of the buckets that may be rejected, so they needn't be kept
+               in memory, or None until a value is sampled
+      rejected: set of the indexes of the buckets whose values are rejected
+      format_candidates: list of (format, validator) tuples for the formats that
+                         every non-null value seen so far is written in
+      value_format: The format every value is written in, if column_type has formats
+                    and there is a consistent one. Set once the scan finishes.
+      null_strings: frozenset of the values treated as null in this column
+      detected_null_strings: list of the values detected as null sentinels
+                             for this column, in addition to the Schematic's
+    """
+
+    def __init__(self, name, distinct=None, tolerance=None, max_rejects=100000,
+                 null_strings=(), detected_null_strings=()):
+        if isinstance(tolerance, float) and not 0 <= tolerance <= 1:
+            raise ValueError(
+                "Fractional tolerance for column {} must be between 0 and 1".format(name))
+        if isinstance(tolerance, int) and tolerance < 0:
+            raise ValueError(
+                "Tolerance for column {} cannot be negative".format(name))
+        self.name = name
+        self.column_type = None
+        self.row_count = 0
+        self.null_count = 0
+        self.distinct = distinct
+        self.tolerance = tolerance
+        self.max_rejects = tolerance if isinstance(
+            tolerance, int) else max_rejects
+        self.buckets = None if tolerance is None else []
+        self.samples = None
+        self.samples_writer = None
+        self.rejected = set()
+        self.format_candidates = []
+        self.value_format = None
+        self.detected_null_strings = list(detected_null_strings)
+        self.null_strings = frozenset(null_strings).union(detected_null_strings)
+
+    def reject_limit(self):
+        """The maximum number of values that may be rejected, given
+        the number of values seen so far.
+
+        Returns:
+          An int, or None if this column has no tolerance
+        """
+        if self.tolerance is None:
+            return None
+        if isinstance(self.tolerance, float):
+            return int(self.tolerance * self.row_count)
+        return self.tolerance
+
+    def sample(self, bucket, row_number, value):
+        """Keep a value of a bucket in case the bucket is rejected.
+
+        Args:
+          bucket: The TypeBucket the value was added to
+          row_number: The row number of the value
+          value: The value
+        """
+        if bucket.sampled:
+            if self.samples is None:
+                self.samples = tempfile.TemporaryFile(
+                    mode="w+", encoding="utf-8", newline="")
+                self.samples_writer = csv.writer(self.samples)
+            self.samples_writer.writerow((bucket.index, row_number, value))
+
+    def iter_rejects(self):
+        """Iterate through the values of the rejected buckets, in row order.
+
+        Yields:
+          (row_number, value) tuples
+        """
+        if not self.rejected:
+            return
+        self.samples.seek(0)
+        for index, row_number, value in csv.reader(self.samples):
+            if int(index) in self.rejected:
+                yield int(row_number), value
+
+    def close(self):
+        """Discard the samples kept for rejecting values."""
+        if self.samples is not None:
+            self.samples.close()
+            self.samples = self.samples_writer = None
+
+    def is_notnull(self):
+        """Whether values were seen and none of them were null."""
+        return self.row_count > 0 and self.null_count == 0
+
+    def is_unique(self):
+        """Whether every non-null value seen was distinct.
+
+        Returns:
+          A boolean, always False if distinct values aren't being tracked
+        """
+        return self.distinct is not None and self.distinct.is_unique()
+
+
+def narrow_formats(candidates, value):
+    """Filter format candidates down to the ones a value is written in.
+
+    Args:
+      candidates: list of (format, validator) tuples
+      value: The value to check
+    Returns:
+      A list of (format, validator) tuples. candidates itself if the value
+      is written in every one of them.
+    """
+    for _, validator in candidates:
+        if not validator(value):
+            return [(f, v) for f, v in candidates if v(value)]
+    return candidates
+
+
+class TypeBucket():
+    """The values of a column that share the most restrictive
+    group of types they fit into.
+
+    Attributes:
+      column_type: The TableColumnType that fits every value in this bucket
+      count: The number of values in this bucket
+      witnesses: The values that widened column_type
+      longest: The longest value. Together with the witnesses, it determines
+               the parameter of any type that all of these values fit into.
+      index: The position of this bucket in the order the buckets were created
+      refinements: list of instances of the types one step more restrictive than
+                   column_type that have no bucket of their own. A value belongs
+                   in this bucket only if it fits none of them.
+      sampled: Whether every value in this bucket has been sampled, which
+               stops once there are more than max_samples of them
+      max_samples: The most values to sample
+      format_candidates: list of (format, validator) tuples for the formats that
+                         every value in this bucket is written in
+    """
+
+    def __init__(self, column_type, max_samples, format_candidates=(), index=0):
+        self.column_type = column_type
+        self.count = 0
+        self.witnesses = []
+        self.longest = ""
+        self.index = index
+        self.refinements = []
+        self.sampled = True
+        self.max_samples = max_samples
+        self.format_candidates = list(format_candidates)
+
+    def add(self, row_number, value, column_type):
+        """Add a value to this bucket.
+
+        Args:
+          row_number: The row number of the value
+          value: The value
+          column_type: The TableColumnType for this bucket including the value
+        """
+        self.count += 1
+        if column_type is not self.column_type or not self.witnesses:
+            self.column_type = column_type
+            self.witnesses.append(value)
+        if len(value) > len(self.longest):
+            self.longest = value
+        if self.format_candidates:
+            self.format_candidates = narrow_formats(
+                self.format_candidates, value)
+        if self.sampled and self.count > self.max_samples:
+            self.sampled = False
+
+    def representatives(self):
+        """The values that determine the parameter of any type that all
+        of this bucket's values fit into.
+
+        Returns:
+          A list of values
+        """
+        return self.witnesses + [self.longest]
+
+    def type_chain(self):
+        """Iterate through the classes of this bucket's type and every
+        less restrictive type.
+
+        Yields:
+          A TableColumnType subclass
+        """
+        nlr = type(self.column_type)
+        while nlr:
+            yield nlr
+            nlr = nlr.next_less_restrictive
+
+
+class RejectWriter():
+    """Streams values rejected during inference to a CSV file
+    of row_number,column,value records.
+
+    Row numbers are 1-indexed and don't count a header row.
+
+    Attributes:
+      handler: A writable text IO object, or None to only count rejects
+      counts: dict of column name -> number of values rejected from that column
+      row_numbers: set of the row numbers of rows with rejected values
+    """
+    fieldnames = ("row_number", "column", "value")
+
+    def __init__(self, handler=None, header=True):
+        self.handler = handler
+        self.writer = csv.writer(handler) if handler is not None else None
+        self.counts = {}
+        self.row_numbers = set()
+        if header and self.writer:
+            self.writer.writerow(self.fieldnames)
+
+    def write(self, column, rejects):
+        """Write the rejected values for a column.
+
+        Args:
+          column: The name of the column the values were rejected from
+          rejects: An iterable of (row_number, value) tuples
+        """
+        count = 0
+        for row_number, value in rejects:
+            if self.writer:
+                self.writer.writerow((row_number, column, value))
+            self.row_numbers.add(row_number)
+            count += 1
+        self.counts[column] = self.counts.get(column, 0) + count
+
+    def total(self):
+        """The number of values rejected from all columns."""
+        return sum(self.counts.values())
+
+    def filter_rows(self, rows):
+        """Skip the rows with rejected values.
+
+        Args:
+          rows: The same rows that were scanned, e.g. from TableDefinition.get_rows
+        Yields:
+          The rows without rejected values
+        """
+        for row_number, row in enumerate(rows, 1):
+            if row_number not in self.row_numbers:
+                yield row
+
+
 class Schematic(ABC, DictableMixin):
     """Interface for implementation specifics for a type of database or warehouse.
 
@@ -298,12 +920,17 @@ class Schematic(ABC, DictableMixin):
       name: Static attribute with the name of this schematic
       most_restrictive_types: the leaf nodes of the restrictivity tree
       table_def: implementation of TableDefinition for this schematic
+      null_strings: Values that are always treated as null
+      candidate_null_strings: Values that are treated as null in columns where
+                              they're detected as null sentinels.
+                              See detect_null_strings.
     """
     name = 'schematic'
     most_restrictive_types = []
     table_definition_class = TableDefinition
     column_class = TableColumn
     null_strings = []
+    candidate_null_strings = []
 
     def get_distance_from_leaf_node(self, column_type):
         """Get the distance between the given TableColumnType
@@ -376,6 +1003,46 @@ class Schematic(ABC, DictableMixin):
                     already_yielded.append(nlr.name)
                 nlr = nlr.next_less_restrictive
 
+    def value_formats(self):
+        """Get every format that values of the types in this Schematic can be written in.
+
+        Returns:
+          A list of (format, validator) tuples
+        """
+        formats = {}
+        for column_type in self.column_types():
+            for value_format, validator in column_type.formats:
+                formats.setdefault(value_format, validator)
+        return list(formats.items())
+
+    def detect_null_strings(self, values):
+        """Detect which candidate_null_strings are used as null sentinels
+        in a sample of a column's values.
+
+        A candidate is a sentinel if the column's other values all fit a
+        group of types that the candidate doesn't, i.e. if it would widen
+        the column's type. A column with no other non-null values has no
+        sentinels, so it's typed from its values as usual.
+
+        Args:
+          values: An iterable of values from a column
+        Returns:
+          A list of the candidate_null_strings used as null sentinels
+        """
+        candidates = Counter()
+        column_type = None
+        for value in values:
+            if value in self.null_strings:
+                continue
+            if value in self.candidate_null_strings:
+                candidates[value] += 1
+            else:
+                column_type = self.get_type(value, previous_type=column_type)
+        if column_type is None:
+            return []
+        return [candidate for candidate, _ in candidates.most_common()
+                if not column_type._value_is_compatible_superset(candidate)]
+
     def column_type_from_name(self, name):
         """Get the TableColumnTypeInstance described by the given name.
 
@@ -387,27 +1054,215 @@ class Schematic(ABC, DictableMixin):
         """
         raise NotImplementedError
 
-    def table_def_from_rows(self, name, fieldnames, rows, **kwargs):
+    def column_from_profile(self, profile, **kwargs):
+        """Instantiate a column from the statistics gathered for it.
+
+        Args:
+          profile: A ColumnProfile
+          kwargs: implementation-specific keyword arguments to pass as part of instantiation
+        Returns:
+          An instance of column_class
+        """
+        return self.column_class(profile.name, profile.column_type, **kwargs)
+
+    def columns_from_profiles(self, profiles):
+        """Instantiate the columns for a table from the statistics
+        gathered for each of them.
+
+        Args:
+          profiles: A list of ColumnProfiles, in column order
+        Returns:
+          A list of instances of column_class
+        """
+        return [self.column_from_profile(profile) for profile in profiles]
+
+    def _bucket_value(self, profile, row_number, value, refinements):
+        """Add a value to the bucket for the most restrictive group
+        of types it fits into, creating the bucket if necessary.
+
+        Only the types one step more restrictive than a bucket's type need
+        checking, since a value that fits any more restrictive type fits those,
+        and only the ones without a bucket, since those buckets come first.
+
+        Args:
+          profile: A ColumnProfile
+          row_number: The row number of the value
+          value: The value
+          refinements: dict of TableColumnType -> list of instances of the types
+                       whose next_less_restrictive it is
+        """
+        for bucket in profile.buckets:
+            column_type = bucket.column_type
+            if not column_type.value_is_compatible(value):
+                if not column_type._value_is_compatible_superset(value):
+                    continue
+                column_type = column_type.from_value(value)
+            if bucket.refinements and any(
+                    t._value_is_compatible_superset(value)
+                    for t in bucket.refinements):
+                break
+            bucket.add(row_number, value, column_type)
+            profile.sample(bucket, row_number, value)
+            return
+        column_type = self.get_type(value)
+        bucket = TypeBucket(column_type,
+                            max_samples=profile.max_rejects,
+                            format_candidates=profile.format_candidates,
+                            index=len(profile.buckets))
+        bucket.add(row_number, value, column_type)
+        profile.sample(bucket, row_number, value)
+        profile.buckets.append(bucket)
+        profile.buckets.sort(key=lambda b: b.column_type.get_depth(),
+                             reverse=True)
+        bucket_types = {type(b.column_type) for b in profile.buckets}
+        for b in profile.buckets:
+            b.refinements = [t for t in refinements[type(b.column_type)]
+                             if type(t) not in bucket_types]
+
+    def _resolve_buckets(self, profile):
+        """Pick the most restrictive type for a column whose rejected values
+        are within its tolerance, setting the profile's column_type and rejected.
+
+        Args:
+          profile: A ColumnProfile with buckets
+        """
+        limit = profile.reject_limit()
+        chains = [list(bucket.type_chain()) for bucket in profile.buckets]
+        candidates = {}
+        for chain in chains:
+            for column_type in chain:
+                candidates[column_type.name] = column_type
+        best = None
+        for candidate in candidates.values():
+            rejected = [bucket for bucket, chain in zip(profile.buckets, chains)
+                        if candidate not in chain]
+            num_rejected = sum(bucket.count for bucket in rejected)
+            if num_rejected > limit or any(
+                    not bucket.sampled for bucket in rejected):
+                continue
+            key = (candidate().get_depth(), -num_rejected)
+            if best is None or key > best[0]:
+                best = (key, candidate, rejected)
+        if best is None:
+            candidate, rejected = None, []
+        else:
+            _, candidate, rejected = best
+        column_type = candidate() if candidate else None
+        for bucket in profile.buckets:
+            if bucket in rejected:
+                continue
+            for value in bucket.representatives():
+                column_type = self.get_type(value, previous_type=column_type)
+        profile.column_type = column_type
+        profile.rejected = {bucket.index for bucket in rejected}
+        fitting_formats = [frozenset(f for f, _ in bucket.format_candidates)
+                           for bucket in profile.buckets if bucket not in rejected]
+        profile.format_candidates = [
+            (f, v) for f, v in profile.format_candidates
+            if all(f in formats for formats in fitting_formats)]
+
+    def table_def_from_rows(self,
+                            name,
+                            fieldnames,
+                            rows,
+                            detect_keys=False,
+                            distinct_options=None,
+                            tolerance=None,
+                            rejects=None,
+                            max_rejects=100000,
+                            detect_null_strings=False,
+                            sample_size=10000,
+                            **kwargs):
         """Instantiate a TableDefinition from an iterator of rows.
 
+        With a tolerance, the values in a column are grouped by the most restrictive
+        group of types they fit into (see TypeBucket). Once every row has been seen,
+        the column gets the most restrictive type whose non-fitting values are within
+        the tolerance, and those values are written to rejects instead of widening
+        the column.
+
         Args:
           name: The name of the table to create
           fieldnames: The names of the columns for this table
           rows: An array of arrays, each of which contains values for the fields in fieldnames
+          detect_keys: Whether to track distinct values in each column to find
+                       candidate keys. See column_from_profile.
+          distinct_options: dict of keyword arguments for the schematic.DistinctTracker
+                            used for each column when detect_keys is True. Its
+                            memory_limit is shared by every column's tracker.
+          tolerance: The number (an int) or fraction of rows (a float) whose values
+                     may be rejected per column, or a dict of fieldname -> tolerance
+          rejects: A RejectWriter to write rejected values to
+          max_rejects: With a fractional tolerance, the most values sampled
+                       for each group of types that may be rejected
+          detect_null_strings: Whether to detect which of candidate_null_strings each
+                               column uses as null sentinels, from the first rows
+          sample_size: The number of rows to detect null sentinels from
           kwargs: implementation-specific keyword arguments to pass as part of instantiation
         """
-        column_types = [None] * len(fieldnames)
-        for row in rows:
-            for idx, value in enumerate(row):
-                column_types[idx] = self.get_type(
-                    value, previous_type=column_types[idx])
+        if not isinstance(tolerance, dict):
+            tolerance = dict.fromkeys(fieldnames, tolerance)
+        if detect_keys:
+            distinct_options = dict(distinct_options or {})
+            if "budget" not in distinct_options:
+                distinct_options["budget"] = DistinctBudget(distinct_options.pop(
+                    "memory_limit", DEFAULT_DISTINCT_MEMORY_LIMIT))
+        detected_null_strings = [[] for _ in fieldnames]
+        if detect_null_strings and self.candidate_null_strings:
+            rows = iter(rows)
+            sample = list(itertools.islice(rows, sample_size))
+            rows = itertools.chain(sample, rows)
+            detected_null_strings = [
+                self.detect_null_strings(row[idx] for row in sample if idx < len(row))
+                for idx in range(len(fieldnames))]
+        profiles = [
+            ColumnProfile(
+                fieldname,
+                distinct=DistinctTracker(**distinct_options)
+                if detect_keys else None,
+                tolerance=tolerance.get(fieldname),
+                max_rejects=max_rejects,
+                null_strings=self.null_strings,
+                detected_null_strings=detected)
+            for fieldname, detected in zip(fieldnames, detected_null_strings)]
+        column_types = list(self.column_types())
+        refinements = {
+            column_type: [refinement() for refinement in column_types
+                          if refinement.next_less_restrictive is column_type]
+            for column_type in column_types}
+        value_formats = self.value_formats()
+        for profile in profiles:
+            profile.format_candidates = value_formats
+        for row_number, row in enumerate(rows, 1):
+            for profile, value in zip(profiles, row):
+                profile.row_count += 1
+                if value in profile.null_strings:
+                    profile.null_count += 1
+                    continue
+                if profile.buckets is None:
+                    profile.column_type = self.get_type(
+                        value, previous_type=profile.column_type)
+                    if profile.format_candidates:
+                        profile.format_candidates = narrow_formats(
+                            profile.format_candidates, value)
+                else:
+                    self._bucket_value(profile, row_number, value, refinements)
+                if profile.distinct is not None:
+                    profile.distinct.add(value)
+        for profile in profiles:
+            if profile.buckets:
+                self._resolve_buckets(profile)
+            if profile.column_type is not None and profile.column_type.formats:
+                type_formats = frozenset(f for f, _ in profile.column_type.formats)
+                profile.value_format = next(
+                    (f for f, _ in profile.format_candidates if f in type_formats), None)
+            if rejects is not None:
+                rejects.write(profile.name, profile.iter_rejects())
+            profile.close()
         table_def = self.table_definition_class(
             name=name, columns=[], **kwargs)
-        for idx, fieldname in enumerate(fieldnames):
-            table_def.add_column(
-                self.column_class(
-                    fieldname,
-                    column_types[idx]))
+        for column in self.columns_from_profiles(profiles):
+            table_def.add_column(column)
         return table_def
 
 
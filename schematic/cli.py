@@ -21,8 +21,30 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 import click
+import contextlib
+import csv as csv_module
 import psycopg2
-from schematic.schematics import redshift_schematic, csv_schematic
+import tempfile
+import schematic
+from schematic.schematics import (redshift_schematic, redshift_staging, redshift_export,
+                                  redshift_migrate, redshift_bulk, redshift_checkpoint,
+                                  redshift_sort, row_dedupe, snapshot_delta, watermark,
+                                  csv_schematic)
+
+
+def _parse_tolerance(ctx, param, value):
+    """Parse a tolerance as a count (e.g. "10") or fraction (e.g. "0.001")."""
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        raise click.BadParameter(
+            "tolerance must be a count or a fraction, got {}".format(value))
 
 
 @click.group()
@@ -30,20 +52,75 @@ def cli():
     """Utilities for converting data for tranfer among different data warehouse solutions"""
 
 
+def _inference_options(command):
+    """Add the options for inferring a table from a CSV to a command."""
+    options = [
+        click.option("--detect-keys", is_flag=True,
+                     help="Declare NOT NULL, UNIQUE and PRIMARY KEY constraints for columns that satisfy them"),
+        click.option("--detect-null-strings", is_flag=True,
+                     help="Detect values like NA or \\N used as nulls in each column"),
+        click.option("--tolerance", callback=_parse_tolerance,
+                     help="Number or fraction of values per column to reject instead of widening its type"),
+        click.option("--reject-file", type=click.Path(dir_okay=False, writable=True),
+                     help="File to write rejected values to")]
+    for option in reversed(options):
+        command = option(command)
+    return command
+
+
+def _infer_table_def(csv_table_def, schema, detect_keys=False,
+                     detect_null_strings=False, tolerance=None, reject_file=None):
+    """Scan a CSV to infer a RedshiftTableDefinition, reporting any rejected values.
+
+    Args:
+      csv_table_def: A CSVTableDefinition
+      schema: The schema for the Redshift table
+      detect_keys, detect_null_strings, tolerance: See Schematic.table_def_from_rows
+      reject_file: Path to write rejected values to
+    Returns:
+      A (RedshiftTableDefinition, schematic.RejectWriter) tuple
+    """
+    click.echo("Scanning CSV to determine types...")
+    reject_handler = open(reject_file, "w", newline="",
+                          buffering=1 << 20) if reject_file else None
+    rejects = schematic.RejectWriter(reject_handler)
+    try:
+        redshift_table_def = redshift_schematic.RedshiftSchematic().table_def_from_rows(
+            schema=schema,
+            name=csv_table_def.name,
+            fieldnames=csv_table_def.column_names(),
+            rows=csv_table_def.get_rows(),
+            detect_keys=detect_keys,
+            detect_null_strings=detect_null_strings,
+            tolerance=tolerance,
+            rejects=rejects)
+    finally:
+        if reject_handler:
+            reject_handler.close()
+    if rejects.total():
+        click.secho("Rejected {} values:".format(rejects.total()), fg="yellow")
+        for column, count in rejects.counts.items():
+            if count:
+                click.echo("  {}: {}".format(column, count))
+    return redshift_table_def, rejects
+
+
+def _echo_load_progress(stats):
+    click.echo("Loaded {} rows ({:.0f} rows/s, {:.1f} MB/s)".format(
+        stats.rows, stats.rows_per_second(), stats.bytes_per_second() / 1e6))
+
+
 @cli.command()
 @click.option("--schema")
 @click.argument("csv", type=click.Path(exists=True))
 @click.option("--conn-string", help="psycopg2-style connection string")
-def create_table(schema, csv, conn_string):
+@_inference_options
+def create_table(schema, csv, conn_string, **inference_options):
     """Create a Redshift table from a CSV"""
     with open(csv) as csv_file:
         csv_table_def = csv_schematic.CSVTableDefinition.from_source(csv_file)
-        click.echo("Scanning CSV to determine types...")
-        redshift_table_def = redshift_schematic.RedshiftSchematic().table_def_from_rows(
-            schema=schema,
-            name=csv_table_def.name,
-            fieldnames=csv_table_def.column_names(),
-            rows=csv_table_def.get_rows())
+        redshift_table_def, _ = _infer_table_def(
+            csv_table_def, schema, **inference_options)
     click.echo("Creating table in Redshift...")
     with psycopg2.connect(conn_string) as connection:
         redshift_table_def.create_table(connection)
@@ -54,3 +131,614 @@ def create_table(schema, csv, conn_string):
             csv_table_def.name),
         fg="green")
 
+
+@cli.command()
+@click.option("--schema")
+@click.argument("csv", type=click.Path(exists=True))
+@click.option("--conn-string", help="psycopg2-style connection string")
+@click.option("--buffer-size", type=int,
+              default=redshift_schematic.DEFAULT_LOAD_BUFFER_SIZE, show_default=True,
+              help="Bytes of rows to send in each COPY (the most with --adaptive)")
+@click.option("--adaptive", is_flag=True,
+              help="Grow each COPY while throughput improves, backing off when one is slow or fails")
+@click.option("--evolve", is_flag=True,
+              help="Skip the scan and widen or add columns as each chunk of rows needs them")
+@click.option("--chunk-rows", type=int,
+              default=redshift_migrate.DEFAULT_EVOLVE_CHUNK_ROWS, show_default=True,
+              help="Rows to infer types from at a time with --evolve")
+@click.option("--checkpoint", type=click.Path(dir_okay=False),
+              help="Load in chunks, recording each committed chunk here so a rerun resumes")
+@click.option("--chunk-size", type=int,
+              default=redshift_checkpoint.DEFAULT_CHECKPOINT_CHUNK_SIZE, show_default=True,
+              help="Bytes of the CSV to commit at a time with --checkpoint")
+@click.option("--sortkey", "sortkeys", multiple=True,
+              help="Declare a column as a SORTKEY and sort the rows by it before loading; "
+                   "repeat for a compound sortkey")
+@click.option("--sort-run-rows", type=int,
+              default=redshift_sort.DEFAULT_SORT_RUN_ROWS, show_default=True,
+              help="Rows to sort in memory at a time with --sortkey")
+@click.option("--dedupe", is_flag=True, help="Drop rows that repeat an earlier row")
+@click.option("--dedupe-key", "dedupe_keys", multiple=True,
+              help="Drop rows that repeat an earlier row's value in this column; "
+                   "repeat for a composite key. Implies --dedupe")
+@click.option("--duplicates-file", type=click.Path(dir_okay=False, writable=True),
+              help="File to write dropped duplicate rows to")
+@click.option("--bloom-capacity", type=int,
+              help="Expected number of distinct rows, to size a Bloom filter for --dedupe")
+@_inference_options
+def load(schema, csv, conn_string, buffer_size, adaptive, evolve, chunk_rows, checkpoint,
+         chunk_size, sortkeys, sort_run_rows, dedupe, dedupe_keys, duplicates_file,
+         bloom_capacity, **inference_options):
+    """Create a table from a CSV and stream its rows in with COPY FROM STDIN"""
+    batch_size = schematic.AdaptiveBatchSize(max_size=buffer_size) if adaptive else None
+    dedupe = dedupe or bool(dedupe_keys)
+    if (sortkeys or dedupe) and (evolve or checkpoint):
+        raise click.UsageError(
+            "--sortkey and --dedupe can't be combined with --evolve or --checkpoint")
+    if evolve:
+        if any(inference_options.values()) or checkpoint:
+            raise click.UsageError(
+                "--evolve can't be combined with --checkpoint or the inference options")
+        _evolving_load(schema, csv, conn_string, buffer_size, chunk_rows, batch_size)
+    elif checkpoint:
+        if inference_options["tolerance"] is not None or inference_options["reject_file"]:
+            raise click.UsageError("--checkpoint can't be combined with --tolerance or --reject-file")
+        _checkpointed_load(schema, csv, conn_string, buffer_size, checkpoint, chunk_size,
+                           batch_size, **inference_options)
+    else:
+        _scanned_load(schema, csv, conn_string, buffer_size, batch_size, sortkeys, sort_run_rows,
+                      dedupe, dedupe_keys, duplicates_file, bloom_capacity, **inference_options)
+    if batch_size is not None and batch_size.batches:
+        click.echo("{} on {}-byte batches, {:.1f} MB/s at best".format(
+            "Settled" if batch_size.settled else "Finished",
+            batch_size.size, batch_size.best_bytes_per_second / 1e6))
+
+
+def _deduplicator(csv_table_def, dedupe_keys, duplicates_handler, bloom_capacity):
+    """Make a Deduplicator for a CSV's rows."""
+    fieldnames = csv_table_def.column_names()
+    missing = [key for key in dedupe_keys if key not in fieldnames]
+    if missing:
+        raise click.BadParameter("{} has no columns named {}".format(
+            csv_table_def.name, ", ".join(missing)), param_hint="--dedupe-key")
+    return row_dedupe.Deduplicator(
+        key_indexes=[fieldnames.index(key) for key in dedupe_keys] if dedupe_keys else None,
+        bloom_capacity=bloom_capacity,
+        handler=duplicates_handler,
+        fieldnames=fieldnames)
+
+
+def _scanned_load(schema, csv, conn_string, buffer_size, batch_size, sortkeys, sort_run_rows,
+                  dedupe, dedupe_keys, duplicates_file, bloom_capacity, **inference_options):
+    """Scan a CSV to infer its table, then create the table and load it."""
+    with contextlib.ExitStack() as stack:
+        csv_file = stack.enter_context(open(csv))
+        csv_table_def = csv_schematic.CSVTableDefinition.from_source(csv_file)
+        redshift_table_def, rejects = _infer_table_def(
+            csv_table_def, schema, **inference_options)
+        rows = rejects.filter_rows(csv_table_def.get_rows())
+        deduplicator = None
+        if dedupe:
+            duplicates_handler = stack.enter_context(
+                open(duplicates_file, "w", newline="")) if duplicates_file else None
+            deduplicator = stack.enter_context(_deduplicator(
+                csv_table_def, dedupe_keys, duplicates_handler, bloom_capacity))
+            rows = deduplicator.filter_rows(rows)
+        if sortkeys:
+            redshift_table_def = _with_sortkeys(redshift_table_def, sortkeys)
+            click.echo("Sorting rows by {}...".format(", ".join(sortkeys)))
+            rows = redshift_sort.external_sort(
+                rows, redshift_sort.RowSortKey(redshift_table_def), run_rows=sort_run_rows)
+        with psycopg2.connect(conn_string) as connection:
+            click.echo("Creating table...")
+            redshift_table_def.create_table(connection)
+            click.echo("Loading rows...")
+            stats = redshift_table_def.load_rows(connection,
+                                                 rows,
+                                                 buffer_size=buffer_size,
+                                                 progress=_echo_load_progress,
+                                                 batch_size=batch_size)
+            connection.commit()
+    if deduplicator is not None:
+        click.echo("Dropped {} duplicate rows".format(deduplicator.duplicates))
+    click.secho(
+        "Successfully loaded {} rows into {} in {:.1f}s".format(
+            stats.rows, redshift_table_def.name, stats.seconds),
+        fg="green")
+
+
+def _with_sortkeys(redshift_table_def, sortkeys):
+    """Declare columns of an inferred table as its compound sortkey."""
+    for position, name in enumerate(sortkeys, 1):
+        column = redshift_table_def.get_column(name)
+        if column is None:
+            raise click.BadParameter("{} has no column {}".format(redshift_table_def.name, name),
+                                     param_hint="--sortkey")
+        column.sortkey = position
+    return redshift_schematic.RedshiftTableDefinition(redshift_table_def.schema,
+                                                      redshift_table_def.tablename,
+                                                      redshift_table_def.columns)
+
+
+def _evolving_load(schema, csv, conn_string, buffer_size, chunk_rows, batch_size):
+    """Load a CSV into a new or existing table, migrating it as the rows require."""
+    with open(csv) as csv_file:
+        csv_table_def = csv_schematic.CSVTableDefinition.from_source(csv_file)
+        with psycopg2.connect(conn_string) as connection:
+            existing = redshift_schematic.RedshiftTableDefinition.from_source(
+                connection, schema, csv_table_def.name)
+            loader = redshift_migrate.EvolvingLoader(connection,
+                                                     schema,
+                                                     csv_table_def.name,
+                                                     csv_table_def.column_names(),
+                                                     table_def=existing if existing.columns else None,
+                                                     chunk_size=chunk_rows,
+                                                     buffer_size=buffer_size,
+                                                     batch_size=batch_size)
+            click.echo("Loading rows...")
+            stats = loader.load(csv_table_def.get_rows(), progress=_echo_load_progress)
+            connection.commit()
+    for plan in loader.plans:
+        click.echo("Migrated {} ({}): {}".format(
+            csv_table_def.name, plan.strategy,
+            ", ".join(repr(change) for change in plan.changes)))
+    click.secho(
+        "Successfully loaded {} rows into {} in {:.1f}s".format(
+            stats.rows, csv_table_def.name, stats.seconds),
+        fg="green")
+
+
+def _checkpointed_load(schema, csv, conn_string, buffer_size, checkpoint, chunk_size,
+                       batch_size, **inference_options):
+    """Load a CSV a chunk at a time, skipping the chunks a previous run committed."""
+    with open(csv) as csv_file:
+        csv_table_def = csv_schematic.CSVTableDefinition.from_source(csv_file)
+        redshift_table_def, _ = _infer_table_def(csv_table_def, schema, **inference_options)
+    try:
+        checkpointed_load = redshift_checkpoint.CheckpointedLoad(
+            redshift_table_def, csv, checkpoint, chunk_size=chunk_size)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    with checkpointed_load, psycopg2.connect(conn_string) as connection:
+        click.echo("Loading rows...")
+        stats = checkpointed_load.run(connection, buffer_size=buffer_size,
+                                      progress=_echo_load_progress,
+                                      batch_size=batch_size)
+    if checkpointed_load.skipped:
+        click.echo("Skipped {} chunks committed by a previous run".format(
+            checkpointed_load.skipped))
+    click.secho(
+        "Successfully loaded {} rows into {} in {:.1f}s".format(
+            stats.rows, redshift_table_def.name, stats.seconds),
+        fg="green")
+
+
+def _echo_bulk_result(result):
+    if not result.ok():
+        click.secho("FAILED {}: {}".format(result.path, result.error), fg="red")
+    elif result.seconds:
+        click.echo("{} -> {}: {} rows in {:.1f}s".format(
+            result.path, result.table, result.rows, result.seconds))
+    else:
+        click.echo("{} -> {}".format(result.path, result.table))
+
+
+@cli.command()
+@click.option("--schema", required=True)
+@click.argument("csvs", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--conn-string", help="psycopg2-style connection string")
+@click.option("--pool-size", type=int,
+              default=redshift_bulk.DEFAULT_BULK_POOL_SIZE, show_default=True,
+              help="Connections to open, and files to load at once")
+@click.option("--processes", type=int, help="Number of inference processes (default: one per CPU)")
+@click.option("--create-only", is_flag=True, help="Only create the tables, without loading them")
+@click.option("--ddl-batch-size", type=int,
+              default=redshift_bulk.DEFAULT_DDL_BATCH_SIZE, show_default=True,
+              help="Tables to create in each transaction")
+@click.option("--buffer-size", type=int,
+              default=redshift_schematic.DEFAULT_LOAD_BUFFER_SIZE, show_default=True,
+              help="Bytes of rows to send in each COPY")
+@click.option("--detect-keys", is_flag=True,
+              help="Declare NOT NULL, UNIQUE and PRIMARY KEY constraints for columns that satisfy them")
+@click.option("--detect-null-strings", is_flag=True,
+              help="Detect values like NA or \\N used as nulls in each column")
+def bulk(schema, csvs, conn_string, pool_size, processes, create_only, ddl_batch_size,
+         buffer_size, detect_keys, detect_null_strings):
+    """Create and load tables for many CSVs at once"""
+    click.echo("Scanning {} CSVs to determine types...".format(len(csvs)))
+    results = redshift_bulk.bulk_load(conn_string,
+                                      csvs,
+                                      schema,
+                                      pool_size=pool_size,
+                                      processes=processes,
+                                      load=not create_only,
+                                      ddl_batch_size=ddl_batch_size,
+                                      buffer_size=buffer_size,
+                                      on_result=_echo_bulk_result,
+                                      detect_keys=detect_keys,
+                                      detect_null_strings=detect_null_strings)
+    failed = [result for result in results if not result.ok()]
+    if failed:
+        click.secho("{} of {} files failed".format(len(failed), len(results)), fg="red")
+        click.get_current_context().exit(1)
+    click.secho("Successfully {} {} tables".format(
+        "created" if create_only else "loaded", len(results)), fg="green")
+
+
+@cli.command()
+@click.argument("csv", type=click.Path(exists=True))
+@click.option("--schema", required=True)
+@click.option("--table", required=True, help="Name of the existing table to validate against")
+@click.option("--conn-string", help="psycopg2-style connection string")
+@click.option("--processes", type=int, help="Number of worker processes (default: one per CPU)")
+@click.option("--max-examples", type=int, default=10, show_default=True,
+              help="Number of offending values to show for each column")
+def validate(csv, schema, table, conn_string, processes, max_examples):
+    """Check that a CSV fits an existing Redshift table"""
+    with psycopg2.connect(conn_string) as connection:
+        redshift_table_def = redshift_schematic.RedshiftTableDefinition.from_source(
+            connection, schema, table)
+    click.echo("Validating CSV against {}...".format(redshift_table_def.name))
+    report = schematic.validate_csv(redshift_table_def,
+                                    csv,
+                                    null_strings=redshift_schematic.RedshiftSchematic.null_strings,
+                                    processes=processes,
+                                    max_examples=max_examples)
+    if report.is_valid():
+        click.secho("All {} rows fit {}".format(report.row_count,
+                                                redshift_table_def.name),
+                    fg="green")
+        return
+    if report.bad_length_count:
+        click.echo("{} rows have the wrong number of values, e.g. rows {}".format(
+            report.bad_length_count,
+            ", ".join(str(row_number) for row_number in report.bad_length_examples)))
+    for column in report.columns:
+        if column.count:
+            click.echo("{}: {} values don't fit".format(column.name, column.count))
+            for row_number, value in column.examples:
+                click.echo("  row {}: {!r}".format(row_number, value))
+    click.secho("{} values in {} rows don't fit {}".format(
+        report.violation_count(), report.row_count, redshift_table_def.name), fg="red")
+    click.get_current_context().exit(1)
+
+
+@cli.command()
+@click.argument("csv", type=click.Path(exists=True))
+@click.argument("out_dir", type=click.Path(file_okay=False))
+@click.option("--parts", type=int,
+              help="Number of parts to split into (default: the cluster's slice count)")
+@click.option("--conn-string", help="psycopg2-style connection string, to look up the slice count")
+@click.option("--compression", type=click.Choice(["gzip", "zstd", "none"]),
+              default="gzip", show_default=True)
+@click.option("--distkey", help="Column to partition rows by")
+@click.option("--processes", type=int, help="Number of worker processes (default: one per CPU)")
+@click.option("--url-prefix", help="Where the parts will be uploaded to, e.g. s3://bucket/prefix/")
+def split(csv, out_dir, parts, conn_string, compression, distkey, processes, url_prefix):
+    """Split a CSV into compressed parts and a manifest for a parallel COPY"""
+    if parts is None:
+        if conn_string is None:
+            raise click.UsageError("Either --parts or --conn-string is required")
+        with psycopg2.connect(conn_string) as connection:
+            parts = redshift_staging.get_slice_count(connection)
+    staged_parts = redshift_staging.split_csv(csv,
+                                              out_dir,
+                                              parts,
+                                              compression=None if compression == "none" else compression,
+                                              distkey=distkey,
+                                              processes=processes,
+                                              url_prefix=url_prefix)
+    click.secho("Wrote {} rows in {} parts and manifest {}".format(
+        staged_parts.row_count(), len(staged_parts.parts), staged_parts.manifest_path),
+        fg="green")
+
+
+@cli.command()
+@click.option("--schema")
+@click.argument("csv", type=click.Path(exists=True))
+@click.option("--conn-string", help="psycopg2-style connection string")
+@click.option("--bucket", required=True, help="S3 bucket to stage parts in")
+@click.option("--prefix", default="", help="Key prefix to stage parts under")
+@click.option("--iam-role", help="ARN of an IAM role for Redshift to read the parts with")
+@click.option("--parts", type=int,
+              help="Number of parts to split into (default: the cluster's slice count)")
+@click.option("--compression", type=click.Choice(["gzip", "zstd"]),
+              default="gzip", show_default=True)
+@click.option("--processes", type=int, help="Number of compression processes (default: one per CPU)")
+@click.option("--upload-workers", type=int,
+              default=redshift_staging.DEFAULT_UPLOAD_WORKERS, show_default=True,
+              help="Number of parts to upload at once")
+@_inference_options
+def s3_load(schema, csv, conn_string, bucket, prefix, iam_role, parts, compression,
+            processes, upload_workers, **inference_options):
+    """Create a table from a CSV and load it with a COPY from S3"""
+    if inference_options["tolerance"] is not None:
+        raise click.UsageError("--tolerance can't be used when loading from S3, "
+                               "since rejected rows aren't filtered out of the parts")
+    with open(csv) as csv_file:
+        csv_table_def = csv_schematic.CSVTableDefinition.from_source(csv_file)
+        redshift_table_def, _ = _infer_table_def(
+            csv_table_def, schema, **inference_options)
+    with psycopg2.connect(conn_string) as connection:
+        if parts is None:
+            parts = redshift_staging.get_slice_count(connection)
+        with tempfile.TemporaryDirectory() as out_dir:
+            click.echo("Splitting CSV into {} parts...".format(parts))
+            staged_parts = redshift_staging.split_csv(csv,
+                                                      out_dir,
+                                                      parts,
+                                                      compression=compression,
+                                                      processes=processes,
+                                                      table_def=redshift_table_def)
+            click.echo("Uploading parts to S3...")
+            manifest_url = redshift_staging.upload_parts(staged_parts,
+                                                         bucket,
+                                                         prefix,
+                                                         max_workers=upload_workers)
+        click.echo("Creating table...")
+        redshift_table_def.create_table(connection)
+        click.echo("Copying from {}...".format(manifest_url))
+        redshift_staging.copy_from_manifest(connection,
+                                            redshift_table_def,
+                                            manifest_url,
+                                            staged_parts,
+                                            iam_role=iam_role)
+        connection.commit()
+    click.secho(
+        "Successfully loaded {} rows into {}".format(
+            staged_parts.row_count(), redshift_table_def.name),
+        fg="green")
+
+
+@cli.command()
+@click.option("--schema", required=True)
+@click.option("--table", required=True, help="Name of the table to unload")
+@click.argument("output", type=click.Path(dir_okay=False, writable=True))
+@click.option("--conn-string", help="psycopg2-style connection string")
+@click.option("--bucket", required=True, help="S3 bucket to unload to")
+@click.option("--prefix", default="", help="Key prefix to unload to")
+@click.option("--iam-role", help="ARN of an IAM role for Redshift to write the parts with")
+@click.option("--download-workers", type=int,
+              default=redshift_staging.DEFAULT_UPLOAD_WORKERS, show_default=True,
+              help="Number of parts to download at once")
+def unload(schema, table, output, conn_string, bucket, prefix, iam_role, download_workers):
+    """UNLOAD a Redshift table to S3 in parallel and download it to a CSV"""
+    with psycopg2.connect(conn_string) as connection:
+        redshift_table_def = redshift_schematic.RedshiftTableDefinition.from_source(
+            connection, schema, table)
+        click.echo("Unloading {} to S3...".format(redshift_table_def.name))
+        unloaded_table = redshift_staging.unload_table(connection,
+                                                       redshift_table_def,
+                                                       bucket,
+                                                       prefix,
+                                                       iam_role=iam_role,
+                                                       max_workers=download_workers)
+    click.echo("Downloading {} parts...".format(len(unloaded_table.urls)))
+    rows = 0
+    with tempfile.TemporaryDirectory() as out_dir, \
+            open(output, "w", newline="") as output_file:
+        writer = csv_module.writer(output_file)
+        writer.writerow(unloaded_table.column_names())
+        for row in unloaded_table.get_rows(out_dir):
+            writer.writerow(row)
+            rows += 1
+    click.secho("Successfully unloaded {} rows to {}".format(rows, output), fg="green")
+
+
+@cli.command()
+@click.option("--schema", required=True)
+@click.option("--table", required=True, help="Name of the table to export")
+@click.argument("out_dir", type=click.Path(file_okay=False))
+@click.option("--conn-string", help="psycopg2-style connection string")
+@click.option("--file-size", type=int,
+              default=redshift_export.DEFAULT_EXPORT_FILE_SIZE, show_default=True,
+              help="Bytes of CSV to write to each file before starting another")
+@click.option("--compression", type=click.Choice(["gzip", "zstd", "none"]),
+              default="gzip", show_default=True)
+@click.option("--processes", type=int, help="Number of compression processes (default: one per CPU)")
+@click.option("--method", type=click.Choice(redshift_export.EXPORT_METHODS),
+              help="How to read rows (default: COPY TO STDOUT where supported, otherwise a cursor)")
+def export(schema, table, out_dir, conn_string, file_size, compression, processes, method):
+    """Export a table to compressed CSV files"""
+    with psycopg2.connect(conn_string) as connection:
+        redshift_table_def = redshift_schematic.RedshiftTableDefinition.from_source(
+            connection, schema, table)
+        click.echo("Exporting {}...".format(redshift_table_def.name))
+        paths = redshift_export.export_table(connection,
+                                             redshift_table_def,
+                                             out_dir,
+                                             max_bytes=file_size,
+                                             compression=None if compression == "none" else compression,
+                                             processes=processes,
+                                             method=method)
+    click.secho("Successfully exported {} to {} files in {}".format(
+        redshift_table_def.name, len(paths), out_dir), fg="green")
+
+
+def _migration_plan(connection, schema, table, csv, **inference_options):
+    """Plan the changes an existing table needs to fit a CSV.
+
+    Returns:
+      A redshift_migrate.MigrationPlan
+    """
+    with open(csv) as csv_file:
+        csv_table_def = csv_schematic.CSVTableDefinition.from_source(csv_file)
+        required, _ = _infer_table_def(csv_table_def, schema, **inference_options)
+    existing = redshift_schematic.RedshiftTableDefinition.from_source(
+        connection, schema, table or csv_table_def.name)
+    if not existing.columns:
+        raise click.ClickException("No such table {}".format(existing.name))
+    return redshift_migrate.MigrationPlan(existing, required)
+
+
+def _echo_plan(plan, connection):
+    for change in plan.changes:
+        click.echo("  {}".format(change))
+    for step in plan.steps:
+        click.echo(step.as_string(connection))
+
+
+def _migration_options(command):
+    """Add the arguments and options for planning a migration to a command."""
+    options = [
+        click.option("--schema", required=True),
+        click.argument("csv", type=click.Path(exists=True)),
+        click.option("--table", help="Name of the existing table (default: the CSV's name)"),
+        click.option("--conn-string", help="psycopg2-style connection string")]
+    for option in reversed(options):
+        command = option(command)
+    return _inference_options(command)
+
+
+@cli.command()
+@_migration_options
+def plan(schema, csv, table, conn_string, **inference_options):
+    """Show the changes an existing table needs to fit a CSV"""
+    with psycopg2.connect(conn_string) as connection:
+        migration_plan = _migration_plan(connection, schema, table, csv, **inference_options)
+        if migration_plan.strategy == "none":
+            click.secho("{} already fits the CSV".format(migration_plan.existing.name),
+                        fg="green")
+            return
+        click.echo("{} needs a{} migration:".format(
+            migration_plan.existing.name,
+            " deep copy" if migration_plan.strategy == "deep_copy" else "n ALTER"))
+        _echo_plan(migration_plan, connection)
+
+
+def _existing_table_for_csv(connection, schema, table, csv_table_def):
+    """Get an existing table's definition with its columns in the CSV's order.
+
+    Returns:
+      A RedshiftTableDefinition
+    """
+    existing = redshift_schematic.RedshiftTableDefinition.from_source(
+        connection, schema, table or csv_table_def.name)
+    if not existing.columns:
+        raise click.ClickException("No such table {}".format(existing.name))
+    columns = [existing.get_column(name) for name in csv_table_def.column_names()]
+    missing = [name for name, column in zip(csv_table_def.column_names(), columns)
+               if column is None]
+    if missing:
+        raise click.ClickException("{} has no columns named {}".format(
+            existing.name, ", ".join(missing)))
+    return redshift_schematic.RedshiftTableDefinition(schema, existing.tablename, columns)
+
+
+@cli.command()
+@click.option("--schema", required=True)
+@click.argument("csv", type=click.Path(exists=True))
+@click.option("--table", help="Name of the existing table (default: the CSV's name)")
+@click.option("--key", "keys", multiple=True,
+              help="Column to match rows on; repeat for a composite key (default: the primary key)")
+@click.option("--conn-string", help="psycopg2-style connection string")
+@click.option("--buffer-size", type=int,
+              default=redshift_schematic.DEFAULT_LOAD_BUFFER_SIZE, show_default=True,
+              help="Bytes of rows to send in each COPY")
+def merge(schema, csv, table, keys, conn_string, buffer_size):
+    """Upsert a CSV into an existing table through a staging table"""
+    with open(csv) as csv_file:
+        csv_table_def = csv_schematic.CSVTableDefinition.from_source(csv_file)
+        with psycopg2.connect(conn_string) as connection:
+            merge_table_def = _existing_table_for_csv(connection, schema, table,
+                                                      csv_table_def)
+            click.echo("Merging rows...")
+            try:
+                stats = merge_table_def.merge_rows(connection,
+                                                   csv_table_def.get_rows(),
+                                                   keys=keys or None,
+                                                   buffer_size=buffer_size,
+                                                   progress=_echo_load_progress)
+            except ValueError as e:
+                raise click.ClickException(str(e))
+            connection.commit()
+    click.secho(
+        "Successfully merged {} rows into {}, replacing {}, in {:.1f}s".format(
+            stats.rows, merge_table_def.name, stats.replaced, stats.seconds),
+        fg="green")
+
+
+@cli.command()
+@click.option("--schema", required=True)
+@click.argument("csv", type=click.Path(exists=True))
+@click.option("--table", help="Name of the existing table (default: the CSV's name)")
+@click.option("--column", required=True,
+              help="Monotonic column, such as an id or timestamp, to track the watermark of")
+@click.option("--watermarks", required=True, type=click.Path(dir_okay=False),
+              help="SQLite file to keep each table's watermark in")
+@click.option("--sorted", "is_sorted", is_flag=True,
+              help="The CSV is sorted on the column, so new rows can be found by binary search")
+@click.option("--conn-string", help="psycopg2-style connection string")
+@click.option("--buffer-size", type=int,
+              default=redshift_schematic.DEFAULT_LOAD_BUFFER_SIZE, show_default=True,
+              help="Bytes of rows to send in each COPY")
+def append(schema, csv, table, column, watermarks, is_sorted, conn_string, buffer_size):
+    """Append the rows of a CSV beyond a table's high-watermark"""
+    with open(csv) as csv_file:
+        csv_table_def = csv_schematic.CSVTableDefinition.from_source(csv_file)
+    with psycopg2.connect(conn_string) as connection, \
+            watermark.WatermarkStore(watermarks) as store:
+        table_def = _existing_table_for_csv(connection, schema, table, csv_table_def)
+        click.echo("Appending rows beyond {}...".format(
+            store.get(table_def.name, column) or "the start"))
+        try:
+            stats, high_watermark = watermark.append_rows_after_watermark(
+                connection, table_def, csv, column, store,
+                is_sorted=is_sorted,
+                buffer_size=buffer_size,
+                progress=_echo_load_progress)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+    click.secho(
+        "Successfully appended {} rows to {} in {:.1f}s, up to {}".format(
+            stats.rows, table_def.name, stats.seconds, high_watermark),
+        fg="green")
+
+
+@cli.command()
+@click.argument("csv", type=click.Path(exists=True))
+@click.argument("out_csv", type=click.Path(dir_okay=False, writable=True))
+@click.option("--key", required=True, help="Column that identifies each row")
+@click.option("--index", "index_path", required=True, type=click.Path(dir_okay=False),
+              help="File to write this snapshot's row hashes to")
+@click.option("--previous", "previous_path", type=click.Path(exists=True, dir_okay=False),
+              help="Row hashes of the previous snapshot (default: treat every row as inserted)")
+@click.option("--deleted", "deleted_path", type=click.Path(dir_okay=False, writable=True),
+              help="File to write the keys of deleted rows to")
+def delta(csv, out_csv, key, index_path, previous_path, deleted_path):
+    """Write the rows of a snapshot CSV that changed since the previous one"""
+    with open(csv) as csv_file:
+        csv_table_def = csv_schematic.CSVTableDefinition.from_source(csv_file)
+        fieldnames = csv_table_def.column_names()
+        if key not in fieldnames:
+            raise click.BadParameter("{} has no column {}".format(csv, key), param_hint="--key")
+        with snapshot_delta.SnapshotDelta(index_path, previous_path,
+                                          key_index=fieldnames.index(key)) as changes:
+            with open(out_csv, "w", newline="") as out_file:
+                writer = csv_module.writer(out_file)
+                writer.writerow(fieldnames)
+                writer.writerows(row for _, row in changes.changed_rows(csv_table_def.get_rows()))
+            if deleted_path:
+                with open(deleted_path, "w", newline="") as deleted_file:
+                    writer = csv_module.writer(deleted_file)
+                    writer.writerow([key])
+                    writer.writerows((deleted_key,) for deleted_key in changes.deleted_keys())
+    click.secho("Found {} inserted, {} updated{} rows; {} unchanged".format(
+        changes.inserted, changes.updated,
+        ", {} deleted".format(changes.deleted) if deleted_path else "",
+        changes.unchanged), fg="green")
+
+
+@cli.command()
+@_migration_options
+def migrate(schema, csv, table, conn_string, **inference_options):
+    """Change an existing table to fit a CSV"""
+    with psycopg2.connect(conn_string) as connection:
+        migration_plan = _migration_plan(connection, schema, table, csv, **inference_options)
+        if migration_plan.strategy == "none":
+            click.secho("{} already fits the CSV".format(migration_plan.existing.name),
+                        fg="green")
+            return
+        _echo_plan(migration_plan, connection)
+        migration_plan.apply(connection)
+    click.secho("Successfully migrated {}".format(migration_plan.existing.name), fg="green")
@@ -22,3 +22,13 @@
 # SOFTWARE.
 from .redshift_schematic import *
 from .csv_schematic import *
+from .redshift_staging import *
+from .redshift_export import *
+from .redshift_catalog import *
+from .redshift_migrate import *
+from .snapshot_delta import *
+from .watermark import *
+from .redshift_bulk import *
+from .redshift_checkpoint import *
+from .redshift_sort import *
+from .row_dedupe import *
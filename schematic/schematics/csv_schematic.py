@@ -22,8 +22,64 @@
 # SOFTWARE.
 import schematic
 import csv
+import os
 from os import path
 
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024
+
+
+def chunk_offsets(file_path, chunk_size=DEFAULT_CHUNK_SIZE, skip_header=True):
+    """Split a CSV file into byte ranges that each start and end on a line boundary.
+
+    Quoted values containing newlines may be split across chunks,
+    so this is only safe for files without them.
+
+    Args:
+      file_path: Path to the CSV file
+      chunk_size: The approximate size of each chunk, in bytes
+      skip_header: Whether to leave the first line out of the chunks
+    Returns:
+      A list of (start, end) byte offsets
+    """
+    offsets = []
+    size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        if skip_header:
+            f.readline()
+        start = f.tell()
+        while start < size:
+            f.seek(min(start + chunk_size, size))
+            if f.tell() < size:
+                f.readline()
+            end = f.tell()
+            offsets.append((start, end))
+            start = end
+    return offsets
+
+
+def read_rows(file_path, start=0, end=None, encoding='utf-8'):
+    """Read the rows in a byte range of a CSV file.
+
+    Args:
+      file_path: Path to the CSV file
+      start: Byte offset of the first line to read, e.g. from chunk_offsets
+      end: Byte offset to stop reading at, or None to read to the end of the file
+      encoding: The file's encoding
+    Yields:
+      A tuple of values
+    """
+    def lines():
+        with open(file_path, 'rb') as f:
+            f.seek(start)
+            position = start
+            for line in f:
+                if end is not None and position >= end:
+                    return
+                position += len(line)
+                yield line.decode(encoding)
+    for line in csv.reader(lines()):
+        yield tuple(line)
+
 
 class CSVColumnType(schematic.TableColumnType):
     """The only column type for CSVs. Always just a string."""
@@ -80,6 +136,17 @@ class CSVTableDefinition(schematic.TableDefinition):
         for line in reader:
             yield(tuple(line))
 
+    def get_chunks(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Split this file into byte ranges of whole rows,
+        e.g. for reading in parallel with read_rows.
+
+        Args:
+          chunk_size: The approximate size of each chunk, in bytes
+        Returns:
+          A list of (start, end) byte offsets, not including the header
+        """
+        return chunk_offsets(self.handler.name, chunk_size)
+
     @classmethod
     def from_source(cls, csv_file):
         """Instantiate a CSVTableDefinition from a csv file
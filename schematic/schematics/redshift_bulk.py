@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2019 Cody J. Hanson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Creates and loads tables for many CSV files at once.
+
+Connecting to Redshift takes hundreds of milliseconds and a single load
+leaves most of the cluster idle, so bulk_load infers every file's table in a
+pool of processes, creates the tables a batch per transaction, then loads
+the files over a bounded pool of connections, largest files first.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from psycopg2 import pool
+from schematic import DictableMixin
+from schematic.schematics import csv_schematic, redshift_schematic
+
+DEFAULT_BULK_POOL_SIZE = 8
+DEFAULT_DDL_BATCH_SIZE = 50
+
+
+class BulkResult(DictableMixin):
+    """What happened to one file in a bulk load.
+
+    Attributes:
+      path: The path to the CSV file
+      table: The schema-qualified name of its table, once inferred
+      created: Whether its table was created
+      rows: The number of rows loaded
+      seconds: Seconds spent loading it
+      error: A description of what went wrong, or None
+    """
+
+    def __init__(self, path, table=None, created=False, rows=0, seconds=0.0, error=None):
+        self.path = path
+        self.table = table
+        self.created = created
+        self.rows = rows
+        self.seconds = seconds
+        self.error = error
+
+    def ok(self):
+        return self.error is None
+
+
+def _infer(args):
+    path, schema, inference_options = args
+    with open(path) as csv_file:
+        csv_table_def = csv_schematic.CSVTableDefinition.from_source(csv_file)
+        return redshift_schematic.RedshiftSchematic().table_def_from_rows(
+            schema=schema,
+            name=csv_table_def.name,
+            fieldnames=csv_table_def.column_names(),
+            rows=csv_table_def.get_rows(),
+            **inference_options)
+
+
+def infer_table_defs(paths, schema, processes=None, **inference_options):
+    """Infer a RedshiftTableDefinition for each of several CSV files in parallel.
+
+    Args:
+      paths: Paths to the CSV files
+      schema: The schema for the tables
+      processes: The number of worker processes, or None for one per CPU
+      inference_options: Keyword arguments for Schematic.table_def_from_rows
+    Returns:
+      A list with a RedshiftTableDefinition, or the exception raised inferring
+      it, for each path
+    """
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(_infer, (path, schema, inference_options))
+                   for path in paths]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+
+def create_tables(conn, table_defs, batch_size=DEFAULT_DDL_BATCH_SIZE):
+    """Create tables with batch_size CREATE TABLE statements per transaction.
+    When a batch fails, its tables are retried one at a time so a bad table
+    doesn't take the others down with it.
+
+    Args:
+      conn: A psycopg2.connection to a Redshift instance
+      table_defs: RedshiftTableDefinitions
+      batch_size: The number of tables to create in each transaction
+    Returns:
+      A list with None, or the exception raised creating it, for each table
+    """
+    errors = []
+    for start in range(0, len(table_defs), batch_size):
+        batch = table_defs[start:start + batch_size]
+        try:
+            _create_batch(conn, batch)
+            errors.extend(None for _ in batch)
+        except Exception:
+            conn.rollback()
+            for table_def in batch:
+                try:
+                    _create_batch(conn, [table_def])
+                    errors.append(None)
+                except Exception as e:
+                    conn.rollback()
+                    errors.append(e)
+    return errors
+
+
+def _create_batch(conn, table_defs):
+    with conn.cursor() as curs:
+        for table_def in table_defs:
+            curs.execute(table_def.create_sql())
+    conn.commit()
+    for table_def in table_defs:
+        redshift_schematic.notify_table_changed(conn, table_def.schema, table_def.tablename)
+
+
+def bulk_load(dsn, paths, schema, pool_size=DEFAULT_BULK_POOL_SIZE, processes=None,
+              load=True, ddl_batch_size=DEFAULT_DDL_BATCH_SIZE,
+              buffer_size=redshift_schematic.DEFAULT_LOAD_BUFFER_SIZE,
+              on_result=None, **inference_options):
+    """Infer, create and load a table for each of several CSV files, largest
+    files first. Each file is loaded and committed on its own, so one bad
+    file doesn't stop the rest.
+
+    Args:
+      dsn: psycopg2-style connection string
+      paths: Paths to the CSV files
+      schema: The schema for the tables
+      pool_size: The maximum number of connections to open, and files to load at once
+      processes: The number of inference processes, or None for one per CPU
+      load: Whether to load the files, or only create their tables
+      ddl_batch_size: The number of tables to create in each transaction
+      buffer_size: The size of each COPY, in bytes
+      on_result: A function to call with each file's BulkResult once it's done
+      inference_options: Keyword arguments for Schematic.table_def_from_rows
+    Returns:
+      A list of BulkResults, largest file first
+    """
+    paths = sorted(paths, key=os.path.getsize, reverse=True)
+    results = [BulkResult(path) for path in paths]
+    table_defs = infer_table_defs(paths, schema, processes, **inference_options)
+    inferred = []
+    for result, table_def in zip(results, table_defs):
+        if isinstance(table_def, Exception):
+            result.error = "inference failed: {}".format(table_def)
+        else:
+            result.table = table_def.name
+            inferred.append((result, table_def))
+    connections = pool.ThreadedConnectionPool(1, pool_size, dsn)
+    try:
+        conn = connections.getconn()
+        try:
+            errors = create_tables(conn, [table_def for _, table_def in inferred],
+                                   ddl_batch_size)
+        finally:
+            connections.putconn(conn)
+        created = []
+        for (result, table_def), error in zip(inferred, errors):
+            if error is None:
+                result.created = True
+                created.append((result, table_def))
+            else:
+                result.error = "create failed: {}".format(error)
+        for result in results:
+            if on_result and (not result.ok() or not load):
+                on_result(result)
+        if not load:
+            return results
+
+        def load_file(result, table_def):
+            conn = connections.getconn()
+            started = time.monotonic()
+            try:
+                with open(result.path) as csv_file:
+                    rows = csv_schematic.CSVTableDefinition.from_source(csv_file).get_rows()
+                    result.rows = table_def.load_rows(conn, rows, buffer_size=buffer_size).rows
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                result.rows = 0
+                result.error = "load failed: {}".format(e)
+            finally:
+                result.seconds = time.monotonic() - started
+                connections.putconn(conn)
+            if on_result:
+                on_result(result)
+
+        with ThreadPoolExecutor(max_workers=pool_size) as executor:
+            for future in [executor.submit(load_file, result, table_def)
+                           for result, table_def in created]:
+                future.result()
+        return results
+    finally:
+        connections.closeall()
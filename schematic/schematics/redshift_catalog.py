@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2019 Cody J. Hanson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Caches table definitions reflected from the Redshift catalog.
+
+Catalog queries run on the leader node, where they're slow and contend with
+user queries, so services that look up the same tables repeatedly can keep
+their definitions in a CatalogCache instead.
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from schematic.schematics import redshift_schematic
+
+DEFAULT_CATALOG_TTL = 300
+DEFAULT_CATALOG_CACHE_SIZE = 1024
+
+
+def connection_identity(conn):
+    """Identify the database a connection is to, so connections to the same
+    database share cache entries. psycopg2 leaves the password out of dsn.
+
+    Args:
+      conn: A psycopg2.connection
+    Returns:
+      A string
+    """
+    dsn = getattr(conn, "dsn", None)
+    return dsn if dsn else "id:{}".format(id(conn))
+
+
+class CatalogCache():
+    """A cache of RedshiftTableDefinitions keyed by (connection identity,
+    schema, table), evicting entries once they're older than ttl seconds or
+    when there are more than maxsize of them, least recently used first.
+
+    Entries hold the rows from pg_table_def rather than table definitions,
+    so callers always get a new RedshiftTableDefinition they're free to modify.
+    With a path, entries are also kept in a SQLite database so they survive
+    restarts, subject to the same TTL.
+
+    Every CatalogCache is registered in TABLE_CHANGE_LISTENERS, so tables
+    changed with RedshiftTableDefinition.create_table are invalidated
+    automatically. Invalidate tables changed by other means with invalidate.
+    """
+
+    def __init__(self,
+                 ttl=DEFAULT_CATALOG_TTL,
+                 maxsize=DEFAULT_CATALOG_CACHE_SIZE,
+                 path=None,
+                 clock=time.time):
+        """
+        Args:
+          ttl: The number of seconds to keep entries for
+          maxsize: The maximum number of entries to keep in memory
+          path: Path to a SQLite database to keep entries in, or None
+          clock: A function returning the current time in seconds
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            with self.db:
+                self.db.execute("""CREATE TABLE IF NOT EXISTS catalog_cache (
+                    conn TEXT, schema TEXT, tablename TEXT, fetched_at REAL, rows TEXT,
+                    PRIMARY KEY (conn, schema, tablename))""")
+        redshift_schematic.TABLE_CHANGE_LISTENERS.add(self)
+
+    def get_table_def(self, conn, schema, name):
+        """Get the definition of a table, from the cache if it's there and fresh
+        or from the catalog otherwise (see RedshiftTableDefinition.from_source).
+
+        Args:
+          conn: A psycopg2.connection to a Redshift instance
+          schema: The name of the schema where the table resides
+          name: The name of the table
+        Returns:
+          A RedshiftTableDefinition
+        """
+        key = (connection_identity(conn), schema, name)
+        rows = self._get(key)
+        if rows is None:
+            self.misses += 1
+            rows = redshift_schematic.RedshiftTableDefinition.catalog_rows(conn, schema, name)
+            self._put(key, rows, self.clock())
+        else:
+            self.hits += 1
+        return redshift_schematic.RedshiftTableDefinition.from_catalog_rows(schema, name, rows)
+
+    def _get(self, key):
+        now = self.clock()
+        with self._lock:
+            if key in self.entries:
+                fetched_at, rows = self.entries[key]
+                if now - fetched_at < self.ttl:
+                    self.entries.move_to_end(key)
+                    return rows
+                del self.entries[key]
+        if self.db is None:
+            return None
+        with self._lock:
+            stored = self.db.execute(
+                """SELECT fetched_at, rows FROM catalog_cache
+                WHERE conn = ? AND schema = ? AND tablename = ?""", key).fetchone()
+        if stored is None or now - stored[0] >= self.ttl:
+            return None
+        rows = [tuple(row) for row in json.loads(stored[1])]
+        self._put(key, rows, stored[0], persist=False)
+        return rows
+
+    def _put(self, key, rows, fetched_at, persist=True):
+        with self._lock:
+            self.entries[key] = (fetched_at, rows)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+            if self.db is not None and persist:
+                with self.db:
+                    self.db.execute(
+                        "INSERT OR REPLACE INTO catalog_cache VALUES (?, ?, ?, ?, ?)",
+                        key + (fetched_at, json.dumps(rows)))
+
+    def invalidate(self, conn=None, schema=None, name=None):
+        """Remove entries from the cache. Arguments left as None match anything,
+        so invalidate() clears the whole cache.
+
+        Args:
+          conn: A psycopg2.connection, or None
+          schema: The name of a schema, or None
+          name: The name of a table, or None
+        """
+        pattern = (None if conn is None else connection_identity(conn), schema, name)
+
+        def matches(key):
+            return all(part is None or part == key_part
+                       for part, key_part in zip(pattern, key))
+
+        with self._lock:
+            for key in [key for key in self.entries if matches(key)]:
+                del self.entries[key]
+            if self.db is not None:
+                with self.db:
+                    self.db.execute(
+                        """DELETE FROM catalog_cache
+                        WHERE (? IS NULL OR conn = ?)
+                          AND (? IS NULL OR schema = ?)
+                          AND (? IS NULL OR tablename = ?)""",
+                        [part for part in pattern for _ in range(2)])
+
+    def table_changed(self, conn, schema, name):
+        self.invalidate(conn, schema, name)
+
+    def close(self):
+        """Stop listening for table changes and close the SQLite database, if any."""
+        redshift_schematic.TABLE_CHANGE_LISTENERS.discard(self)
+        if self.db is not None:
+            self.db.close()
+            self.db = None
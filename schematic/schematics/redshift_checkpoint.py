@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2019 Cody J. Hanson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Resumable loads of large CSV files, a chunk at a time.
+
+Each chunk is a byte range of whole rows from csv_schematic.chunk_offsets.
+The chunks and which of them have committed are kept in a local SQLite
+checkpoint, and every chunk commits in the same transaction as a row
+recording it in a manifest table next to the target table, so a chunk is
+never loaded twice even if the checkpoint falls behind the database.
+"""
+import datetime
+import os
+import sqlite3
+import uuid
+from psycopg2 import sql
+import schematic
+from schematic.schematics import csv_schematic, redshift_schematic
+
+DEFAULT_CHECKPOINT_CHUNK_SIZE = csv_schematic.DEFAULT_CHUNK_SIZE
+MANIFEST_TABLE = "schematic_load_chunks"
+
+
+class CheckpointedLoad():
+    """A load of a CSV file into a table that can be resumed where it left off
+    by running it again with the same checkpoint.
+
+    Like chunk_offsets, this assumes quoted values don't contain newlines.
+
+    Attributes:
+      load_id: Identifies this load in the manifest table
+      skipped: The number of chunks that had already committed
+    """
+
+    def __init__(self, table_def, file_path, checkpoint_path,
+                 chunk_size=DEFAULT_CHECKPOINT_CHUNK_SIZE):
+        """
+        Args:
+          table_def: The RedshiftTableDefinition to load into, with its columns
+                     in the same order as the file's
+          file_path: Path to the CSV file, with a header
+          checkpoint_path: Path to the SQLite checkpoint, which is created
+                           if it doesn't exist
+          chunk_size: The approximate size of each chunk, in bytes, for a new checkpoint
+        Raises:
+          ValueError: If the checkpoint is for a different table, or the file
+                      changed since it was made
+        """
+        self.table_def = table_def
+        self.file_path = file_path
+        self.skipped = 0
+        stat = os.stat(file_path)
+        self.db = sqlite3.connect(checkpoint_path)
+        with self.db:
+            self.db.execute("""CREATE TABLE IF NOT EXISTS checkpoint (
+                load_id TEXT, tablename TEXT, file_size INTEGER, file_mtime INTEGER)""")
+            self.db.execute("""CREATE TABLE IF NOT EXISTS chunks (
+                chunk_start INTEGER PRIMARY KEY, chunk_end INTEGER, committed INTEGER)""")
+            stored = self.db.execute(
+                "SELECT load_id, tablename, file_size, file_mtime FROM checkpoint").fetchone()
+            if stored is None:
+                self.load_id = uuid.uuid4().hex
+                self.db.execute("INSERT INTO checkpoint VALUES (?, ?, ?, ?)",
+                                (self.load_id, table_def.name, stat.st_size, stat.st_mtime_ns))
+                self.db.executemany("INSERT INTO chunks VALUES (?, ?, 0)",
+                                    csv_schematic.chunk_offsets(file_path, chunk_size))
+            else:
+                self.load_id = stored[0]
+                if stored[1] != table_def.name:
+                    raise ValueError("The checkpoint is for {}, not {}".format(
+                        stored[1], table_def.name))
+                if tuple(stored[2:]) != (stat.st_size, stat.st_mtime_ns):
+                    raise ValueError("{} changed since the checkpoint was made".format(file_path))
+
+    def chunks(self):
+        """Get the chunks and whether they've committed.
+
+        Returns:
+          A list of (start, end, committed) tuples
+        """
+        return [(start, end, bool(committed)) for start, end, committed in self.db.execute(
+            "SELECT chunk_start, chunk_end, committed FROM chunks ORDER BY chunk_start")]
+
+    def _manifest(self):
+        return sql.Identifier(self.table_def.schema, MANIFEST_TABLE)
+
+    def _committed_chunks(self, conn):
+        """Get the starts of the chunks of this load recorded in the manifest table."""
+        with conn.cursor() as curs:
+            curs.execute(sql.SQL("""CREATE TABLE IF NOT EXISTS {manifest} (
+                load_id VARCHAR(32), tablename VARCHAR(256), chunk_start BIGINT,
+                chunk_end BIGINT, row_count BIGINT, loaded_at TIMESTAMP)""").format(
+                    manifest=self._manifest()))
+            curs.execute(sql.SQL("SELECT chunk_start FROM {manifest} WHERE load_id = %s").format(
+                manifest=self._manifest()), (self.load_id,))
+            committed = {start for (start,) in curs.fetchall()}
+        conn.commit()
+        return committed
+
+    def _mark_committed(self, start):
+        with self.db:
+            self.db.execute("UPDATE chunks SET committed = 1 WHERE chunk_start = ?", (start,))
+
+    def run(self, conn, buffer_size=redshift_schematic.DEFAULT_LOAD_BUFFER_SIZE, progress=None,
+            batch_size=None):
+        """Create the table if it doesn't exist, then load and commit each chunk
+        that hasn't committed yet.
+
+        Args:
+          conn: A psycopg2.connection to a PostgreSQL-compatible destination
+          buffer_size: The size of each COPY, in bytes
+          progress: A function to call with the schematic.LoadStats after each chunk
+          batch_size: A schematic.AdaptiveBatchSize to use instead of buffer_size
+        Returns:
+          A schematic.LoadStats for the chunks loaded by this run
+        """
+        self.table_def.create_table(conn)
+        conn.commit()
+        in_manifest = self._committed_chunks(conn)
+        stats = schematic.LoadStats()
+        for start, end, committed in self.chunks():
+            if committed or start in in_manifest:
+                if not committed:
+                    self._mark_committed(start)
+                self.skipped += 1
+                continue
+            try:
+                chunk_stats = self.table_def.load_rows(
+                    conn, csv_schematic.read_rows(self.file_path, start, end),
+                    buffer_size=buffer_size, batch_size=batch_size)
+                with conn.cursor() as curs:
+                    curs.execute(
+                        sql.SQL("INSERT INTO {manifest} VALUES (%s, %s, %s, %s, %s, %s)").format(
+                            manifest=self._manifest()),
+                        (self.load_id, self.table_def.name, start, end, chunk_stats.rows,
+                         datetime.datetime.now(datetime.timezone.utc)))
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            self._mark_committed(start)
+            stats.add_batch(chunk_stats.rows, chunk_stats.bytes)
+            if progress:
+                progress(stats)
+        return stats
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
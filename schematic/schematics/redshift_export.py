@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2019 Cody J. Hanson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Exports Redshift (or PostgreSQL) tables to local CSV files.
+
+Rows are streamed out with COPY ... TO STDOUT where the server supports it,
+or through a server-side cursor otherwise, into CSV files that are rotated
+by size and compressed in a process pool while the export continues.
+"""
+import csv
+import io
+import os
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from schematic.schematics import redshift_schematic, redshift_staging
+
+DEFAULT_EXPORT_FILE_SIZE = 256 * 1024 * 1024
+EXPORT_METHODS = ("copy", "cursor")
+QUOTED_CHARACTERS = re.compile(r'[,"\r\n]')
+
+
+def supports_copy_to_stdout(conn):
+    """Check whether a server supports COPY ... TO STDOUT, which PostgreSQL
+    does but Redshift doesn't.
+
+    Args:
+      conn: A psycopg2.connection
+    Returns:
+      A bool
+    """
+    with conn.cursor() as curs:
+        curs.execute("SELECT version();")
+        return "Redshift" not in curs.fetchone()[0]
+
+
+def _compress_file(args):
+    """Compress a file, removing the uncompressed original.
+
+    Returns:
+      The path of the compressed file
+    """
+    path, compression = args
+    compressed_path = path + redshift_staging.COMPRESSION_EXTENSIONS[compression]
+    with open(path, 'rb') as source, \
+            redshift_staging._open_compressed(compressed_path, compression) as dest:
+        shutil.copyfileobj(source, dest, redshift_staging.COPY_BLOCK_SIZE)
+    os.remove(path)
+    return compressed_path
+
+
+def _format_value(value, null_string=""):
+    """Format a value from a cursor as a CSV field like COPY ... TO STDOUT WITH CSV
+    would, so nulls and empty strings stay distinct.
+
+    Args:
+      value: The value
+      null_string: The field to write nulls as
+    Returns:
+      A string
+    """
+    if value is None:
+        return null_string
+    if value is True:
+        return "t"
+    if value is False:
+        return "f"
+    value = str(value)
+    if value == null_string or QUOTED_CHARACTERS.search(value):
+        return '"{}"'.format(value.replace('"', '""'))
+    return value
+
+
+class RotatingFileWriter():
+    """A binary file-like object that writes CSV data to a series of files,
+    starting a new one once the current one reaches max_bytes, and hands each
+    finished file to an executor to be compressed.
+
+    A file is only rotated after a write that ends a line, so each write
+    should be one or more whole rows, as COPY ... TO STDOUT's are.
+
+    Attributes:
+      paths: The paths of the finished files, once closed
+    """
+
+    def __init__(self,
+                 out_dir,
+                 prefix,
+                 header=None,
+                 max_bytes=DEFAULT_EXPORT_FILE_SIZE,
+                 compression="gzip",
+                 executor=None):
+        """
+        Args:
+          out_dir: Directory to write the files to
+          prefix: Prefix of each file name, followed by its number
+          header: Bytes to write at the start of each file, e.g. a header row
+          max_bytes: The size in bytes to rotate files at
+          compression: "gzip", "zstd" or None
+          executor: A concurrent.futures.Executor to compress files in,
+                    required unless compression is None
+        """
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.header = header or b""
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self.executor = executor
+        self.paths = []
+        self._files = []
+        self._file = None
+        self._size = 0
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if not data:
+            return 0
+        if self._file is None:
+            path = os.path.join(self.out_dir, "{}.{:04d}.csv".format(
+                self.prefix, len(self._files)))
+            self._file = open(path, 'wb', buffering=redshift_staging.COPY_BLOCK_SIZE)
+            self._file.write(self.header)
+            self._size = len(self.header)
+        self._file.write(data)
+        self._size += len(data)
+        if self._size >= self.max_bytes and data.endswith(b"\n"):
+            self._rotate()
+        return len(data)
+
+    def _rotate(self):
+        self._file.close()
+        if self.compression is None:
+            self._files.append(self._file.name)
+        else:
+            self._files.append(self.executor.submit(
+                _compress_file, (self._file.name, self.compression)))
+        self._file = None
+
+    def close(self):
+        """Finish the last file and wait for all the files to be compressed."""
+        if self._file is not None:
+            self._rotate()
+        self.paths = [path if isinstance(path, str) else path.result()
+                      for path in self._files]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+
+def export_table(conn,
+                 redshift_table_def,
+                 out_dir,
+                 max_bytes=DEFAULT_EXPORT_FILE_SIZE,
+                 compression="gzip",
+                 processes=None,
+                 method=None,
+                 itersize=redshift_schematic.DEFAULT_ITERSIZE):
+    """Export a table to CSV files with a header row, rotated by size and
+    compressed in a process pool.
+
+    Nulls are written as the table's null sentinel if it has exactly one
+    (see RedshiftTableDefinition.null_as), otherwise as empty fields, and
+    empty strings are quoted, so the files can be loaded back as they were.
+
+    Args:
+      conn: A psycopg2.connection to a Redshift or PostgreSQL instance
+      redshift_table_def: The RedshiftTableDefinition of the table to export
+      out_dir: Directory to write the files to
+      max_bytes: The approximate size in bytes of each uncompressed file
+      compression: "gzip", "zstd" or None
+      processes: The number of worker processes, or None for one per CPU
+      method: "copy" to use COPY ... TO STDOUT, "cursor" to use a server-side
+              cursor, or None to use COPY if the server supports it
+      itersize: The number of rows to fetch at a time with a cursor
+    Returns:
+      A list of paths to the exported files
+    Raises:
+      ValueError: If the method or compression isn't supported
+    """
+    if method is None:
+        method = "copy" if supports_copy_to_stdout(conn) else "cursor"
+    if method not in EXPORT_METHODS:
+        raise ValueError("Unsupported export method {}".format(method))
+    if compression not in redshift_staging.COMPRESSION_EXTENSIONS:
+        raise ValueError("Unsupported compression {}".format(compression))
+    os.makedirs(out_dir, exist_ok=True)
+    header = io.StringIO()
+    csv.writer(header, lineterminator="\n").writerow(redshift_table_def.column_names())
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        writer = RotatingFileWriter(out_dir,
+                                    redshift_table_def.tablename,
+                                    header=header.getvalue().encode("utf-8"),
+                                    max_bytes=max_bytes,
+                                    compression=compression,
+                                    executor=executor)
+        with writer:
+            if method == "copy":
+                with conn.cursor() as curs:
+                    curs.copy_expert(redshift_table_def.copy_stdout_sql(), writer)
+            else:
+                null_string = redshift_table_def.null_as() or ""
+                flush_bytes = min(redshift_staging.COPY_BLOCK_SIZE, max_bytes)
+                batch = []
+                size = 0
+                for row in redshift_table_def.get_rows(conn, itersize=itersize):
+                    line = ",".join([_format_value(value, null_string)
+                                     for value in row]) + "\n"
+                    batch.append(line)
+                    size += len(line)
+                    if size >= flush_bytes:
+                        writer.write("".join(batch))
+                        batch = []
+                        size = 0
+                writer.write("".join(batch))
+    return writer.paths
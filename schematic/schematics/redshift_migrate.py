@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2019 Cody J. Hanson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Plans and applies the changes an existing Redshift table needs to fit
+a new definition of it, e.g. one inferred from a new file, without
+reloading the table where Redshift allows.
+
+Based on Redshift documentation:
+- https://docs.aws.amazon.com/redshift/latest/dg/r_ALTER_TABLE.html
+- https://docs.aws.amazon.com/redshift/latest/dg/performing-a-deep-copy.html
+"""
+import copy
+import itertools
+import schematic
+from psycopg2 import sql
+from schematic.schematics import redshift_schematic
+
+# Redshift can't ALTER COLUMN ... TYPE for columns with these encodings
+ALTER_TYPE_INCOMPATIBLE_ENCODINGS = {"bytedict", "runlength", "text255", "text32k"}
+DEEP_COPY_SUFFIX = "_schematic_deep_copy"
+DEFAULT_EVOLVE_CHUNK_ROWS = 100000
+
+
+def can_alter(change):
+    """Check whether Redshift can make a change with ALTER TABLE: adding a
+    column, or widening a VARCHAR column without an incompatible encoding
+    or a UNIQUE or PRIMARY KEY constraint.
+
+    Args:
+      change: A schematic.ColumnChange
+    Returns:
+      A bool
+    """
+    if change.is_addition():
+        return True
+    existing = change.existing
+    return (type(existing.column_type) is redshift_schematic.RedshiftVarcharType and
+            type(change.column_type) is redshift_schematic.RedshiftVarcharType and
+            (existing.encoding or "").lower() not in ALTER_TYPE_INCOMPATIBLE_ENCODINGS and
+            not existing.primary_key and
+            not existing.unique)
+
+
+def _added_column(change):
+    """Get the column to add for a change, without constraints a column
+    can't be added to a table with existing rows with."""
+    return redshift_schematic.RedshiftTableColumn(change.required.name,
+                                                  change.column_type,
+                                                  encoding=getattr(change.required, "encoding", None))
+
+
+class MigrationPlan():
+    """The statements that change an existing table to fit a new definition of it.
+
+    If every change can be made with ALTER TABLE, the plan adds and widens
+    columns in place. Otherwise it deep copies the table: it creates a new
+    table with the changes, copies the rows into it, drops the existing table
+    and renames the new one, all in one transaction. Grants and views on
+    the existing table don't survive a deep copy.
+
+    Attributes:
+      existing: The existing RedshiftTableDefinition
+      changes: The schematic.ColumnChanges the table needs
+      target: The RedshiftTableDefinition of the table after the migration
+      strategy: "none", "alter" or "deep_copy"
+      steps: A list of psycopg2.sql objects to execute in order
+    """
+
+    def __init__(self, existing, required):
+        """
+        Args:
+          existing: The existing RedshiftTableDefinition, e.g. from from_source
+          required: A RedshiftTableDefinition of the columns the table needs to have
+        Raises:
+          ValueError: If a column's existing and needed types have no common type
+        """
+        self.existing = existing
+        self.changes = existing.diff(required)
+        self.target = self._target()
+        if not self.changes:
+            self.strategy = "none"
+            self.steps = []
+        elif all(can_alter(change) for change in self.changes):
+            self.strategy = "alter"
+            self.steps = self._alter_steps()
+        else:
+            self.strategy = "deep_copy"
+            self.steps = self._deep_copy_steps()
+
+    def _target(self):
+        columns = [copy.copy(column) for column in self.existing.columns]
+        for change in self.changes:
+            if change.is_addition():
+                columns.append(_added_column(change))
+            else:
+                index = self.existing.columns.index(change.existing)
+                columns[index].column_type = change.column_type
+        return redshift_schematic.RedshiftTableDefinition(self.existing.schema,
+                                                          self.existing.tablename,
+                                                          columns)
+
+    def _table_sql(self, tablename=None):
+        return sql.SQL("{}.{}").format(sql.Identifier(self.existing.schema),
+                                       sql.Identifier(tablename or self.existing.tablename))
+
+    def _alter_steps(self):
+        steps = []
+        for change in self.changes:
+            if change.is_addition():
+                steps.append(sql.SQL("ALTER TABLE {table} ADD COLUMN {column};").format(
+                    table=self._table_sql(),
+                    column=_added_column(change).create_sql()))
+            else:
+                steps.append(sql.SQL("ALTER TABLE {table} ALTER COLUMN {column} TYPE {column_type};").format(
+                    table=self._table_sql(),
+                    column=sql.Identifier(change.existing.name),
+                    column_type=change.column_type.to_sql()))
+        return steps
+
+    def _deep_copy_steps(self):
+        copy_name = self.existing.tablename + DEEP_COPY_SUFFIX
+        copy_table_def = redshift_schematic.RedshiftTableDefinition(self.existing.schema,
+                                                                    copy_name,
+                                                                    self.target.columns)
+        widened = {change.existing.name: change.column_type
+                   for change in self.changes if not change.is_addition()}
+        values = []
+        for column in self.existing.columns:
+            if column.name in widened:
+                values.append(sql.SQL("CAST({} AS {})").format(
+                    sql.Identifier(column.name), widened[column.name].to_sql()))
+            else:
+                values.append(sql.Identifier(column.name))
+        return [copy_table_def.create_sql(),
+                sql.SQL("INSERT INTO {copy} ({columns}) SELECT {values} FROM {table};").format(
+                    copy=self._table_sql(copy_name),
+                    columns=sql.SQL(",").join(
+                        [sql.Identifier(column.name) for column in self.existing.columns]),
+                    values=sql.SQL(",").join(values),
+                    table=self._table_sql()),
+                sql.SQL("DROP TABLE {table};").format(table=self._table_sql()),
+                sql.SQL("ALTER TABLE {copy} RENAME TO {tablename};").format(
+                    copy=self._table_sql(copy_name),
+                    tablename=sql.Identifier(self.existing.tablename))]
+
+    def apply(self, conn):
+        """Execute this plan and commit it, invalidating cached
+        definitions of the table (see notify_table_changed).
+
+        Redshift can't ALTER COLUMN ... TYPE in a transaction block, so an
+        "alter" plan commits any open transaction and runs each step in
+        autocommit mode. A "deep_copy" plan runs in a single transaction.
+
+        Args:
+          conn: A psycopg2.connection to a Redshift instance
+        """
+        if self.strategy == "none":
+            return
+        if self.strategy == "alter":
+            conn.commit()
+            autocommit = conn.autocommit
+            conn.autocommit = True
+            try:
+                with conn.cursor() as curs:
+                    for step in self.steps:
+                        curs.execute(step)
+            finally:
+                conn.autocommit = autocommit
+        else:
+            with conn.cursor() as curs:
+                try:
+                    for step in self.steps:
+                        curs.execute(step)
+                except BaseException:
+                    conn.rollback()
+                    raise
+            conn.commit()
+        redshift_schematic.notify_table_changed(conn,
+                                                self.existing.schema,
+                                                self.existing.tablename)
+
+
+class EvolvingLoader():
+    """Loads rows into a table in chunks without scanning them first. Each chunk
+    is checked against the table, and when it needs a wider type or a column the
+    table doesn't have, loading pauses while the MigrationPlan for that chunk is
+    applied, then resumes with the same chunk.
+
+    Applying a plan commits the rows loaded so far. The rows loaded after
+    the last plan are left uncommitted, as with RedshiftTableDefinition.load_rows.
+
+    Attributes:
+      table_def: The RedshiftTableDefinition of the table as it is now
+      plans: The MigrationPlans applied so far
+      stats: A schematic.LoadStats for the rows loaded so far
+    """
+
+    def __init__(self,
+                 conn,
+                 schema,
+                 name,
+                 fieldnames,
+                 table_def=None,
+                 chunk_size=DEFAULT_EVOLVE_CHUNK_ROWS,
+                 buffer_size=redshift_schematic.DEFAULT_LOAD_BUFFER_SIZE,
+                 batch_size=None):
+        """
+        Args:
+          conn: A psycopg2.connection to a Redshift instance
+          schema: The schema of the table to load into
+          name: The name of the table to load into
+          fieldnames: The names of the columns of the rows to load
+          table_def: The RedshiftTableDefinition of the existing table,
+                     or None to create the table from the first chunk
+          chunk_size: The number of rows to infer types from at a time
+          buffer_size: The size of each COPY, in bytes
+          batch_size: A schematic.AdaptiveBatchSize to use instead of buffer_size
+        """
+        self.conn = conn
+        self.schema = schema
+        self.name = name
+        self.fieldnames = fieldnames
+        self.table_def = table_def
+        self.chunk_size = chunk_size
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.plans = []
+        self.stats = schematic.LoadStats()
+        self.redshift_schematic = redshift_schematic.RedshiftSchematic()
+
+    def _misfits(self, chunk):
+        """Get the fieldnames whose values in a chunk don't all fit the table,
+        including the ones the table doesn't have yet."""
+        if self.table_def is None:
+            return list(self.fieldnames)
+        indexes, columns = [], []
+        for index, fieldname in enumerate(self.fieldnames):
+            column = self.table_def.get_column(fieldname)
+            if column is not None:
+                indexes.append(index)
+                columns.append(column)
+        report = schematic.validate_rows(columns,
+                                         (tuple(row[index] for index in indexes)
+                                          for row in chunk),
+                                         null_strings=redshift_schematic.RedshiftSchematic.null_strings,
+                                         max_examples=0)
+        fits = {column.name for column, violations in zip(columns, report.columns)
+                if not violations.count}
+        return [fieldname for fieldname in self.fieldnames
+                if self.table_def.get_column(fieldname) is None
+                or self.table_def.get_column(fieldname).name not in fits]
+
+    def _infer_chunk(self, chunk, fieldnames):
+        """Infer the columns for fieldnames from a chunk of rows. Columns without
+        values in the chunk keep their type, or get the narrowest VARCHAR if they're new."""
+        indexes = [self.fieldnames.index(fieldname) for fieldname in fieldnames]
+        chunk_def = self.redshift_schematic.table_def_from_rows(
+            schema=self.schema,
+            name=self.name,
+            fieldnames=fieldnames,
+            rows=(tuple(row[index] for index in indexes) for row in chunk))
+        columns = []
+        for column in chunk_def.columns:
+            if column.column_type is None:
+                if self.table_def is not None and self.table_def.get_column(column.name):
+                    continue
+                column.column_type = redshift_schematic.RedshiftVarcharType()
+            columns.append(column)
+        return redshift_schematic.RedshiftTableDefinition(self.schema, self.name, columns)
+
+    def _evolve(self, chunk):
+        """Create or migrate the table so it fits a chunk of rows."""
+        misfits = self._misfits(chunk)
+        if not misfits:
+            return
+        chunk_def = self._infer_chunk(chunk, misfits)
+        if self.table_def is None:
+            chunk_def.create_table(self.conn)
+            self.table_def = chunk_def
+            return
+        plan = MigrationPlan(self.table_def, chunk_def)
+        if plan.strategy != "none":
+            plan.apply(self.conn)
+            self.plans.append(plan)
+            self.table_def = plan.target
+
+    def load(self, rows, progress=None):
+        """Load rows into the table, migrating it as needed.
+
+        Args:
+          rows: An iterable of tuples of values, in the order of fieldnames
+          progress: A function to call with the schematic.LoadStats after each chunk
+        Returns:
+          The schematic.LoadStats for the rows loaded so far
+        """
+        rows = iter(rows)
+        while True:
+            chunk = list(itertools.islice(rows, self.chunk_size))
+            if not chunk:
+                return self.stats
+            self._evolve(chunk)
+            copy_table_def = redshift_schematic.RedshiftTableDefinition(
+                self.schema, self.name,
+                [self.table_def.get_column(fieldname) for fieldname in self.fieldnames])
+            chunk_stats = copy_table_def.load_rows(self.conn, chunk,
+                                                   buffer_size=self.buffer_size,
+                                                   batch_size=self.batch_size)
+            self.stats.add_batch(chunk_stats.rows, chunk_stats.bytes)
+            if progress:
+                progress(self.stats)
@@ -28,6 +28,7 @@ implementations.
 
 Based on Redshift documentation:
 - https://docs.aws.amazon.com/redshift/latest/dg/c_Supported_data_types.html
+- https://docs.aws.amazon.com/redshift/latest/dg/merge-replacing-existing-rows.html
 
 TODO(Cody): Determine how/whether to handle CHAR types (currently defaults to VARCHAR)
 TODO(Cody): Determine how/whether to handle NCHAR and NVARCHAR types
@@ -35,19 +36,28 @@ TODO(Cody): Implement how/whether to handle BPCHAR and TEXT types
 TODO(Cody): Get the datetime regexes 1:1 with Redshift's datetime logic
 """
 import schematic
+import csv
+import datetime
+import decimal
+import functools
+import io
 import re
-from psycopg2 import sql
+import time
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from psycopg2 import pool, sql
 
 VALID_DATE_PATTERNS = [
-    r"([0-9]{4}-(0[1-9]|1[0-2])-(0[1-9]|1[1-9]|2[1-9]|3[0-1]))",
-    r"(([0-9]{4})(0[1-9]|1[0-2])(0[1-9]|2[1-9]|3[0-1]))",
-    r"((0[1-9]|1[0-2])/(0[1-9]|2[1-9]|3[0-1]|[1-9])/([0-9]{2}|[0-9]{4}))",
+    r"([0-9]{4}-(0[1-9]|1[0-2])-(0[1-9]|[12][0-9]|3[0-1]))",
+    r"(([0-9]{4})(0[1-9]|1[0-2])(0[1-9]|[12][0-9]|3[0-1]))",
+    r"((0[1-9]|1[0-2])/(0[1-9]|[12][0-9]|3[0-1]|[1-9])/([0-9]{2}|[0-9]{4}))",
     r"(today)",
     r"(tomorrow)",
     r"(yesterday)"]
 VALID_DATE_PATTERN = r"({})".format(r"|".join(VALID_DATE_PATTERNS))
 VALID_TIME_PATTERNS = [
-    r"((T| )(((([0-1][0-9])|(2[0-3])):([0-5][0-9])(:([0-5][0-9]))?(\.([0-9])*))))",
+    r"((T| )(((([0-1][0-9])|(2[0-3])):([0-5][0-9])(:([0-5][0-9]))?(\.([0-9])*)?)))",
     r"((T| )((0[1-9]|1[0-2]):([0-5][0-9])(:([0-5][0-9]))?(\.([0-9]*))? (AM|PM)))"
 ]
 VALID_TIME_PATTERN = r"({})".format("|".join(VALID_TIME_PATTERNS))
@@ -56,6 +66,162 @@ VALID_TIMEZONE_PATTERNS = [
 ]
 VALID_TIMEZONE_PATTERN = r"({})".format("|".join(VALID_TIMEZONE_PATTERNS))
 DEFAULT_NULL_STRINGS = ["", "None", "Null"]
+DEFAULT_ITERSIZE = 10000
+DEFAULT_LOAD_BUFFER_SIZE = 64 * 1024 * 1024
+DEFAULT_REFLECT_POOL_SIZE = 4
+DEFAULT_TYPE_CACHE_SIZE = 1024
+# Objects with a table_changed(conn, schema, name) method, called by
+# notify_table_changed after DDL. Held weakly so they can be garbage collected.
+TABLE_CHANGE_LISTENERS = weakref.WeakSet()
+CANDIDATE_NULL_STRINGS = ["NULL", "null", "NONE", "none", "NA", "N/A", "n/a",
+                          "na", "#N/A", "\\N", "-", "--", "?", "."]
+DATETIME_FORMAT_TOKENS = {
+    "YYYY": r"[0-9]{4}",
+    "YY": r"[0-9]{2}",
+    "MM": r"(0[1-9]|1[0-2])",
+    "DD": r"(0[1-9]|[12][0-9]|3[01])",
+    "HH24": r"([01][0-9]|2[0-3])",
+    "HH12": r"(0[1-9]|1[0-2])",
+    "HH": r"([01][0-9]|2[0-3])",
+    "MI": r"[0-5][0-9]",
+    "SS": r"[0-5][0-9](\.[0-9]{1,6})?",
+    "AM": r"(AM|PM)"}
+DATETIME_FORMAT_TOKEN_REGEX = re.compile(
+    "|".join(sorted(DATETIME_FORMAT_TOKENS, key=len, reverse=True)))
+DATE_FORMATS = ["YYYY-MM-DD",
+                "YYYYMMDD",
+                "MM/DD/YYYY",
+                "MM/DD/YY"]
+TIME_FORMATS = ["YYYY-MM-DD HH:MI:SS",
+                "YYYY-MM-DD HH:MI",
+                "YYYYMMDD HH:MI:SS",
+                "MM/DD/YYYY HH:MI:SS",
+                "YYYY-MM-DD HH12:MI:SS AM",
+                "MM/DD/YYYY HH12:MI:SS AM"]
+
+
+DATE_KEYWORD_OFFSETS = {"today": 0, "tomorrow": 1, "yesterday": -1}
+VALID_DATETIME_FIELD_REGEXES = tuple(
+    re.compile(date_pattern +
+               r"([T ](?P<hour>[0-9]{2}):(?P<minute>[0-9]{2})(:(?P<second>[0-9]{2}))?"
+               r"(?P<fraction>\.[0-9]*)?( (?P<meridiem>AM|PM))?)?"
+               r"(\+(?P<utc_offset>[0-9]{2}):00(:00)?)?\Z")
+    for date_pattern in [
+        r"(?P<year>[0-9]{4})-(?P<month>[0-9]{2})-(?P<day>[0-9]{2})",
+        r"(?P<year>[0-9]{4})(?P<month>[0-9]{2})(?P<day>[0-9]{2})",
+        r"(?P<month>[0-9]{2})/(?P<day>[0-9]{1,2})/(?P<short_year>[0-9]{2})",
+        r"(?P<month>[0-9]{2})/(?P<day>[0-9]{1,2})/(?P<year>[0-9]{4})",
+        r"(?P<keyword>today|tomorrow|yesterday)"])
+DATETIME_FORMAT_FIELDS = {"YYYY": "year",
+                          "YY": "short_year",
+                          "MM": "month",
+                          "DD": "day",
+                          "HH24": "hour",
+                          "HH12": "hour12",
+                          "HH": "hour",
+                          "MI": "minute",
+                          "SS": "second",
+                          "AM": "meridiem"}
+
+
+def _datetime_format_regex(datetime_format):
+    """Compile a Redshift DATEFORMAT or TIMEFORMAT string into a regex matching
+    whole values written in it, with a group named for each field
+    (see DATETIME_FORMAT_FIELDS)."""
+    pattern = ""
+    position = 0
+    for token in DATETIME_FORMAT_TOKEN_REGEX.finditer(datetime_format):
+        pattern += re.escape(datetime_format[position:token.start()])
+        pattern += "(?P<{}>{})".format(DATETIME_FORMAT_FIELDS[token.group(0)],
+                                       DATETIME_FORMAT_TOKENS[token.group(0)])
+        position = token.end()
+    pattern += re.escape(datetime_format[position:])
+    return re.compile(r"{}\Z".format(pattern))
+
+
+def datetime_format_validator(datetime_format):
+    """Compile a Redshift DATEFORMAT or TIMEFORMAT string into a validator.
+
+    Based on Redshift documentation:
+    - https://docs.aws.amazon.com/redshift/latest/dg/r_DATEFORMAT_and_TIMEFORMAT_strings.html
+
+    Args:
+      datetime_format: The format string, e.g. 'YYYY-MM-DD HH:MI:SS'
+    Returns:
+      A function that returns a truthy value for values written in the format
+    """
+    return _datetime_format_regex(datetime_format).match
+
+
+def datetime_format_parser(datetime_format):
+    """Compile a Redshift DATEFORMAT or TIMEFORMAT string into a parser that
+    splits values into their fields, e.g. for comparing them.
+
+    Args:
+      datetime_format: The format string, e.g. 'MM/DD/YYYY HH12:MI:SS AM'
+    Returns:
+      A function from a value to a (year, month, day, hour, minute, second)
+      tuple, or None for values not written in the format
+    """
+    match = _datetime_format_regex(datetime_format).match
+
+    def parse(value):
+        fields = match(value)
+        if fields is None:
+            return None
+        return _datetime_fields(fields.groupdict())
+    return parse
+
+
+def _datetime_fields(fields):
+    """Turn the named groups of a datetime match into a
+    (year, month, day, hour, minute, second) tuple."""
+    if fields.get("keyword"):
+        date = datetime.date.today() + datetime.timedelta(
+            days=DATE_KEYWORD_OFFSETS[fields["keyword"]])
+        year, month, day = date.year, date.month, date.day
+    else:
+        if fields.get("year"):
+            year = int(fields["year"])
+        elif fields.get("short_year"):
+            year = int(fields["short_year"])
+            year += 1900 if year >= 70 else 2000
+        else:
+            year = 0
+        month = int(fields.get("month") or 0)
+        day = int(fields.get("day") or 0)
+    if fields.get("hour12") or fields.get("meridiem"):
+        hour = int(fields.get("hour12") or fields["hour"]) % 12 + (
+            12 if fields.get("meridiem") == "PM" else 0)
+    else:
+        hour = int(fields.get("hour") or 0)
+    return (year,
+            month,
+            day,
+            hour,
+            int(fields.get("minute") or 0),
+            float((fields.get("second") or "0") + (fields.get("fraction") or "")))
+
+
+def _match_valid_datetime(value):
+    """Match a value accepted by VALID_DATE_PATTERN, optionally followed by
+    VALID_TIME_PATTERN and VALID_TIMEZONE_PATTERN, with a group named for each
+    field, for parsing values that aren't in any of DATE_FORMATS or TIME_FORMATS.
+
+    Returns:
+      A re.Match, or None
+    """
+    for regex in VALID_DATETIME_FIELD_REGEXES:
+        match = regex.match(value)
+        if match is not None:
+            return match
+    return None
+
+
+DATE_FORMAT_VALIDATORS = tuple((f, datetime_format_validator(f))
+                               for f in DATE_FORMATS)
+TIME_FORMAT_VALIDATORS = tuple((f, datetime_format_validator(f))
+                               for f in TIME_FORMATS)
 
 
 class RedshiftTableColumn(schematic.TableColumn, schematic.NameSqlMixin):
@@ -70,7 +236,10 @@ class RedshiftTableColumn(schematic.TableColumn, schematic.NameSqlMixin):
       notnull: Whether or not this column has a NOT NULL constraint.
       primary_key: Optimization hint for Redshift query planner, boolean
       unique: Optimization hint for Redshift query planner, boolean
-    TODO(Cody): Implement the actual logic and create_sql for column constraints.
+      datetime_format: For date and time columns, the DATEFORMAT or TIMEFORMAT
+                       every value is written in, or None if unknown
+      null_strings: Values used as null sentinels in this column, in addition
+                    to RedshiftSchematic.null_strings
     """
 
     def __init__(self,
@@ -81,7 +250,9 @@ class RedshiftTableColumn(schematic.TableColumn, schematic.NameSqlMixin):
                  encoding=None,
                  notnull=False,
                  primary_key=False,
-                 unique=False):
+                 unique=False,
+                 datetime_format=None,
+                 null_strings=()):
         super().__init__(name, column_type=column_type)
         self.distkey = distkey
         self.sortkey = sortkey
@@ -89,6 +260,17 @@ class RedshiftTableColumn(schematic.TableColumn, schematic.NameSqlMixin):
         self.notnull = notnull
         self.primary_key = primary_key
         self.unique = unique
+        self.datetime_format = datetime_format
+        self.null_strings = list(null_strings)
+
+    def converter(self):
+        """Compile a function that converts this column's values from strings,
+        parsing dates and times in its datetime_format.
+
+        Returns:
+          A function, see TableColumnType.converter
+        """
+        return self.column_type.converter(self.datetime_format)
 
     def create_sql(self):
         """psycopg2.sql for this column in a CREATE TABLE statement
@@ -96,9 +278,19 @@ class RedshiftTableColumn(schematic.TableColumn, schematic.NameSqlMixin):
         Returns:
            A psycopg2.sql object
         """
-        return sql.SQL("{name} {column_type}").format(
-            name=sql.Identifier(
-                self.name), column_type=self.column_type.to_sql())
+        constraints = []
+        if self.encoding and self.encoding.lower() != "none":
+            constraints.append(sql.SQL("ENCODE {}").format(sql.SQL(self.encoding)))
+        if self.notnull:
+            constraints.append(sql.SQL("NOT NULL"))
+        if self.primary_key:
+            constraints.append(sql.SQL("PRIMARY KEY"))
+        elif self.unique:
+            constraints.append(sql.SQL("UNIQUE"))
+        return sql.SQL(" ").join(
+            [sql.SQL("{name} {column_type}").format(
+                name=sql.Identifier(
+                    self.name), column_type=self.column_type.to_sql())] + constraints)
 
 
 class RedshiftTableColumnType(schematic.TableColumnType):
@@ -106,9 +298,15 @@ class RedshiftTableColumnType(schematic.TableColumnType):
     implementations.
 
     Attributes:
-      def_regex: a regex to match against the "type" column in pg_table_def
+      def_regex: a regex matching the whole "type" column in pg_table_def
+      copy_format_option: The COPY option for the format of values of this
+                          type, e.g. "DATEFORMAT", or None if it has none
+      max_text_bytes: The most bytes a value of this type takes as text,
+                      e.g. for widening a column of this type to VARCHAR
     """
     def_regex = None
+    copy_format_option = None
+    max_text_bytes = 65535
 
     @classmethod
     def from_pg_table_def(cls, type_string):
@@ -118,13 +316,21 @@ class RedshiftTableColumnType(schematic.TableColumnType):
         Raises:
           ValueError: if the type_string can't be matched by the def_regex for the class
         """
-        search = cls.def_regex.search(type_string)
-        if not search:
+        match = cls.def_regex.fullmatch(type_string)
+        if not match:
             raise ValueError(
                 "{} is not a valid type string for {}".format(
                     type_string, cls.name))
+        return cls.from_def_groups(match.groups())
+
+    @classmethod
+    def from_def_groups(cls, groups):
+        """Instantiate from the groups matched by def_regex.
+        Returns:
+          A RedshiftTableColumnType instance
+        """
         if cls.parameterized:
-            return cls(parameter=search.group(1))
+            return cls(parameter=groups[0])
         else:
             return(cls())
 
@@ -148,6 +354,17 @@ class RedshiftVarcharType(RedshiftTableColumnType):
                 "Value too large for parameter. VARCHAR columns can have a length of at most {}".format(
                     RedshiftSchematic.MAX_CHAR_BYTES))
 
+    @property
+    def max_text_bytes(self):
+        return self.parameter
+
+    @classmethod
+    def holding(cls, *column_types):
+        parameter = max(column_type.max_text_bytes for column_type in column_types)
+        if parameter > RedshiftSchematic.MAX_VARCHAR_BYTES:
+            return None
+        return cls(parameter)
+
     def to_sql(self):
         return sql.SQL("VARCHAR ({})".format(self.parameter))
 
@@ -196,6 +413,10 @@ class RedshiftCharType(RedshiftVarcharType):
     def __init__(self, parameter=1):
         super(RedshiftCharType, self).__init__(int(parameter))
 
+    @classmethod
+    def holding(cls, *column_types):
+        return cls(max(column_type.parameter for column_type in column_types))
+
     def to_sql(self):
         return sql.SQL("CHAR ({})".format(self.parameter))
 
@@ -236,22 +457,85 @@ class RedshiftAbstractDatetimeType(RedshiftTableColumnType):
         """
         return bool(self.valid_regex.match(value))
 
+    @staticmethod
+    def from_fields(fields):
+        """Build a Python object from a datetime_format_parser result.
+
+        Raises:
+          NotImplementedError: Subclasses should implement this.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def from_isoformat(value):
+        """Build a Python object from an ISO 8601 value.
+
+        Raises:
+          NotImplementedError: Subclasses should implement this.
+        """
+        raise NotImplementedError
+
+    def converter(self, datetime_format=None):
+        """Compile a function that parses values in datetime_format, or in
+        any of this type's formats if it's None, falling back to any value
+        valid_regex accepts and then to ISO 8601.
+
+        Args:
+          datetime_format: The DATEFORMAT or TIMEFORMAT of the values, or None
+        Returns:
+          A function from a string to a datetime.date or datetime.datetime
+        """
+        if datetime_format:
+            parsers = (datetime_format_parser(datetime_format),)
+        else:
+            parsers = tuple(datetime_format_parser(f) for f, _ in self.formats)
+        from_fields = self.from_fields
+        from_isoformat = self.from_isoformat
+        valid = self.valid_regex.match
+
+        def convert(value):
+            for parse in parsers:
+                fields = parse(value)
+                if fields is not None:
+                    return from_fields(fields)
+            match = _match_valid_datetime(value) if valid(value) else None
+            if match is None:
+                return from_isoformat(value)
+            converted = from_fields(_datetime_fields(match.groupdict()))
+            if match["utc_offset"]:
+                converted = converted.replace(tzinfo=datetime.timezone(
+                    datetime.timedelta(hours=int(match["utc_offset"]))))
+            return converted
+        return convert
+
+
+def _datetime_from_fields(fields):
+    year, month, day, hour, minute, second = fields
+    return datetime.datetime(year, month, day, hour, minute, int(second),
+                             min(round(second % 1 * 1000000), 999999))
+
 
 class RedshiftTimestampTZType(RedshiftAbstractDatetimeType):
     """A Timestamp with time zone type in Redshift"""
     name = "RedshiftTimestampTZType"
+    max_text_bytes = 32
     next_less_restrictive = RedshiftVarcharType
     parameterized = False
     def_regex = re.compile(r"timestamp with time zone")
     valid_regex = re.compile(
-        "^(({vdp})({vtp})({vtzp}))|({vdp})({vtp})$".format(
+        r"^({vdp})({vtp})(({vtzp})(:00)?)?\Z".format(
             vdp=VALID_DATE_PATTERN,
             vtp=VALID_TIME_PATTERN,
             vtzp=VALID_TIMEZONE_PATTERN))
+    formats = TIME_FORMAT_VALIDATORS
+    copy_format_option = "TIMEFORMAT"
 
     def __init__(self):
         super(RedshiftTimestampTZType, self).__init__()
 
+    from_fields = staticmethod(_datetime_from_fields)
+    from_isoformat = staticmethod(datetime.datetime.fromisoformat)
+
     def to_sql(self):
         return sql.SQL("TIMESTAMPTZ")
 
@@ -259,15 +543,21 @@ class RedshiftTimestampTZType(RedshiftAbstractDatetimeType):
 class RedshiftTimestampType(RedshiftAbstractDatetimeType):
     """A timestamp type in Redshift"""
     name = "RedshiftTimestampType"
+    max_text_bytes = 26
     next_less_restrictive = RedshiftTimestampTZType
     parameterized = False
     def_regex = re.compile(r"timestamp without time zone")
-    valid_regex = re.compile("^({})({})$".format(VALID_DATE_PATTERN,
-                                                 VALID_TIME_PATTERN))
+    valid_regex = re.compile(r"^({})({})\Z".format(VALID_DATE_PATTERN,
+                                                   VALID_TIME_PATTERN))
+    formats = TIME_FORMAT_VALIDATORS
+    copy_format_option = "TIMEFORMAT"
 
     def __init__(self):
         super(RedshiftTimestampType, self).__init__()
 
+    from_fields = staticmethod(_datetime_from_fields)
+    from_isoformat = staticmethod(datetime.datetime.fromisoformat)
+
     def to_sql(self):
         return sql.SQL("TIMESTAMP")
 
@@ -275,14 +565,23 @@ class RedshiftTimestampType(RedshiftAbstractDatetimeType):
 class RedshiftDateType(RedshiftAbstractDatetimeType):
     """A DATE type in Redshift"""
     name = "RedshiftDateType"
+    max_text_bytes = 10
     next_less_restrictive = RedshiftTimestampTZType
     parameterized = False
     def_regex = re.compile(r"date")
-    valid_regex = re.compile("^({})$".format(VALID_DATE_PATTERN))
+    valid_regex = re.compile(r"^({})\Z".format(VALID_DATE_PATTERN))
+    formats = DATE_FORMAT_VALIDATORS
+    copy_format_option = "DATEFORMAT"
 
     def __init__(self):
         super(RedshiftDateType, self).__init__()
 
+    from_isoformat = staticmethod(datetime.date.fromisoformat)
+
+    @staticmethod
+    def from_fields(fields):
+        return datetime.date(*fields[:3])
+
     def to_sql(self):
         return sql.SQL("DATE")
 
@@ -292,9 +591,9 @@ class RedshiftAbstractDecimalType(RedshiftTableColumnType):
     checking logic.
 
     Attributes:
-      scale: Total number of digits that can fit into a column of this type.
-      precision: Number of digits to right of the decimal point that can
-                 fit into a column of this type.
+      precision: Total number of digits that can fit into a column of this type.
+      scale: Number of digits to right of the decimal point that can
+             fit into a column of this type.
     TODO(Cody): Update the logic for compatibility--it's not necessarily true
     that being able to cast to float in python means that the value is a decimal.
     """
@@ -331,9 +630,20 @@ class RedshiftAbstractDecimalType(RedshiftTableColumnType):
             float(value)
         except ValueError:
             return False
-        scale, precision = self.get_parameter_for_value(value)
-        return (scale <= scale_to_check and
-                precision <= precision_to_check)
+        precision, scale = self.get_parameter_for_value(value)
+        return (precision <= precision_to_check and
+                scale <= scale_to_check)
+
+    def converter(self, datetime_format=None):
+        """Values are converted to decimal.Decimal."""
+        return _to_decimal
+
+
+def _to_decimal(value):
+    try:
+        return decimal.Decimal(value)
+    except decimal.InvalidOperation:
+        raise ValueError("Invalid decimal value {!r}".format(value))
 
 
 class RedshiftDecimalType(RedshiftAbstractDecimalType):
@@ -350,25 +660,45 @@ class RedshiftDecimalType(RedshiftAbstractDecimalType):
         self.precision, self.scale = int(parameter[0]), int(parameter[1])
 
     @classmethod
-    def from_pg_table_def(cls, type_string):
-        search = cls.def_regex.search(type_string)
-        if not search:
-            raise ValueError(
-                "{} is not a valid type string for {}".format(
-                    type_string, cls.name))
-        return cls(parameter=search.groups())
+    def from_def_groups(cls, groups):
+        return cls(parameter=groups)
+
+    @property
+    def max_text_bytes(self):
+        return self.precision + 2
+
+    @classmethod
+    def holding(cls, *column_types):
+        """Get the narrowest DECIMAL with enough integer digits and scale for
+        every value of the given DECIMAL and integer types."""
+        digits = scale = 0
+        for column_type in column_types:
+            if isinstance(column_type, RedshiftDecimalType):
+                digits = max(digits, column_type.precision - column_type.scale)
+                scale = max(scale, column_type.scale)
+            elif isinstance(column_type, RedshiftAbstractIntType):
+                digits = max(digits, len(str(column_type.max_value)))
+            else:
+                return None
+        if digits + scale > cls.max_precision:
+            return None
+        return cls((digits + scale, scale))
 
     def to_sql(self):
         return sql.SQL("DECIMAL({}, {})".format(self.precision, self.scale))
 
     def value_is_compatible(self, value):
         """Determine if value can be inserted into column of
-           type described by the instance.
+           type described by the instance, i.e. if it has at most scale
+           digits after the decimal point and precision - scale before it.
 
         Args:
           value: The value to check.
         """
-        return self.check_compatible(value)
+        if not self.check_compatible(value):
+            return False
+        precision, scale = self.get_parameter_for_value(value)
+        return precision - scale <= self.precision - self.scale
 
     def _value_is_compatible_superset(self, value):
         """Determine if value can be inserted into column of
@@ -385,6 +715,7 @@ class RedshiftDecimalType(RedshiftAbstractDecimalType):
 class RedshiftDoublePrecisionType(RedshiftAbstractDecimalType):
     """An double precision type in Redshift"""
     name = "RedshiftDoublePrecisionType"
+    max_text_bytes = 24
     next_less_restrictive = RedshiftDecimalType
     parameterized = False
     precision = 15
@@ -394,6 +725,10 @@ class RedshiftDoublePrecisionType(RedshiftAbstractDecimalType):
     def __init__(self):
         super(RedshiftDoublePrecisionType, self).__init__()
 
+    def converter(self, datetime_format=None):
+        """Values are converted to floats."""
+        return float
+
     def to_sql(self):
         return sql.SQL("DOUBLE PRECISION")
 
@@ -410,6 +745,7 @@ class RedshiftDoublePrecisionType(RedshiftAbstractDecimalType):
 class RedshiftRealType(RedshiftAbstractDecimalType):
     """An real type in Redshift"""
     name = "RedshiftRealType"
+    max_text_bytes = 15
     next_less_restrictive = RedshiftDoublePrecisionType
     parameterized = False
     precision = 6
@@ -419,6 +755,10 @@ class RedshiftRealType(RedshiftAbstractDecimalType):
     def __init__(self):
         super(RedshiftRealType, self).__init__()
 
+    def converter(self, datetime_format=None):
+        """Values are converted to floats."""
+        return float
+
     def to_sql(self):
         return sql.SQL("REAL")
 
@@ -460,10 +800,26 @@ class RedshiftAbstractIntType(RedshiftTableColumnType):
                 cast_value <= self.max_value and
                 cast_value // 1 == cast_value)
 
+    def converter(self, datetime_format=None):
+        """Values are converted to ints, including whole numbers written
+        with a fractional part or exponent, e.g. '1.0' or '1e3'."""
+        return _to_int
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except ValueError:
+        number = _to_decimal(value)
+        if not number.is_finite() or number != number.to_integral_value():
+            raise ValueError("Invalid integer value {!r}".format(value))
+        return int(number)
+
 
 class RedshiftBigIntType(RedshiftAbstractIntType):
     """An bigint type in Redshift"""
     name = "RedshiftBigIntType"
+    max_text_bytes = 20
     next_less_restrictive = RedshiftDoublePrecisionType
     min_value = -9223372036854775808
     max_value = 9223372036854775807
@@ -479,11 +835,12 @@ class RedshiftBigIntType(RedshiftAbstractIntType):
 class RedshiftIntType(RedshiftAbstractIntType):
     """An int type in Redshift"""
     name = "RedshiftIntType"
+    max_text_bytes = 11
     next_less_restrictive = RedshiftBigIntType
     parameterized = False
     min_value = -2147483648
     max_value = 2147483647
-    def_regex = re.compile(r"int")
+    def_regex = re.compile(r"integer")
 
     def __init__(self):
         super(RedshiftIntType, self).__init__()
@@ -495,6 +852,7 @@ class RedshiftIntType(RedshiftAbstractIntType):
 class RedshiftSmallIntType(RedshiftAbstractIntType):
     """A smallint type in Redshift"""
     name = "RedshiftSmallIntType"
+    max_text_bytes = 6
     next_less_restrictive = RedshiftIntType
     parameterized = False
     min_value = -32768
@@ -511,6 +869,7 @@ class RedshiftSmallIntType(RedshiftAbstractIntType):
 class RedshiftBooleanType(RedshiftTableColumnType):
     """A boolean type in Redshift"""
     name = "RedshiftBooleanType"
+    max_text_bytes = 5
     next_less_restrictive = RedshiftBigIntType
     parameterized = False
     valid_true_literals = ['TRUE', 't', 'true', 'y', 'yes', '1']
@@ -532,6 +891,19 @@ class RedshiftBooleanType(RedshiftTableColumnType):
         """
         return value in self.valid_false_literals or value in self.valid_true_literals
 
+    def converter(self, datetime_format=None):
+        """Values are converted to bools by looking them up in
+        valid_true_literals and valid_false_literals."""
+        literals = dict.fromkeys(self.valid_false_literals, False)
+        literals.update(dict.fromkeys(self.valid_true_literals, True))
+
+        def convert(value):
+            try:
+                return literals[value]
+            except KeyError:
+                raise ValueError("Invalid boolean value {!r}".format(value))
+        return convert
+
 
 class RedshiftTableDefinition(schematic.TableDefinition):
     """Redshift-specific implementation of TableDefinition
@@ -572,6 +944,19 @@ class RedshiftTableDefinition(schematic.TableDefinition):
           psycopg2.OperationalError: if there are connection/transaction issues
 
         """
+        return cls.from_catalog_rows(schema, name, cls.catalog_rows(conn, schema, name))
+
+    @classmethod
+    def catalog_rows(cls, conn, schema, name):
+        """Get the rows describing a table's columns from pg_table_def.
+
+        Args:
+          conn: A psycopg2.connection to a Redshift instance
+          schema: The name of the schema where the table resides
+          name: The name of the table
+        Returns:
+          A list of (column, type, encoding, distkey, sortkey, notnull) tuples
+        """
         get_sql = sql.SQL("""
         SET search_path TO {schemaname};
         SELECT
@@ -586,21 +971,33 @@ class RedshiftTableDefinition(schematic.TableDefinition):
           AND tablename = {tablename};
         """).format(schemaname=sql.Literal(schema),
                     tablename=sql.Literal(name))
-        table_def = cls(schema=schema,
-                        name=name,
-                        columns=[])
         with conn.cursor() as curs:
             curs.execute(get_sql)
-            for column, column_type, encoding, distkey, sortkey, notnull in curs.fetchall():
-                table_def.add_column(
-                    RedshiftTableColumn(
-                        name=column,
-                        column_type=RedshiftSchematic().get_type_from_string(column_type),
-                        encoding=encoding,
-                        distkey=distkey,
-                        sortkey=sortkey,
-                        notnull=notnull))
-        return table_def
+            return [tuple(row) for row in curs.fetchall()]
+
+    @classmethod
+    def from_catalog_rows(cls, schema, name, rows):
+        """Instantiate from the rows describing a table's columns in pg_table_def.
+
+        Args:
+          schema: The name of the schema where the table resides
+          name: The name of the table
+          rows: (column, type, encoding, distkey, sortkey, notnull) tuples,
+                as returned by catalog_rows
+        Returns:
+          A RedshiftTableDefinition object
+        """
+        redshift_schematic = RedshiftSchematic()
+        return cls(schema=schema,
+                   name=name,
+                   columns=[RedshiftTableColumn(
+                       name=column,
+                       column_type=redshift_schematic.get_type_from_string(column_type),
+                       encoding=encoding,
+                       distkey=distkey,
+                       sortkey=sortkey,
+                       notnull=notnull)
+                       for column, column_type, encoding, distkey, sortkey, notnull in rows])
 
     def create_sql(self):
         """Generate a sql statement for creating a table based
@@ -619,7 +1016,7 @@ class RedshiftTableDefinition(schematic.TableDefinition):
         distkey_sql = sql.SQL("DISTKEY ({col})").format(
             col=sql.Identifier(self.distkey.name)) if self.distkey else sql.SQL("")
         sortkey_sql = sql.SQL("SORTKEY ({col})").format(col=sql.SQL(",").join(
-            [sql.Identifier(column.name) for column in self.columns]))
+            [sql.Identifier(column.name) for column in self.sortkeys])) if self.sortkeys else sql.SQL("")
         return sql.SQL("""CREATE TABLE IF NOT EXISTS {schema}.{tablename}
         ({columns})
         {distkey} {sortkey};""").format(
@@ -631,6 +1028,298 @@ class RedshiftTableDefinition(schematic.TableDefinition):
             distkey=distkey_sql,
             sortkey=sortkey_sql)
 
+    def _copy_format_sql(self, option):
+        """Get the COPY option for the format of this table's date or time values.
+
+        Args:
+          option: "DATEFORMAT" or "TIMEFORMAT"
+        Returns:
+          A psycopg2.sql.SQL object. The single format every column of the option's
+          types is written in, 'auto' if they aren't all written in the same format,
+          or empty if there are no such columns.
+        """
+        formats = set(column.datetime_format for column in self.columns
+                      if column.column_type.copy_format_option == option)
+        if not formats:
+            return sql.SQL("")
+        datetime_format = formats.pop() if len(formats) == 1 else None
+        return sql.SQL("{option} {datetime_format}").format(
+            option=sql.SQL(option),
+            datetime_format=sql.Literal(datetime_format or "auto"))
+
+    def null_as(self):
+        """Get the null sentinel to load this table with.
+
+        COPY only accepts a single NULL AS string, so values in columns with
+        other sentinels must be rewritten before loading.
+
+        Returns:
+          The null sentinel detected in this table's columns if there's only one,
+          otherwise None
+        """
+        null_strings = set(null_string for column in self.columns
+                           for null_string in column.null_strings)
+        return null_strings.pop() if len(null_strings) == 1 else None
+
+    def copy_sql(self, source, iam_role=None, credentials=None, options=(), null_as=True):
+        """Generate a COPY statement for loading CSV data into this table.
+
+        Args:
+          source: Where to copy from, e.g. 's3://bucket/prefix', as a string or
+                  a psycopg2.sql object (e.g. sql.SQL("STDIN"))
+          iam_role: ARN of an IAM role to authorize the COPY with
+          credentials: A CREDENTIALS string to authorize the COPY with
+          options: Additional COPY options, as strings or psycopg2.sql objects,
+                   e.g. ["IGNOREHEADER 1", "GZIP"]
+          null_as: Whether to load the table's null sentinel as null. False for
+                   data written with write_csv, whose nulls are already empty.
+        Returns:
+          A psycopg2.sql.Composed object, with NULL AS for the table's null
+          sentinel if it has exactly one (see null_as)
+        """
+        if isinstance(source, str):
+            source = sql.Literal(source)
+        null_as = self.null_as() if null_as else None
+        return sql.SQL("""COPY {schema}.{tablename} ({columns})
+        FROM {source} {authorization}
+        FORMAT AS CSV {null_as} {dateformat} {timeformat} {options};""").format(
+            schema=sql.Identifier(self.schema),
+            tablename=sql.Identifier(self.tablename),
+            columns=sql.SQL(",").join(
+                [sql.Identifier(column.name) for column in self.columns]),
+            source=source,
+            authorization=_authorization_sql(iam_role, credentials),
+            null_as=sql.SQL("NULL AS {}").format(sql.Literal(null_as))
+            if null_as is not None else sql.SQL(""),
+            dateformat=self._copy_format_sql("DATEFORMAT"),
+            timeformat=self._copy_format_sql("TIMEFORMAT"),
+            options=_options_sql(options))
+
+    def _identifier(self):
+        """The schema-qualified name of this table, or just its name for a
+        temporary table without a schema."""
+        if self.schema is None:
+            return sql.Identifier(self.tablename)
+        return sql.Identifier(self.schema, self.tablename)
+
+    def copy_stdin_sql(self):
+        """Generate a COPY ... FROM STDIN statement for loading CSV data into this
+        table with psycopg2's copy_expert.
+
+        Redshift itself only copies from remote sources such as S3 (see copy_sql),
+        so this is for PostgreSQL-compatible destinations and stand-ins.
+
+        Returns:
+          A psycopg2.sql.Composed object
+        """
+        return sql.SQL("COPY {table} ({columns}) FROM STDIN WITH CSV").format(
+            table=self._identifier(),
+            columns=sql.SQL(",").join(
+                [sql.Identifier(column.name) for column in self.columns]))
+
+    def copy_stdout_sql(self):
+        """Generate a COPY ... TO STDOUT statement for exporting this table as CSV
+        with psycopg2's copy_expert. Like copy_stdin_sql, this is for
+        PostgreSQL-compatible sources; Redshift doesn't support it.
+
+        Returns:
+          A psycopg2.sql.Composed object, writing nulls as the table's null
+          sentinel if it has exactly one (see null_as)
+        """
+        null_as = self.null_as()
+        return sql.SQL("COPY {schema}.{tablename} ({columns}) TO STDOUT WITH CSV{null_as}").format(
+            schema=sql.Identifier(self.schema),
+            tablename=sql.Identifier(self.tablename),
+            columns=sql.SQL(",").join(
+                [sql.Identifier(column.name) for column in self.columns]),
+            null_as=sql.SQL(" NULL {}").format(sql.Literal(null_as))
+            if null_as is not None else sql.SQL(""))
+
+    def null_string_sets(self):
+        """Get the values to load as null for each column.
+
+        Returns:
+          A list of frozensets, one for each column: RedshiftSchematic.null_strings
+          plus the column's own null_strings
+        """
+        return [frozenset(RedshiftSchematic.null_strings).union(column.null_strings)
+                for column in self.columns]
+
+    def csv_rows(self, rows):
+        """Rewrite rows for writing as CSV, with every null sentinel replaced by
+        an empty value, which csv.writer writes unquoted so it's loaded as null
+        by COPY ... FORMAT AS CSV.
+
+        Args:
+          rows: An iterable of tuples of values, in column order
+        Yields:
+          A list of values
+        """
+        null_string_sets = self.null_string_sets()
+        for row in rows:
+            yield ["" if value in null_strings else value
+                   for value, null_strings in zip(row, null_string_sets)]
+
+    def write_csv(self, rows, handler):
+        """Write rows as CSV, see csv_rows.
+
+        Args:
+          rows: An iterable of tuples of values, in column order
+          handler: A writable text IO object
+        Returns:
+          The number of rows written
+        """
+        writer = csv.writer(handler)
+        count = 0
+        for row in self.csv_rows(rows):
+            writer.writerow(row)
+            count += 1
+        return count
+
+    def load_rows(self, conn, rows, buffer_size=DEFAULT_LOAD_BUFFER_SIZE, progress=None,
+                  batch_size=None):
+        """Stream rows into this table with COPY ... FROM STDIN,
+        buffering at most about buffer_size bytes at a time.
+
+        Doesn't commit, so the whole load can be rolled back.
+
+        Args:
+          conn: A psycopg2.connection to a PostgreSQL-compatible destination
+          rows: An iterable of tuples of values, in column order,
+                e.g. from CSVTableDefinition.get_rows()
+          buffer_size: The size of each COPY, in bytes
+          progress: A function to call with the schematic.LoadStats after each COPY
+          batch_size: A schematic.AdaptiveBatchSize to choose the size of each
+                      COPY instead of buffer_size. It's told how long each COPY
+                      took, and backs off if one fails.
+        Returns:
+          A schematic.LoadStats
+        Raises:
+          psycopg2.OperationalError: If there's a connection or transaction issue
+          psycopg2.DataError: If a value doesn't fit its column
+        """
+        stats = schematic.LoadStats()
+        copy_sql = self.copy_stdin_sql()
+        rows = iter(rows)
+        with conn.cursor() as curs:
+            while True:
+                if batch_size is not None:
+                    buffer_size = batch_size.size
+                buffer = io.StringIO()
+                count = self.write_csv(
+                    _until_buffer_size(rows, buffer, buffer_size), buffer)
+                if not count:
+                    break
+                num_bytes = buffer.tell()
+                buffer.seek(0)
+                started = time.monotonic()
+                try:
+                    curs.copy_expert(copy_sql, buffer)
+                except BaseException:
+                    if batch_size is not None:
+                        batch_size.backoff()
+                    raise
+                if batch_size is not None:
+                    batch_size.record(count, num_bytes, time.monotonic() - started)
+                stats.add_batch(count, num_bytes)
+                if progress:
+                    progress(stats)
+        return stats
+
+    def merge_keys(self, keys=None):
+        """Get the columns to match rows on when merging into this table.
+
+        Args:
+          keys: Names of columns, or None to use the primary key columns
+        Returns:
+          A list of RedshiftTableColumns
+        Raises:
+          ValueError: If a key isn't a column, or there are no keys
+        """
+        if keys is None:
+            columns = [column for column in self.columns if column.primary_key]
+        else:
+            columns = [self.get_column(key) for key in keys]
+            missing = [key for key, column in zip(keys, columns) if column is None]
+            if missing:
+                raise ValueError("{} has no columns named {}".format(
+                    self.name, ", ".join(missing)))
+        if not columns:
+            raise ValueError("Merging into {} needs at least one key column".format(self.name))
+        return columns
+
+    def merge_sql(self, staging_name, keys=None):
+        """Generate the statements for merging a staging table into this table:
+        create the staging table, replace the rows with matching keys, then
+        drop the staging table. The rows are loaded into the staging table
+        between the first and second statements.
+
+        The staging table is created with LIKE, so it shares this table's
+        distribution and sort keys and the DELETE join stays local to each slice.
+
+        Args:
+          staging_name: The name of the temporary staging table
+          keys: See merge_keys
+        Returns:
+          A list of psycopg2.sql.Composed objects
+        """
+        staging = sql.Identifier(staging_name)
+        target = self._identifier()
+        columns = sql.SQL(",").join(
+            [sql.Identifier(column.name) for column in self.columns])
+        matches = sql.SQL(" AND ").join(
+            [sql.SQL("{target}.{column} = {staging}.{column}").format(
+                target=target, staging=staging, column=sql.Identifier(column.name))
+             for column in self.merge_keys(keys)])
+        return [sql.SQL("CREATE TEMP TABLE {staging} (LIKE {target})").format(
+                    staging=staging, target=target),
+                sql.SQL("DELETE FROM {target} USING {staging} WHERE {matches}").format(
+                    target=target, staging=staging, matches=matches),
+                sql.SQL("INSERT INTO {target} ({columns}) SELECT {columns} FROM {staging}").format(
+                    target=target, staging=staging, columns=columns),
+                sql.SQL("DROP TABLE {staging}").format(staging=staging)]
+
+    def merge_rows(self, conn, rows, keys=None, buffer_size=DEFAULT_LOAD_BUFFER_SIZE,
+                   progress=None):
+        """Merge rows into this table through a temporary staging table, replacing
+        the existing rows whose keys match. Rows with a null key never match,
+        and rows with the same key in rows are all inserted.
+
+        Everything happens in one transaction, so the table never shows a
+        partial merge. Like load_rows, this doesn't commit; on an error the
+        transaction is rolled back.
+
+        Args:
+          conn: A psycopg2.connection to a PostgreSQL-compatible destination
+          rows: An iterable of tuples of values, in column order
+          keys: See merge_keys
+          buffer_size: The size of each COPY into the staging table, in bytes
+          progress: A function to call with the schematic.LoadStats after each COPY
+        Returns:
+          A schematic.MergeStats
+        Raises:
+          ValueError: See merge_keys
+          psycopg2.OperationalError: If there's a connection or transaction issue
+          psycopg2.DataError: If a value doesn't fit its column
+        """
+        staging_name = "{}_schematic_staging_{}".format(self.tablename, uuid.uuid4().hex[:8])
+        create, delete, insert, drop = self.merge_sql(staging_name, keys)
+        staging = RedshiftTableDefinition(None, staging_name, self.columns)
+        stats = schematic.MergeStats()
+        try:
+            with conn.cursor() as curs:
+                curs.execute(create)
+                stats.add_stats(staging.load_rows(conn, rows, buffer_size=buffer_size,
+                                                  progress=progress))
+                curs.execute(delete)
+                stats.replaced = curs.rowcount
+                curs.execute(insert)
+                curs.execute(drop)
+        except BaseException:
+            conn.rollback()
+            raise
+        return stats
+
     def create_table(self, conn):
         """Create the table based on this
         RedshiftTableDefinition in Redshift
@@ -647,16 +1336,172 @@ class RedshiftTableDefinition(schematic.TableDefinition):
             except BaseException:
                 conn.rollback()
                 raise
+        notify_table_changed(conn, self.schema, self.tablename)
+
+    def select_sql(self):
+        """Generate a SELECT statement for all the columns of this table.
+
+        Returns:
+          A psycopg2.sql.Composed object
+        """
+        return sql.SQL("SELECT {columns} FROM {schema}.{tablename}").format(
+            columns=sql.SQL(",").join(
+                [sql.Identifier(column.name) for column in self.columns]),
+            schema=sql.Identifier(self.schema),
+            tablename=sql.Identifier(self.tablename))
+
+    def unload_sql(self, conn, destination, iam_role=None, credentials=None,
+                   options=("PARALLEL ON", "MANIFEST", "GZIP")):
+        """Generate an UNLOAD statement for writing this table to S3 as CSV parts.
+
+        Args:
+          conn: A psycopg2.connection, for quoting the SELECT statement to unload
+          destination: The S3 URL prefix to unload to, e.g. 's3://bucket/prefix/'
+          iam_role, credentials: See copy_sql
+          options: Additional UNLOAD options, as strings or psycopg2.sql objects
+        Returns:
+          A psycopg2.sql.Composed object
+        """
+        return sql.SQL("""UNLOAD ({query})
+        TO {destination} {authorization}
+        FORMAT AS CSV {options};""").format(
+            query=sql.Literal(self.select_sql().as_string(conn)),
+            destination=sql.Literal(destination),
+            authorization=_authorization_sql(iam_role, credentials),
+            options=_options_sql(options))
+
+    def get_rows(self, conn, itersize=DEFAULT_ITERSIZE, columnar=False):
+        """Get the rows in this table, streamed through a named (server-side)
+        cursor so only itersize rows are held in memory at a time.
+
+        The cursor is declared in the connection's current transaction, so
+        conn must not be in autocommit mode.
 
-    def get_rows(self, conn):
-        """Get the rows in this table.
         Args:
           conn: A psycopg2.connection to a Redshift instance
+          itersize: The number of rows to fetch from the server at a time
+          columnar: If True, yield batches of up to itersize rows
+                    as a tuple of lists of values, one per column
+        Yields:
+          A tuple of values, or a tuple of lists of values if columnar
         Raises:
           psycopg2.OperationalError: If there's a connection or transaction issue
-          psycopg2.ProgrammingError: If the table already exists
+          psycopg2.ProgrammingError: If the table doesn't exist
+        """
+        cursor_name = "schematic_{}".format(uuid.uuid4().hex)
+        with conn.cursor(cursor_name) as curs:
+            curs.itersize = itersize
+            curs.execute(self.select_sql())
+            if not columnar:
+                for row in curs:
+                    yield row
+                return
+            while True:
+                batch = curs.fetchmany(itersize)
+                if not batch:
+                    return
+                yield tuple(list(values) for values in zip(*batch))
+
+
+def notify_table_changed(conn, schema, name):
+    """Tell the objects in TABLE_CHANGE_LISTENERS that DDL has changed a table,
+    e.g. so caches of its definition can be invalidated.
+
+    Args:
+      conn: The psycopg2.connection the DDL was run on
+      schema: The name of the table's schema
+      name: The name of the table
+    """
+    for listener in list(TABLE_CHANGE_LISTENERS):
+        listener.table_changed(conn, schema, name)
+
+
+def _authorization_sql(iam_role=None, credentials=None):
+    """Generate the authorization clause of a COPY or UNLOAD statement."""
+    if iam_role:
+        return sql.SQL("IAM_ROLE {}").format(sql.Literal(iam_role))
+    if credentials:
+        return sql.SQL("CREDENTIALS {}").format(sql.Literal(credentials))
+    return sql.SQL("")
+
+
+def _options_sql(options):
+    """Join COPY or UNLOAD options given as strings or psycopg2.sql objects."""
+    return sql.SQL(" ").join(
+        [option if isinstance(option, sql.Composable) else sql.SQL(option)
+         for option in options])
+
+
+def _until_buffer_size(rows, buffer, buffer_size):
+    """Yield rows until buffer has grown to buffer_size.
+
+    Args:
+      rows: An iterator of rows
+      buffer: The IO object the rows are being written to
+      buffer_size: The size in bytes to stop at
+    Yields:
+      A row
+    """
+    for row in rows:
+        yield row
+        if buffer.tell() >= buffer_size:
+            return
+
+
+class TypeStringParser():
+    """Parses the type strings in pg_table_def into RedshiftTableColumnTypes.
+
+    Every type's def_regex is compiled into a single anchored alternation, so a
+    type string is matched once rather than against each type in turn, and
+    parsed types are kept in a bounded LRU cache. Parsing the same string
+    again returns the same instance, so the instances must not be modified.
+    """
+
+    def __init__(self, column_types, maxsize=DEFAULT_TYPE_CACHE_SIZE):
+        """
+        Args:
+          column_types: The RedshiftTableColumnType classes to parse
+          maxsize: The maximum number of type strings to cache
+        """
+        self.column_types = {}
+        alternatives = []
+        for i, column_type in enumerate(column_types):
+            group_name = "type{}".format(i)
+            self.column_types[group_name] = column_type
+            alternatives.append("(?P<{}>{})".format(group_name,
+                                                    column_type.def_regex.pattern))
+        self.regex = re.compile("|".join(alternatives))
+        self.parse = functools.lru_cache(maxsize=maxsize)(self._parse)
+
+    def _parse(self, type_string):
+        """Get the RedshiftTableColumnType instance for a type string.
+
+        Raises:
+          ValueError: If no type matches the type string
         """
-        raise NotImplementedError("TODO")
+        match = self.regex.fullmatch(type_string)
+        if not match:
+            raise ValueError(
+                "No RedshiftTableColumnType matches {}".format(type_string))
+        column_type = self.column_types[match.lastgroup]
+        start = self.regex.groupindex[match.lastgroup]
+        return column_type.from_def_groups(
+            match.groups()[start:start + column_type.def_regex.groups])
+
+
+TYPE_STRING_PARSER = TypeStringParser([
+    RedshiftVarcharType,
+    RedshiftCharType,
+    RedshiftTimestampTZType,
+    RedshiftTimestampType,
+    RedshiftDateType,
+    RedshiftDecimalType,
+    RedshiftDoublePrecisionType,
+    RedshiftRealType,
+    RedshiftBigIntType,
+    RedshiftIntType,
+    RedshiftSmallIntType,
+    RedshiftBooleanType])
 
 
 class RedshiftSchematic(schematic.Schematic):
@@ -676,8 +1521,49 @@ class RedshiftSchematic(schematic.Schematic):
     MAX_VARCHAR_BYTES = 65535
     MAX_CHAR_BYTES = 65535
     null_strings = DEFAULT_NULL_STRINGS
+    candidate_null_strings = CANDIDATE_NULL_STRINGS
     # TODO: BOOL -> BIGINT -> DOUBLE -> VARCHAR
 
+    def column_from_profile(self, profile, **kwargs):
+        """Instantiate a RedshiftTableColumn from the statistics gathered for it.
+
+        Date and time columns get the format all their values are written in,
+        and every column gets the null sentinels detected in it.
+        If the scan tracked distinct values (see table_def_from_rows' detect_keys),
+        the NOT NULL and UNIQUE planner hints are set where the scan supports them.
+
+        Args:
+          profile: A schematic.ColumnProfile
+          kwargs: Additional keyword arguments for RedshiftTableColumn
+        Returns:
+          A RedshiftTableColumn
+        """
+        kwargs.setdefault("datetime_format", profile.value_format)
+        kwargs.setdefault("null_strings", profile.detected_null_strings)
+        if profile.distinct is None:
+            return super().column_from_profile(profile, **kwargs)
+        return super().column_from_profile(profile,
+                                           notnull=profile.is_notnull(),
+                                           unique=profile.is_unique(),
+                                           **kwargs)
+
+    def columns_from_profiles(self, profiles):
+        """Instantiate the RedshiftTableColumns for a table, declaring the
+        first unique, non-null column as the PRIMARY KEY.
+
+        Args:
+          profiles: A list of schematic.ColumnProfiles, in column order
+        Returns:
+          A list of RedshiftTableColumns
+        """
+        columns = super().columns_from_profiles(profiles)
+        for column in columns:
+            if column.unique and column.notnull:
+                column.primary_key = True
+                column.unique = False
+                break
+        return columns
+
     def get_type_from_string(self, type_string):
         """Get the RedshiftTableColumnType instance from
         a type string of the format that's in pg_table_def.
@@ -685,12 +1571,82 @@ class RedshiftSchematic(schematic.Schematic):
         Args:
           type_string: the string from pg_table_def
         Returns:
-          A RedshiftTableColumnType instance
+          A RedshiftTableColumnType instance, shared with other
+          columns of the same type (see TypeStringParser)
+        Raises:
+          ValueError: If no RedshiftTableColumnType matches type_string
         """
-        for column_type in self.column_types():
-            try:
-                return column_type().from_pg_table_def(type_string)
-            except ValueError:
-                continue
-        raise ValueError(
-            "No RedshiftTableColumnType matches {}".format(type_string))
+        return TYPE_STRING_PARSER.parse(type_string)
+
+
+def reflect_schema(conn, schema, tables=None):
+    """Instantiate RedshiftTableDefinitions for the tables in a schema
+    from a single pg_table_def query.
+
+    Args:
+      conn: A psycopg2.connection to a Redshift instance
+      schema: The name of the schema to reflect
+      tables: Names of the tables to reflect, or None for all of them.
+              Tables that don't exist are left out of the result.
+    Returns:
+      A dict of table name to RedshiftTableDefinition
+    Raises:
+      psycopg2.OperationalError: if there are connection/transaction issues
+    """
+    tables_sql = sql.SQL("")
+    if tables is not None:
+        if not tables:
+            return {}
+        tables_sql = sql.SQL("AND tablename IN ({})").format(
+            sql.SQL(",").join([sql.Literal(table) for table in tables]))
+    get_sql = sql.SQL("""
+    SET search_path TO {schemaname};
+    SELECT
+      "tablename",
+      "column",
+      "type",
+      "encoding",
+      "distkey",
+      "sortkey",
+      "notnull"
+    FROM pg_catalog.pg_table_def
+    WHERE schemaname = {schemaname} {tables};
+    """).format(schemaname=sql.Literal(schema),
+                tables=tables_sql)
+    rows_by_table = {}
+    with conn.cursor() as curs:
+        curs.execute(get_sql)
+        for row in curs.fetchall():
+            rows_by_table.setdefault(row[0], []).append(tuple(row[1:]))
+    return {tablename: RedshiftTableDefinition.from_catalog_rows(schema, tablename, rows)
+            for tablename, rows in rows_by_table.items()}
+
+
+def reflect_schemas(dsn, schemas, tables=None, pool_size=DEFAULT_REFLECT_POOL_SIZE):
+    """Reflect several schemas at once, each with reflect_schema on a
+    connection from a pool of up to pool_size connections.
+
+    Args:
+      dsn: psycopg2-style connection string
+      schemas: Names of the schemas to reflect
+      tables: Names of the tables to reflect in every schema, or None for all of them
+      pool_size: The maximum number of connections to open
+    Returns:
+      A dict of schema name to a dict of table name to RedshiftTableDefinition
+    """
+    connections = pool.ThreadedConnectionPool(1, pool_size, dsn)
+
+    def reflect(schema):
+        conn = connections.getconn()
+        try:
+            table_defs = reflect_schema(conn, schema, tables)
+            conn.rollback()
+            return table_defs
+        finally:
+            connections.putconn(conn)
+
+    try:
+        with ThreadPoolExecutor(max_workers=pool_size) as executor:
+            return dict(zip(schemas, executor.map(reflect, schemas)))
+    finally:
+        connections.closeall()
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2019 Cody J. Hanson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Sorts rows by a table's sortkey before they're loaded.
+
+Rows loaded out of sortkey order land in the table's unsorted region, and
+Redshift only sorts them with a VACUUM, which can take hours on a big table.
+external_sort sorts rows of any size on local disk instead: runs of rows are
+sorted in parallel, spilled as compressed CSV files, then merged as the
+loader reads them.
+
+Based on Redshift documentation:
+- https://docs.aws.amazon.com/redshift/latest/dg/vacuum-load-in-sort-key-order.html
+"""
+import csv
+import heapq
+import io
+import itertools
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from schematic.schematics import redshift_schematic, redshift_staging
+
+DEFAULT_SORT_RUN_ROWS = 1000000
+
+
+class ColumnSortKey():
+    """Orders the values of a column by its type: numbers as numbers, dates
+    and times by their fields in the column's datetime_format, booleans as
+    booleans and everything else as strings. Like Redshift, nulls go last;
+    values that don't fit the type, and NaN, go just before them.
+    """
+
+    def __init__(self, column, null_strings=redshift_schematic.RedshiftSchematic.null_strings):
+        """
+        Args:
+          column: A RedshiftTableColumn
+          null_strings: Values to treat as null, besides the column's own
+        """
+        self.null_strings = frozenset(null_strings).union(column.null_strings)
+        self.datetime_format = column.datetime_format
+        self._parse_datetime = None
+        column_type = column.column_type
+        if isinstance(column_type, redshift_schematic.RedshiftAbstractIntType):
+            self.kind = "int"
+        elif isinstance(column_type, redshift_schematic.RedshiftAbstractDecimalType):
+            self.kind = "decimal"
+        elif isinstance(column_type, redshift_schematic.RedshiftBooleanType):
+            self.kind = "boolean"
+            self.true_literals = frozenset(column_type.valid_true_literals)
+        elif (isinstance(column_type, redshift_schematic.RedshiftAbstractDatetimeType)
+              and column.datetime_format):
+            self.kind = "datetime"
+        else:
+            self.kind = "string"
+
+    def __getstate__(self):
+        # The compiled parser is a closure, so it's rebuilt after unpickling
+        state = dict(self.__dict__)
+        state["_parse_datetime"] = None
+        return state
+
+    def convert(self, value):
+        """Convert a non-null value to something comparable.
+
+        Raises:
+          ValueError: If the value doesn't fit the type, or is NaN
+        """
+        if self.kind == "int":
+            return redshift_schematic._to_int(value)
+        if self.kind == "decimal":
+            number = redshift_schematic._to_decimal(value)
+            if number.is_nan():
+                # NaN can't be compared, so it's sorted with the misfits
+                raise ValueError("NaN")
+            return number
+        if self.kind == "boolean":
+            return value in self.true_literals
+        if self.kind == "datetime":
+            if self._parse_datetime is None:
+                self._parse_datetime = redshift_schematic.datetime_format_parser(
+                    self.datetime_format)
+            fields = self._parse_datetime(value)
+            if fields is None:
+                raise ValueError(value)
+            return fields
+        return value
+
+    def __call__(self, value):
+        if value in self.null_strings:
+            return (2,)
+        try:
+            return (0, self.convert(value))
+        except ValueError:
+            return (1, value)
+
+
+class RowSortKey():
+    """Orders rows by the values of some of their columns."""
+
+    def __init__(self, table_def, columns=None):
+        """
+        Args:
+          table_def: A RedshiftTableDefinition, with its columns in the same
+                     order as the values in each row
+          columns: Names of the columns to sort by, or None for the sortkeys
+        Raises:
+          ValueError: If a column isn't in the table, or there are none to sort by
+        """
+        if columns is None:
+            sort_columns = list(table_def.sortkeys)
+        else:
+            sort_columns = [table_def.get_column(name) for name in columns]
+            missing = [name for name, column in zip(columns, sort_columns) if column is None]
+            if missing:
+                raise ValueError("{} has no columns named {}".format(
+                    table_def.name, ", ".join(missing)))
+        if not sort_columns:
+            raise ValueError("{} has no sortkey to sort by".format(table_def.name))
+        self.indexes = [table_def.columns.index(column) for column in sort_columns]
+        self.column_keys = [ColumnSortKey(column) for column in sort_columns]
+
+    def __call__(self, row):
+        return tuple(column_key(row[index])
+                     for index, column_key in zip(self.indexes, self.column_keys))
+
+
+def _sort_run(args):
+    """Sort a run of rows and write it to a compressed CSV file."""
+    rows, key, path, compression = args
+    rows.sort(key=key)
+    with redshift_staging._open_compressed(path, compression) as run_file, \
+            io.TextIOWrapper(run_file, encoding="utf-8", newline="") as text:
+        csv.writer(text).writerows(rows)
+    return path
+
+
+def _read_run(path, compression):
+    with redshift_staging._open_decompressed(path, compression) as run_file:
+        for row in csv.reader(run_file):
+            yield tuple(row)
+
+
+def external_sort(rows, key, run_rows=DEFAULT_SORT_RUN_ROWS, processes=None,
+                  tmp_dir=None, compression="gzip"):
+    """Sort rows that may not fit in memory. Runs of run_rows rows are sorted
+    in a pool of processes and spilled to compressed files, which are then
+    merged. Rows that fit in a single run are sorted in memory without spilling.
+    The sort is stable.
+
+    Args:
+      rows: An iterable of tuples of strings, e.g. from CSVTableDefinition.get_rows()
+      key: A function ordering the rows, e.g. a RowSortKey
+      run_rows: The number of rows to sort in memory at a time
+      processes: The number of sorting processes, or None for one per CPU
+      tmp_dir: The directory to spill runs to, or None for the system default
+      compression: "gzip", "zstd" or None, for the spilled runs
+    Yields:
+      Tuples of strings, in order
+    """
+    rows = iter(rows)
+    first_run = list(itertools.islice(rows, run_rows))
+    if len(first_run) < run_rows:
+        first_run.sort(key=key)
+        yield from first_run
+        return
+    extension = redshift_staging.COMPRESSION_EXTENSIONS[compression]
+    workers = processes or os.cpu_count() or 1
+    with tempfile.TemporaryDirectory(dir=tmp_dir, prefix="schematic_sort_") as run_dir:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = []
+            run = first_run
+            while run:
+                path = os.path.join(run_dir, "run_{:06d}.csv{}".format(len(futures), extension))
+                futures.append(executor.submit(_sort_run, (run, key, path, compression)))
+                # Keep at most one run per worker waiting, to bound memory
+                if len(futures) > workers:
+                    futures[-workers - 1].result()
+                run = list(itertools.islice(rows, run_rows))
+            paths = [future.result() for future in futures]
+        yield from heapq.merge(*[_read_run(path, compression) for path in paths], key=key)
@@ -0,0 +1,501 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2019 Cody J. Hanson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Stages CSV data as compressed parts for parallel COPY into Redshift.
+
+Redshift loads each file of a COPY on a separate slice, so a load is
+fastest when its input is split into a multiple of the cluster's slice
+count, in parts of roughly equal size.
+
+Based on Redshift documentation:
+- https://docs.aws.amazon.com/redshift/latest/dg/t_splitting-data-files.html
+- https://docs.aws.amazon.com/redshift/latest/dg/loading-data-files-using-manifest.html
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import boto3
+from boto3.s3.transfer import TransferConfig
+from schematic.schematics import csv_schematic
+
+COMPRESSION_EXTENSIONS = {None: "", "gzip": ".gz", "zstd": ".zst"}
+COPY_BLOCK_SIZE = 1024 * 1024
+DEFAULT_UPLOAD_WORKERS = 8
+DEFAULT_MULTIPART_CHUNK_SIZE = 64 * 1024 * 1024
+
+
+def get_slice_count(conn):
+    """Get the number of slices in a Redshift cluster.
+
+    Args:
+      conn: A psycopg2.connection to a Redshift instance
+    Returns:
+      An int
+    """
+    with conn.cursor() as curs:
+        curs.execute("SELECT COUNT(*) FROM stv_slices;")
+        return curs.fetchone()[0]
+
+
+def _open_compressed(path, compression):
+    """Open a file for writing binary data with the given compression.
+
+    Args:
+      path: Path of the file
+      compression: "gzip", "zstd" or None
+    Returns:
+      A writable binary IO object
+    Raises:
+      ValueError: If the compression isn't supported
+    """
+    if compression is None:
+        return open(path, 'wb')
+    if compression == "gzip":
+        return gzip.open(path, 'wb', compresslevel=6)
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("zstd compression requires the zstandard package")
+        return zstandard.ZstdCompressor().stream_writer(open(path, 'wb'))
+    raise ValueError("Unsupported compression {}".format(compression))
+
+
+def _open_decompressed(path, compression):
+    """Open a compressed CSV file for reading text.
+
+    Args:
+      path: Path of the file
+      compression: "gzip", "zstd" or None
+    Returns:
+      A readable text IO object
+    Raises:
+      ValueError: If the compression isn't supported
+    """
+    if compression is None:
+        return open(path, newline='')
+    if compression == "gzip":
+        return gzip.open(path, 'rt', newline='')
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("zstd compression requires the zstandard package")
+        return io.TextIOWrapper(
+            zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'),
+                                                       closefd=True),
+            newline='')
+    raise ValueError("Unsupported compression {}".format(compression))
+
+
+def _compress_range(args):
+    """Compress a byte range of a file into a part file. With a table definition,
+    its rows are rewritten with RedshiftTableDefinition.write_csv, otherwise its
+    bytes are copied as-is.
+
+    Returns:
+      A (part_path, number of rows, compressed size) tuple
+    """
+    source_path, start, end, part_path, compression, table_def = args
+    if table_def is not None:
+        with io.TextIOWrapper(_open_compressed(part_path, compression),
+                              encoding='utf-8', newline='') as part:
+            rows = table_def.write_csv(
+                csv_schematic.read_rows(source_path, start, end), part)
+        return part_path, rows, os.path.getsize(part_path)
+    rows = 0
+    with open(source_path, 'rb') as source, \
+            _open_compressed(part_path, compression) as part:
+        source.seek(start)
+        remaining = end - start if end is not None else None
+        while remaining is None or remaining > 0:
+            block = source.read(COPY_BLOCK_SIZE if remaining is None
+                                else min(COPY_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            rows += block.count(b'\n')
+            part.write(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return part_path, rows, os.path.getsize(part_path)
+
+
+def _partition_by_distkey(csv_path, out_dir, parts, distkey_index, prefix, table_def=None):
+    """Write the rows of a CSV into uncompressed part files by the hash of
+    their distkey values, so rows with the same distkey end up in the same part.
+    With a table definition, rows are rewritten with
+    RedshiftTableDefinition.csv_rows as they're written.
+
+    Returns:
+      A list of paths to the part files
+    """
+    paths = [os.path.join(out_dir, "{}.unsorted{:04d}.csv".format(prefix, i))
+             for i in range(parts)]
+    handlers = [open(path, 'w', newline='', buffering=COPY_BLOCK_SIZE) for path in paths]
+    try:
+        writers = [csv.writer(handler) for handler in handlers]
+        rows = csv_schematic.read_rows(csv_path)
+        next(rows, None)
+        if table_def is not None:
+            rows = table_def.csv_rows(rows)
+        for row in rows:
+            partition = zlib.crc32(row[distkey_index].encode('utf-8')) % parts
+            writers[partition].writerow(row)
+    finally:
+        for handler in handlers:
+            handler.close()
+    return paths
+
+
+class StagedParts():
+    """Compressed parts of a CSV and the COPY manifest listing them.
+
+    Attributes:
+      parts: list of (path, number of rows, compressed size) tuples
+      manifest_path: Path to the manifest file
+      compression: "gzip", "zstd" or None
+      nulls_rewritten: Whether the parts were written with
+                       RedshiftTableDefinition.write_csv, so every null is empty
+    """
+
+    def __init__(self, parts, manifest_path, compression, nulls_rewritten=False):
+        self.parts = parts
+        self.manifest_path = manifest_path
+        self.compression = compression
+        self.nulls_rewritten = nulls_rewritten
+
+    def row_count(self):
+        return sum(rows for _, rows, _ in self.parts)
+
+    def copy_options(self):
+        """Get the COPY options for loading these parts with their manifest,
+        e.g. for RedshiftTableDefinition.copy_sql.
+
+        Returns:
+          A list of strings
+        """
+        options = ["MANIFEST"]
+        if self.compression:
+            options.append(self.compression.upper())
+        return options
+
+    def write_manifest(self, url_prefix=None):
+        """Write the COPY manifest for these parts.
+
+        Args:
+          url_prefix: Where the parts will be copied from, e.g. 's3://bucket/prefix/'.
+                      If None, the manifest lists the local paths.
+        Returns:
+          The path to the manifest
+        """
+        entries = []
+        for path, _, size in self.parts:
+            url = url_prefix + os.path.basename(path) if url_prefix else path
+            entries.append({"url": url,
+                            "mandatory": True,
+                            "meta": {"content_length": size}})
+        with open(self.manifest_path, 'w') as f:
+            json.dump({"entries": entries}, f, indent=2)
+        return self.manifest_path
+
+
+def split_csv(csv_path,
+              out_dir,
+              parts,
+              compression="gzip",
+              distkey=None,
+              processes=None,
+              url_prefix=None,
+              table_def=None):
+    """Split a CSV into equally sized, compressed parts without its header,
+    compressing the parts in a process pool, and write a COPY manifest for them.
+
+    Without a distkey, the file is split into byte ranges of whole lines, so
+    quoted values must not contain newlines. With a distkey, rows are partitioned
+    by the hash of their value in that column, so parts are only roughly equal.
+
+    With a table_def, rows are written with its write_csv, as
+    RedshiftTableDefinition.load_rows does, so the table's null strings
+    are loaded as null. Otherwise the file's rows are copied unchanged.
+
+    Args:
+      csv_path: Path to the CSV file
+      out_dir: Directory to write the parts and manifest to
+      parts: The number of parts to split into, ideally a multiple of
+             the cluster's slice count (see get_slice_count)
+      compression: "gzip", "zstd" or None
+      distkey: Name of the column to partition rows by, or None
+      processes: The number of worker processes, or None for one per CPU
+      url_prefix: Where the parts will be copied from, for the manifest.
+                  See StagedParts.write_manifest.
+      table_def: The RedshiftTableDefinition the parts will be loaded into, or None
+    Returns:
+      A StagedParts
+    Raises:
+      ValueError: If the compression isn't supported or distkey isn't a column
+    """
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError("Unsupported compression {}".format(compression))
+    os.makedirs(out_dir, exist_ok=True)
+    with open(csv_path) as csv_file:
+        csv_table_def = csv_schematic.CSVTableDefinition.from_source(csv_file)
+    prefix = csv_table_def.name
+    extension = ".csv" + COMPRESSION_EXTENSIONS[compression]
+    if distkey is not None:
+        if distkey not in csv_table_def.column_names():
+            raise ValueError("No such column {} in {}".format(distkey, csv_path))
+        sources = _partition_by_distkey(csv_path, out_dir, parts,
+                                        csv_table_def.column_names().index(distkey),
+                                        prefix,
+                                        table_def=table_def)
+        # The partitions were already rewritten, so they're just compressed
+        ranges = [(source, 0, None, None) for source in sources]
+    else:
+        data_size = os.path.getsize(csv_path)
+        chunk_size = max(1, -(-data_size // parts))
+        ranges = [(csv_path, start, end, table_def) for start, end in
+                  csv_schematic.chunk_offsets(csv_path, chunk_size)]
+    tasks = [(source, start, end,
+              os.path.join(out_dir, "{}.part{:04d}{}".format(prefix, i, extension)),
+              compression, source_table_def)
+             for i, (source, start, end, source_table_def) in enumerate(ranges)]
+    try:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            staged = list(executor.map(_compress_range, tasks))
+    finally:
+        if distkey is not None:
+            for source, _, _, _ in ranges:
+                os.remove(source)
+    staged_parts = StagedParts(staged,
+                               os.path.join(out_dir, "{}.manifest".format(prefix)),
+                               compression,
+                               nulls_rewritten=table_def is not None)
+    staged_parts.write_manifest(url_prefix)
+    return staged_parts
+
+
+def s3_url(bucket, key):
+    return "s3://{}/{}".format(bucket, key)
+
+
+def upload_parts(staged_parts,
+                 bucket,
+                 prefix="",
+                 s3_client=None,
+                 max_workers=DEFAULT_UPLOAD_WORKERS,
+                 multipart_chunk_size=DEFAULT_MULTIPART_CHUNK_SIZE):
+    """Upload staged parts to S3 concurrently, followed by their manifest.
+
+    Parts are uploaded by a bounded pool of threads, each part as a multipart
+    upload once it's larger than multipart_chunk_size.
+
+    Args:
+      staged_parts: A StagedParts
+      bucket: Name of the S3 bucket to upload to
+      prefix: Key prefix to upload under, e.g. 'loads/events/'
+      s3_client: A boto3 S3 client, or None to create one
+      max_workers: The maximum number of parts to upload at once
+      multipart_chunk_size: Size in bytes of each part of a multipart upload
+    Returns:
+      The S3 URL of the manifest
+    """
+    if s3_client is None:
+        s3_client = boto3.client("s3")
+    if prefix and not prefix.endswith("/"):
+        prefix += "/"
+    config = TransferConfig(multipart_threshold=multipart_chunk_size,
+                            multipart_chunksize=multipart_chunk_size,
+                            use_threads=False)
+
+    def upload(path):
+        s3_client.upload_file(path, bucket, prefix + os.path.basename(path),
+                              Config=config)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # list() re-raises the first failed upload
+        list(executor.map(upload, [path for path, _, _ in staged_parts.parts]))
+    manifest_path = staged_parts.write_manifest(s3_url(bucket, prefix))
+    manifest_key = prefix + os.path.basename(manifest_path)
+    s3_client.upload_file(manifest_path, bucket, manifest_key)
+    return s3_url(bucket, manifest_key)
+
+
+def copy_from_manifest(conn,
+                       redshift_table_def,
+                       manifest_url,
+                       staged_parts,
+                       iam_role=None,
+                       credentials=None):
+    """Load uploaded parts into a Redshift table with a single COPY ... MANIFEST.
+
+    The COPY isn't committed, so it can be part of a larger transaction.
+
+    Args:
+      conn: A psycopg2.connection to a Redshift instance
+      redshift_table_def: The RedshiftTableDefinition to load into
+      manifest_url: S3 URL of the manifest, as returned by upload_parts
+      staged_parts: The uploaded StagedParts, split with redshift_table_def
+                    (see split_csv)
+      iam_role, credentials: See RedshiftTableDefinition.copy_sql
+    Raises:
+      ValueError: If the parts weren't split with a table definition, so their
+                  null strings would be loaded as values
+    """
+    if not staged_parts.nulls_rewritten:
+        raise ValueError("Parts must be split with the table definition to load "
+                         "their null strings as null")
+    with conn.cursor() as curs:
+        curs.execute(redshift_table_def.copy_sql(manifest_url,
+                                                 iam_role=iam_role,
+                                                 credentials=credentials,
+                                                 options=staged_parts.copy_options(),
+                                                 null_as=False))
+
+
+def parse_s3_url(url):
+    """Split an S3 URL into its bucket and key.
+
+    Args:
+      url: A URL like 's3://bucket/key'
+    Returns:
+      A (bucket, key) tuple
+    """
+    bucket, _, key = url[len("s3://"):].partition("/")
+    return bucket, key
+
+
+class UnloadedTable():
+    """Parts of a table UNLOADed to S3, read back as a stream of rows.
+
+    Attributes:
+      table_def: The RedshiftTableDefinition of the unloaded table
+      urls: list of S3 URLs of the parts, in order
+      compression: "gzip", "zstd" or None
+    """
+
+    def __init__(self,
+                 table_def,
+                 urls,
+                 compression="gzip",
+                 s3_client=None,
+                 max_workers=DEFAULT_UPLOAD_WORKERS):
+        self.table_def = table_def
+        self.urls = urls
+        self.compression = compression
+        self.s3_client = s3_client if s3_client is not None else boto3.client("s3")
+        self.max_workers = max_workers
+
+    def column_names(self):
+        return self.table_def.column_names()
+
+    def download(self, out_dir):
+        """Download the parts concurrently.
+
+        Args:
+          out_dir: Directory to download the parts to
+        Yields:
+          The path of each part, in order, as soon as it and the parts before
+          it have been downloaded
+        """
+        os.makedirs(out_dir, exist_ok=True)
+
+        def download(url):
+            bucket, key = parse_s3_url(url)
+            path = os.path.join(out_dir, os.path.basename(key))
+            self.s3_client.download_file(bucket, key, path)
+            return path
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(download, url) for url in self.urls]
+            try:
+                for future in futures:
+                    yield future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def get_rows(self, out_dir):
+        """Get the rows of the unloaded table, starting on the first part while
+        the rest are downloading. Each part is deleted once it's been read.
+
+        Args:
+          out_dir: Directory to download the parts to
+        Yields:
+          A tuple of strings, like CSVTableDefinition.get_rows
+        """
+        for path in self.download(out_dir):
+            try:
+                with _open_decompressed(path, self.compression) as part:
+                    for row in csv.reader(part):
+                        yield tuple(row)
+            finally:
+                os.remove(path)
+
+
+def unload_table(conn,
+                 redshift_table_def,
+                 bucket,
+                 prefix="",
+                 iam_role=None,
+                 credentials=None,
+                 compression="gzip",
+                 s3_client=None,
+                 max_workers=DEFAULT_UPLOAD_WORKERS):
+    """UNLOAD a Redshift table to S3 in parallel, with a manifest of its parts.
+
+    Args:
+      conn: A psycopg2.connection to a Redshift instance
+      redshift_table_def: The RedshiftTableDefinition of the table to unload
+      bucket: Name of the S3 bucket to unload to
+      prefix: Key prefix to unload to, e.g. 'unloads/events/'
+      iam_role, credentials: See RedshiftTableDefinition.copy_sql
+      compression: "gzip", "zstd" or None
+      s3_client: A boto3 S3 client, or None to create one
+      max_workers: The maximum number of parts to download at once
+    Returns:
+      An UnloadedTable
+    """
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError("Unsupported compression {}".format(compression))
+    if s3_client is None:
+        s3_client = boto3.client("s3")
+    options = ["PARALLEL ON", "MANIFEST", "ALLOWOVERWRITE"]
+    if compression:
+        options.append(compression.upper())
+    with conn.cursor() as curs:
+        curs.execute(redshift_table_def.unload_sql(conn,
+                                                   s3_url(bucket, prefix),
+                                                   iam_role=iam_role,
+                                                   credentials=credentials,
+                                                   options=options))
+    manifest = json.loads(s3_client.get_object(
+        Bucket=bucket, Key=prefix + "manifest")["Body"].read())
+    return UnloadedTable(redshift_table_def,
+                         [entry["url"] for entry in manifest["entries"]],
+                         compression=compression,
+                         s3_client=s3_client,
+                         max_workers=max_workers)
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2019 Cody J. Hanson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Drops duplicate rows as they stream from a file to a loader.
+
+Rows are identified by a hash of all their values or of a subset of key
+columns. The hashes of the rows seen so far are kept in memory up to a
+budget, then spilled to a SQLite index on disk, so memory use stays bounded
+however large the file. An optional Bloom filter in front answers most
+lookups for new rows without touching the disk.
+"""
+import csv
+import os
+import sqlite3
+import tempfile
+import schematic
+
+DEFAULT_DEDUPE_MAX_KEYS = 1000000
+DEFAULT_BLOOM_ERROR_RATE = 0.01
+DEDUPE_HASH_BYTES = 16
+
+
+class Deduplicator():
+    """Drops rows whose values, or the values in their key columns, were
+    already seen, keeping the first of each. Use filter_rows between
+    reading rows and loading them, e.g.
+    table_def.load_rows(conn, deduplicator.filter_rows(csv_table_def.get_rows())).
+
+    Attributes:
+      key_indexes: The positions of the key columns, or None for whole rows
+      rows: The number of rows seen
+      duplicates: The number of rows dropped
+      spilled: The number of hashes spilled to disk
+      handler: A writable text IO object the dropped rows are written to as
+               CSV, each with its 1-indexed row number first, or None
+    """
+
+    def __init__(self, key_indexes=None, max_keys=DEFAULT_DEDUPE_MAX_KEYS,
+                 bloom_capacity=None, bloom_error_rate=DEFAULT_BLOOM_ERROR_RATE,
+                 spill_dir=None, handler=None, fieldnames=None):
+        """
+        Args:
+          key_indexes: The positions of the columns that identify a row,
+                       or None to compare whole rows
+          max_keys: The number of hashes to keep in memory before spilling
+                    them to disk; each takes about 100 bytes
+          bloom_capacity: The number of distinct rows to size a Bloom filter
+                          for, or None not to use one
+          bloom_error_rate: The Bloom filter's false positive rate at capacity
+          spill_dir: The directory for the spilled hashes, or None for the
+                     system default
+          handler: A writable text IO object to write the dropped rows to
+          fieldnames: Column names to write a header to handler with
+        """
+        self.key_indexes = list(key_indexes) if key_indexes is not None else None
+        self.max_keys = max_keys
+        self.bloom = (schematic.BloomFilter(bloom_capacity, bloom_error_rate)
+                      if bloom_capacity else None)
+        self.spill_dir = spill_dir
+        self.handler = handler
+        self.writer = csv.writer(handler) if handler is not None else None
+        if self.writer and fieldnames is not None:
+            self.writer.writerow(["row_number"] + list(fieldnames))
+        self.rows = 0
+        self.duplicates = 0
+        self.spilled = 0
+        self._memory = set()
+        self._spill_path = None
+        self._db = None
+
+    def _hash(self, row):
+        values = row if self.key_indexes is None else [row[i] for i in self.key_indexes]
+        return schematic.row_digest(values, digest_size=DEDUPE_HASH_BYTES)
+
+    def _spill(self):
+        if self._db is None:
+            handle, self._spill_path = tempfile.mkstemp(prefix="schematic_dedupe_",
+                                                        suffix=".db", dir=self.spill_dir)
+            os.close(handle)
+            self._db = sqlite3.connect(self._spill_path)
+            self._db.execute("PRAGMA journal_mode = OFF")
+            self._db.execute("PRAGMA synchronous = OFF")
+            self._db.execute("CREATE TABLE seen (hash BLOB PRIMARY KEY) WITHOUT ROWID")
+        with self._db:
+            self._db.executemany("INSERT OR IGNORE INTO seen VALUES (?)",
+                                 ((digest,) for digest in self._memory))
+        self.spilled += len(self._memory)
+        self._memory.clear()
+
+    def _seen(self, digest):
+        """Say whether a hash was seen before, and remember it."""
+        if self.bloom is not None and not self.bloom.add_digest(digest):
+            seen = False
+        elif digest in self._memory:
+            return True
+        else:
+            seen = self._db is not None and self._db.execute(
+                "SELECT 1 FROM seen WHERE hash = ?", (digest,)).fetchone() is not None
+        if not seen:
+            self._memory.add(digest)
+            if len(self._memory) >= self.max_keys:
+                self._spill()
+        return seen
+
+    def filter_rows(self, rows):
+        """Drop duplicate rows.
+
+        Args:
+          rows: An iterable of tuples of strings, e.g. from CSVTableDefinition.get_rows()
+        Yields:
+          The first row of each set of duplicates, in order
+        """
+        for row in rows:
+            self.rows += 1
+            if self._seen(self._hash(row)):
+                self.duplicates += 1
+                if self.writer:
+                    self.writer.writerow((self.rows,) + tuple(row))
+                continue
+            yield row
+
+    def close(self):
+        """Delete the spilled hashes."""
+        if self._db is not None:
+            self._db.close()
+            os.remove(self._spill_path)
+            self._db = None
+        self._memory.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
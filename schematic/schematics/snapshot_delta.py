@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2019 Cody J. Hanson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Finds the rows that changed between full snapshots of a table.
+
+Each snapshot's rows are hashed as they stream past and the hashes are kept in
+a SQLite index, keyed by a key column, so the next snapshot only has to be
+compared with the index rather than with the previous snapshot itself.
+"""
+import os
+import sqlite3
+import schematic
+
+INSERT = "insert"
+UPDATE = "update"
+DELETE = "delete"
+DEFAULT_DELTA_BATCH_SIZE = 10000
+ROW_HASH_BYTES = 8
+# Stay under SQLite's default limit on host parameters in a statement
+_MAX_LOOKUP_KEYS = 500
+
+
+def row_hash(row):
+    """Hash the values of a row into a compact digest.
+
+    Args:
+      row: A tuple of strings
+    Returns:
+      ROW_HASH_BYTES bytes, see schematic.row_digest
+    """
+    return schematic.row_digest(row, digest_size=ROW_HASH_BYTES)
+
+
+class SnapshotDelta():
+    """Compares a snapshot's rows with the index of the previous snapshot,
+    writing the new snapshot's index as it goes.
+
+    Iterate over changed_rows to get the inserted and updated rows, e.g. to
+    load with RedshiftTableDefinition.merge_rows, then over deleted_keys for
+    the keys of the rows that are gone. When a key appears more than once in
+    a snapshot, its last row is the one that's indexed.
+
+    Attributes:
+      inserted: The number of rows whose keys weren't in the previous snapshot
+      updated: The number of rows whose values changed
+      unchanged: The number of rows that didn't change
+      deleted: The number of keys that are no longer in the snapshot
+    """
+
+    def __init__(self, index_path, previous_index_path=None, key_index=0,
+                 batch_size=DEFAULT_DELTA_BATCH_SIZE):
+        """
+        Args:
+          index_path: Path to write this snapshot's index to, replacing any
+                      index already there
+          previous_index_path: Path to the previous snapshot's index, or None
+                               if this is the first snapshot
+          key_index: The position of the key column in each row
+          batch_size: The number of rows to look up and index at a time
+        """
+        if previous_index_path is not None and not os.path.exists(previous_index_path):
+            raise FileNotFoundError(previous_index_path)
+        self.key_index = key_index
+        self.batch_size = batch_size
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.deleted = 0
+        # The index is rebuilt from the snapshot if anything goes wrong,
+        # so it doesn't need to survive a crash
+        self.db = sqlite3.connect(index_path)
+        self.db.execute("PRAGMA journal_mode = OFF")
+        self.db.execute("PRAGMA synchronous = OFF")
+        with self.db:
+            self.db.execute("DROP TABLE IF EXISTS snapshot")
+            self.db.execute("""CREATE TABLE snapshot (key TEXT PRIMARY KEY, hash BLOB)
+                WITHOUT ROWID""")
+        self.has_previous = previous_index_path is not None
+        if self.has_previous:
+            self.db.execute("ATTACH DATABASE ? AS previous", (previous_index_path,))
+
+    def _previous_hashes(self, keys):
+        hashes = {}
+        if not self.has_previous:
+            return hashes
+        for start in range(0, len(keys), _MAX_LOOKUP_KEYS):
+            lookup = keys[start:start + _MAX_LOOKUP_KEYS]
+            hashes.update(self.db.execute(
+                "SELECT key, hash FROM previous.snapshot WHERE key IN ({})".format(
+                    ",".join("?" * len(lookup))), lookup))
+        return hashes
+
+    def _compare_batch(self, batch):
+        hashed = [(row[self.key_index], row_hash(row), row) for row in batch]
+        previous = self._previous_hashes(list({key for key, _, _ in hashed}))
+        self.db.executemany("INSERT OR REPLACE INTO snapshot VALUES (?, ?)",
+                            [(key, digest) for key, digest, _ in hashed])
+        for key, digest, row in hashed:
+            previous_digest = previous.get(key)
+            if previous_digest is None:
+                self.inserted += 1
+                yield INSERT, row
+            elif previous_digest != digest:
+                self.updated += 1
+                yield UPDATE, row
+            else:
+                self.unchanged += 1
+
+    def changed_rows(self, rows):
+        """Index a snapshot and find the rows that were inserted or updated.
+
+        Args:
+          rows: An iterable of tuples of strings, e.g. from CSVTableDefinition.get_rows()
+        Yields:
+          (INSERT or UPDATE, row) tuples
+        """
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                yield from self._compare_batch(batch)
+                batch = []
+        if batch:
+            yield from self._compare_batch(batch)
+        self.db.commit()
+
+    def deleted_keys(self):
+        """Find the keys in the previous snapshot that aren't in this one.
+        Only meaningful once changed_rows has been consumed.
+
+        Yields:
+          Keys, as strings
+        """
+        if not self.has_previous:
+            return
+        cursor = self.db.execute("""SELECT p.key FROM previous.snapshot p
+            LEFT JOIN main.snapshot s ON s.key = p.key
+            WHERE s.key IS NULL""")
+        for (key,) in cursor:
+            self.deleted += 1
+            yield key
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -22,6 +22,8 @@
 # SOFTWARE.
 from schematic.schematics import csv_schematic
 import io
+import os
+import tempfile
 import unittest
 
 TEST_CSV_FILE = io.StringIO("""a, b, c, d, e, f, g
@@ -71,6 +73,35 @@ class TestCSVTableDefinitionMethods(unittest.TestCase):
         self.assertEqual(rows1, rows2)
 
 
+class TestCSVChunkFunctions(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, "w") as f:
+            f.write("a,b\n" + "".join("{},{}\n".format(i, i * 2) for i in range(100)))
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_chunk_offsets_cover_rows(self):
+        offsets = csv_schematic.chunk_offsets(self.path, chunk_size=50)
+        self.assertGreater(len(offsets), 1)
+        rows = [row for start, end in offsets
+                for row in csv_schematic.read_rows(self.path, start, end)]
+        self.assertEqual(rows, [(str(i), str(i * 2)) for i in range(100)])
+
+    def test_get_chunks_uses_handler_name(self):
+        with open(self.path) as f:
+            table_def = csv_schematic.CSVTableDefinition.from_source(f)
+            self.assertEqual(table_def.get_chunks(50),
+                             csv_schematic.chunk_offsets(self.path, 50))
+
+    def test_read_rows_to_end(self):
+        rows = list(csv_schematic.read_rows(self.path))
+        self.assertEqual(rows[0], ("a", "b"))
+        self.assertEqual(len(rows), 101)
+
+
 class TestCSVSchematicMethods(unittest.TestCase):
 
     def test_can_instantiate(self):
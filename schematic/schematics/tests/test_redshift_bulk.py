@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2019 Cody J. Hanson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from schematic.schematics import redshift_bulk
+from schematic.schematics.redshift_schematic import *
+import os
+import tempfile
+import unittest
+
+
+class MockDDLCursor():
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, statement):
+        if statement in self.conn.bad_statements:
+            raise ValueError("bad table")
+        self.conn.pending.append(statement)
+
+
+class MockDDLConn():
+
+    def __init__(self, bad_statements=()):
+        self.bad_statements = list(bad_statements)
+        self.pending = []
+        self.transactions = []
+
+    def cursor(self):
+        return MockDDLCursor(self)
+
+    def commit(self):
+        self.transactions.append(self.pending)
+        self.pending = []
+
+    def rollback(self):
+        self.pending = []
+
+
+def table(name):
+    return RedshiftTableDefinition("public", name, [RedshiftTableColumn("id", RedshiftIntType())])
+
+
+class TestBulk(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_csv(self, name, rows):
+        path = os.path.join(self.tmp.name, name + ".csv")
+        with open(path, "w") as f:
+            f.write("id,name\n")
+            for i in range(rows):
+                f.write("{},name {}\n".format(i, i))
+        return path
+
+    def test_create_tables_in_batches(self):
+        table_defs = [table("t{}".format(i)) for i in range(5)]
+        conn = MockDDLConn()
+        self.assertEqual([None] * 5, redshift_bulk.create_tables(conn, table_defs, batch_size=2))
+        self.assertEqual([2, 2, 1], [len(statements) for statements in conn.transactions])
+
+    def test_create_tables_isolates_failures(self):
+        table_defs = [table("t{}".format(i)) for i in range(3)]
+        conn = MockDDLConn([table_defs[1].create_sql()])
+        errors = redshift_bulk.create_tables(conn, table_defs, batch_size=3)
+        self.assertEqual([None, ValueError, None],
+                         [error if error is None else type(error) for error in errors])
+        self.assertEqual([[table_defs[0].create_sql()], [table_defs[2].create_sql()]],
+                         conn.transactions)
+
+    def test_infer_table_defs(self):
+        paths = [self.write_csv("small", 2), os.path.join(self.tmp.name, "missing.csv")]
+        table_defs = redshift_bulk.infer_table_defs(paths, "public", processes=1)
+        self.assertEqual("public.small", table_defs[0].name)
+        self.assertIsInstance(table_defs[1], FileNotFoundError)
+
+    @unittest.skipUnless(os.environ.get("SCHEMATIC_TEST_CONN_STRING"),
+                         "Set SCHEMATIC_TEST_CONN_STRING to test against PostgreSQL")
+    def test_bulk_load(self):
+        import psycopg2
+        dsn = os.environ["SCHEMATIC_TEST_CONN_STRING"]
+        paths = [self.write_csv("bulk_small", 10), self.write_csv("bulk_large", 1000)]
+        done = []
+        try:
+            results = redshift_bulk.bulk_load(dsn, paths, "public", pool_size=2, processes=1,
+                                              on_result=done.append)
+            self.assertEqual(["public.bulk_large", "public.bulk_small"],
+                             [result.table for result in results])
+            self.assertEqual([1000, 10], [result.rows for result in results])
+            self.assertTrue(all(result.ok() and result.created for result in results))
+            self.assertEqual(2, len(done))
+        finally:
+            with psycopg2.connect(dsn) as conn, conn.cursor() as curs:
+                curs.execute("DROP TABLE IF EXISTS public.bulk_small, public.bulk_large")
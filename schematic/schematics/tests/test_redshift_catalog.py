@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2019 Cody J. Hanson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from schematic.schematics import redshift_catalog
+from schematic.schematics.redshift_schematic import (RedshiftTableDefinition,
+                                                     RedshiftTableColumn,
+                                                     RedshiftIntType)
+import os
+import tempfile
+import unittest
+
+ROWS = [("id", "integer", "az64", True, 1, True),
+        ("name", "character varying(256)", "lzo", False, 0, False)]
+
+
+class MockCatalogCursor():
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, query):
+        self.conn.executed.append(query)
+
+    def fetchall(self):
+        return ROWS
+
+    def copy_expert(self, statement, file):
+        self.conn.executed.append(statement)
+
+
+class MockCatalogConn():
+
+    def __init__(self, dsn="host=redshift dbname=dev"):
+        self.dsn = dsn
+        self.executed = []
+
+    def cursor(self):
+        return MockCatalogCursor(self)
+
+
+class Clock():
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCatalogCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.cache = redshift_catalog.CatalogCache(ttl=60, maxsize=2, clock=self.clock)
+        self.conn = MockCatalogConn()
+
+    def tearDown(self):
+        self.cache.close()
+
+    def test_caches_table_defs(self):
+        table_def = self.cache.get_table_def(self.conn, "public", "events")
+        self.assertEqual(table_def, RedshiftTableDefinition.from_catalog_rows(
+            "public", "events", ROWS))
+        self.assertEqual(table_def.distkey.name, "id")
+        cached = self.cache.get_table_def(MockCatalogConn(), "public", "events")
+        self.assertEqual(table_def, cached)
+        self.assertIsNot(table_def, cached)
+        self.assertEqual(1, len(self.conn.executed))
+        self.assertEqual((1, 1), (self.cache.hits, self.cache.misses))
+
+    def test_separates_connections(self):
+        self.cache.get_table_def(self.conn, "public", "events")
+        other_conn = MockCatalogConn("host=other dbname=dev")
+        self.cache.get_table_def(other_conn, "public", "events")
+        self.assertEqual(1, len(other_conn.executed))
+
+    def test_expires_entries(self):
+        self.cache.get_table_def(self.conn, "public", "events")
+        self.clock.now += 59
+        self.cache.get_table_def(self.conn, "public", "events")
+        self.clock.now += 1
+        self.cache.get_table_def(self.conn, "public", "events")
+        self.assertEqual(2, len(self.conn.executed))
+
+    def test_evicts_least_recently_used(self):
+        for name in ["a", "b", "a", "c", "a"]:
+            self.cache.get_table_def(self.conn, "public", name)
+        self.assertEqual(3, len(self.conn.executed))
+        self.cache.get_table_def(self.conn, "public", "b")
+        self.assertEqual(4, len(self.conn.executed))
+
+    def test_invalidate(self):
+        for schema, name in [("public", "a"), ("public", "b"), ("other", "a")]:
+            self.cache.get_table_def(self.conn, schema, name)
+        self.cache.invalidate(self.conn, "public")
+        self.assertEqual([("other", "a")],
+                         [key[1:] for key in self.cache.entries])
+        self.cache.invalidate()
+        self.assertEqual(0, len(self.cache.entries))
+
+    def test_create_table_invalidates(self):
+        self.cache.get_table_def(self.conn, "public", "events")
+        self.cache.get_table_def(self.conn, "public", "other")
+        RedshiftTableDefinition("public", "events", [
+            RedshiftTableColumn("id", RedshiftIntType())]).create_table(self.conn)
+        self.assertEqual([("public", "other")],
+                         [key[1:] for key in self.cache.entries])
+
+    def test_merge_rows_keeps_cached_definition(self):
+        self.cache.get_table_def(self.conn, "public", "events")
+        RedshiftTableDefinition("public", "events", [
+            RedshiftTableColumn("id", RedshiftIntType())]).merge_rows(
+                self.conn, [("1",)], keys=["id"])
+        self.assertEqual([("public", "events")],
+                         [key[1:] for key in self.cache.entries])
+
+    def test_persists_to_sqlite(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "catalog.sqlite")
+            cache = redshift_catalog.CatalogCache(ttl=60, path=path, clock=self.clock)
+            cache.get_table_def(self.conn, "public", "events")
+            cache.get_table_def(self.conn, "public", "stale")
+            cache.invalidate(name="stale")
+            cache.close()
+            restarted = redshift_catalog.CatalogCache(ttl=60, path=path, clock=self.clock)
+            table_def = restarted.get_table_def(self.conn, "public", "events")
+            self.assertEqual(1, restarted.hits)
+            self.assertEqual("id", table_def.distkey.name)
+            restarted.get_table_def(self.conn, "public", "stale")
+            self.assertEqual(1, restarted.misses)
+            self.clock.now += 60
+            restarted.entries.clear()
+            restarted.get_table_def(self.conn, "public", "events")
+            self.assertEqual(2, restarted.misses)
+            restarted.close()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2019 Cody J. Hanson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from schematic.schematics import redshift_checkpoint
+from schematic.schematics.redshift_schematic import *
+from unittest import mock
+import os
+import tempfile
+import unittest
+
+
+class Interrupted(Exception):
+    pass
+
+
+class TestCheckpointedLoad(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.tmp.name, "checkpoint_test.csv")
+        with open(self.csv_path, "w") as f:
+            f.write("id,name\n")
+            for i in range(1000):
+                f.write("{},name {}\n".format(i, i))
+        self.checkpoint_path = os.path.join(self.tmp.name, "checkpoint.db")
+        self.table_def = RedshiftTableDefinition("public", "checkpoint_test", [
+            RedshiftTableColumn("id", RedshiftIntType()),
+            RedshiftTableColumn("name", RedshiftVarcharType(10))])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def checkpointed_load(self, table_def=None):
+        return redshift_checkpoint.CheckpointedLoad(table_def or self.table_def,
+                                                    self.csv_path,
+                                                    self.checkpoint_path,
+                                                    chunk_size=2000)
+
+    def test_chunks_are_recorded(self):
+        with self.checkpointed_load() as checkpointed_load:
+            chunks = checkpointed_load.chunks()
+            load_id = checkpointed_load.load_id
+        self.assertGreater(len(chunks), 4)
+        self.assertEqual(os.path.getsize(self.csv_path), chunks[-1][1])
+        self.assertFalse(any(committed for _, _, committed in chunks))
+        with self.checkpointed_load() as checkpointed_load:
+            self.assertEqual((chunks, load_id),
+                             (checkpointed_load.chunks(), checkpointed_load.load_id))
+
+    def test_checkpoint_for_other_table(self):
+        self.checkpointed_load().close()
+        with self.assertRaises(ValueError):
+            self.checkpointed_load(RedshiftTableDefinition("public", "other", []))
+
+    def test_checkpoint_for_changed_file(self):
+        self.checkpointed_load().close()
+        with open(self.csv_path, "a") as f:
+            f.write("1000,name 1000\n")
+        with self.assertRaises(ValueError):
+            self.checkpointed_load()
+
+    @unittest.skipUnless(os.environ.get("SCHEMATIC_TEST_CONN_STRING"),
+                         "Set SCHEMATIC_TEST_CONN_STRING to test against PostgreSQL")
+    def test_resume(self):
+        import psycopg2
+        conn = psycopg2.connect(os.environ["SCHEMATIC_TEST_CONN_STRING"])
+
+        def interrupt(stats):
+            if stats.batches == 2:
+                raise Interrupted()
+        try:
+            with self.checkpointed_load() as checkpointed_load:
+                with self.assertRaises(Interrupted):
+                    checkpointed_load.run(conn, progress=interrupt)
+            # The third chunk commits, but the checkpoint isn't updated
+            with self.checkpointed_load() as checkpointed_load:
+                with mock.patch.object(checkpointed_load, "_mark_committed",
+                                       side_effect=Interrupted()):
+                    with self.assertRaises(Interrupted):
+                        checkpointed_load.run(conn)
+            with self.checkpointed_load() as checkpointed_load:
+                stats = checkpointed_load.run(conn)
+                self.assertEqual(3, checkpointed_load.skipped)
+                self.assertTrue(all(committed for _, _, committed in checkpointed_load.chunks()))
+            with conn.cursor() as curs:
+                curs.execute("SELECT count(*), count(DISTINCT id) FROM public.checkpoint_test")
+                self.assertEqual((1000, 1000), curs.fetchone())
+                curs.execute("SELECT sum(row_count) FROM public.schematic_load_chunks")
+                self.assertEqual((1000,), curs.fetchone())
+            self.assertLess(stats.rows, 1000)
+        finally:
+            conn.rollback()
+            with conn.cursor() as curs:
+                curs.execute("DROP TABLE IF EXISTS public.checkpoint_test, "
+                             "public.schematic_load_chunks")
+            conn.commit()
+            conn.close()
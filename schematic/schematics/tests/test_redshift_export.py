@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2019 Cody J. Hanson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from schematic.schematics import redshift_export
+from schematic.schematics.redshift_schematic import (RedshiftTableDefinition,
+                                                     RedshiftTableColumn,
+                                                     RedshiftIntType,
+                                                     RedshiftBooleanType,
+                                                     RedshiftVarcharType)
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import os
+import tempfile
+import unittest
+
+
+class MockVersionCursor():
+
+    def __init__(self, version):
+        self.version = version
+
+    def execute(self, query):
+        pass
+
+    def fetchone(self):
+        return (self.version,)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class MockVersionConn():
+
+    def __init__(self, version):
+        self.version = version
+
+    def cursor(self):
+        return MockVersionCursor(self.version)
+
+
+def read_files(paths):
+    contents = []
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, 'rt') as f:
+            contents.append(f.read())
+    return contents
+
+
+class TestRotatingFileWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_rotates_at_row_boundaries(self):
+        with ThreadPoolExecutor(2) as executor:
+            writer = redshift_export.RotatingFileWriter(self.tmp_dir.name,
+                                                        "t",
+                                                        header=b"a,b\n",
+                                                        max_bytes=10,
+                                                        executor=executor)
+            with writer:
+                writer.write(b"1,")
+                writer.write(b"2,3,4,5\n")
+                writer.write("6,7\n")
+                writer.write(b"")
+        self.assertEqual([os.path.join(self.tmp_dir.name, "t.{:04d}.csv.gz".format(i))
+                          for i in range(2)],
+                         writer.paths)
+        self.assertEqual(["a,b\n1,2,3,4,5\n", "a,b\n6,7\n"], read_files(writer.paths))
+        self.assertEqual(sorted(os.path.basename(path) for path in writer.paths),
+                         sorted(os.listdir(self.tmp_dir.name)))
+
+    def test_uncompressed(self):
+        with redshift_export.RotatingFileWriter(self.tmp_dir.name,
+                                                "t",
+                                                compression=None) as writer:
+            writer.write(b"1\n")
+        self.assertEqual(["1\n"], read_files(writer.paths))
+
+
+class TestExportTable(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.table_def = RedshiftTableDefinition(
+            "public", "export_test",
+            [RedshiftTableColumn("id", RedshiftIntType()),
+             RedshiftTableColumn("flag", RedshiftBooleanType()),
+             RedshiftTableColumn("name", RedshiftVarcharType(5))])
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_supports_copy_to_stdout(self):
+        self.assertTrue(redshift_export.supports_copy_to_stdout(
+            MockVersionConn("PostgreSQL 16.2 on x86_64-pc-linux-gnu")))
+        self.assertFalse(redshift_export.supports_copy_to_stdout(
+            MockVersionConn("PostgreSQL 8.0.2 on i686-pc-linux-gnu, Redshift 1.0.61")))
+
+    def test_export_table_with_cursor(self):
+        rows = [(i, i % 2 == 0, None if i % 3 else "a,\"b") for i in range(100)]
+        self.table_def.get_rows = lambda conn, itersize: iter(rows)
+        paths = redshift_export.export_table(None,
+                                             self.table_def,
+                                             self.tmp_dir.name,
+                                             max_bytes=200,
+                                             processes=1,
+                                             method="cursor",
+                                             itersize=30)
+        self.assertGreater(len(paths), 1)
+        contents = read_files(paths)
+        self.assertTrue(all(content.startswith("id,flag,name\n") for content in contents))
+        lines = [line for content in contents for line in content.splitlines()[1:]]
+        self.assertEqual(100, len(lines))
+        self.assertEqual(['0,t,"a,""b"', '1,f,'], lines[:2])
+
+    def test_export_table_keeps_nulls_and_empty_strings_apart(self):
+        rows = [(None, None, ""), (1, True, "NA")]
+        self.table_def.get_rows = lambda conn, itersize: iter(rows)
+        paths = redshift_export.export_table(None, self.table_def, self.tmp_dir.name,
+                                             compression=None, processes=1,
+                                             method="cursor")
+        self.assertEqual(['id,flag,name\n,,""\n1,t,NA\n'], read_files(paths))
+        for column in self.table_def.columns:
+            column.null_strings = ["NA"]
+        paths = redshift_export.export_table(None, self.table_def, self.tmp_dir.name,
+                                             compression=None, processes=1,
+                                             method="cursor")
+        self.assertEqual(['id,flag,name\nNA,NA,\n1,t,"NA"\n'], read_files(paths))
+        self.assertIn("SQL(' NULL '), Literal('NA')", repr(self.table_def.copy_stdout_sql()))
+
+    def test_export_table_errors(self):
+        with self.assertRaises(ValueError):
+            redshift_export.export_table(None, self.table_def, self.tmp_dir.name,
+                                         method="unload")
+        with self.assertRaises(ValueError):
+            redshift_export.export_table(None, self.table_def, self.tmp_dir.name,
+                                         method="copy", compression="lz4")
+
+
+@unittest.skipUnless(os.environ.get("SCHEMATIC_TEST_CONN_STRING"),
+                     "Set SCHEMATIC_TEST_CONN_STRING to test against PostgreSQL")
+class TestExportTablePostgres(unittest.TestCase):
+    """Test exporting from a PostgreSQL stand-in for Redshift"""
+
+    def setUp(self):
+        import psycopg2
+        self.conn = psycopg2.connect(os.environ["SCHEMATIC_TEST_CONN_STRING"])
+        with self.conn.cursor() as curs:
+            curs.execute("CREATE TEMP TABLE export_test (id INT, flag BOOLEAN, name VARCHAR(5))")
+            curs.execute("""INSERT INTO export_test
+                SELECT i, i % 2 = 0, CASE WHEN i % 3 = 0 THEN 'a,"b' WHEN i % 3 = 1 THEN '' END
+                FROM generate_series(0, 999) i""")
+        self.table_def = RedshiftTableDefinition(
+            "pg_temp", "export_test",
+            [RedshiftTableColumn("id", RedshiftIntType()),
+             RedshiftTableColumn("flag", RedshiftBooleanType()),
+             RedshiftTableColumn("name", RedshiftVarcharType(5))])
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+        self.conn.rollback()
+        self.conn.close()
+
+    def test_export_table(self):
+        exported = {}
+        for method in redshift_export.EXPORT_METHODS:
+            paths = redshift_export.export_table(self.conn,
+                                                 self.table_def,
+                                                 os.path.join(self.tmp_dir.name, method),
+                                                 max_bytes=2000,
+                                                 processes=2,
+                                                 method=method,
+                                                 itersize=100)
+            self.assertGreater(len(paths), 1)
+            exported[method] = [line for content in read_files(paths)
+                                 for line in content.splitlines()[1:]]
+        self.assertEqual(1000, len(exported["copy"]))
+        self.assertEqual(exported["copy"], exported["cursor"])
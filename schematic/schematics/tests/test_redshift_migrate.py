@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2019 Cody J. Hanson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from schematic.schematics import redshift_migrate
+from schematic.schematics.redshift_schematic import *
+from psycopg2 import sql
+import os
+import unittest
+
+
+def table(name, *columns):
+    return RedshiftTableDefinition("public", name, list(columns))
+
+
+class MockMigrateCursor():
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, statement):
+        self.conn.executed.append((self.conn.autocommit, statement))
+
+    def copy_expert(self, statement, buffer):
+        self.conn.copied.append((statement, buffer.read()))
+
+
+class MockMigrateConn():
+
+    def __init__(self):
+        self.executed = []
+        self.copied = []
+        self.autocommit = False
+        self.commits = 0
+
+    def cursor(self):
+        return MockMigrateCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+class TestMigrationPlan(unittest.TestCase):
+
+    def setUp(self):
+        self.existing = table("events",
+                              RedshiftTableColumn("id", RedshiftIntType(), distkey=True, sortkey=1),
+                              RedshiftTableColumn("name", RedshiftVarcharType(10), encoding="lzo"))
+
+    def test_no_changes(self):
+        plan = redshift_migrate.MigrationPlan(self.existing, table(
+            "events", RedshiftTableColumn("name", RedshiftVarcharType(5))))
+        self.assertEqual(("none", []), (plan.strategy, plan.steps))
+
+    def test_alter_plan(self):
+        plan = redshift_migrate.MigrationPlan(self.existing, table(
+            "events",
+            RedshiftTableColumn("name", RedshiftVarcharType(40)),
+            RedshiftTableColumn("flag", RedshiftBooleanType(), notnull=True, primary_key=True)))
+        self.assertEqual("alter", plan.strategy)
+        self.assertEqual(
+            [sql.SQL("ALTER TABLE {table} ALTER COLUMN {column} TYPE {column_type};").format(
+                table=sql.SQL("{}.{}").format(sql.Identifier("public"), sql.Identifier("events")),
+                column=sql.Identifier("name"),
+                column_type=sql.SQL("VARCHAR (40)")),
+             sql.SQL("ALTER TABLE {table} ADD COLUMN {column};").format(
+                table=sql.SQL("{}.{}").format(sql.Identifier("public"), sql.Identifier("events")),
+                column=RedshiftTableColumn("flag", RedshiftBooleanType()).create_sql())],
+            plan.steps)
+        self.assertEqual(["id", "name", "flag"], plan.target.column_names())
+        self.assertEqual(RedshiftVarcharType(10), self.existing.columns[1].column_type)
+
+    def test_deep_copy_plan(self):
+        plan = redshift_migrate.MigrationPlan(self.existing, table(
+            "events",
+            RedshiftTableColumn("id", RedshiftBigIntType()),
+            RedshiftTableColumn("name", RedshiftVarcharType(40))))
+        self.assertEqual("deep_copy", plan.strategy)
+        self.assertEqual(4, len(plan.steps))
+        self.assertIn("events_schematic_deep_copy", repr(plan.steps[0]))
+        self.assertIn("BIGINT", repr(plan.steps[0]))
+        self.assertIn("CAST(", repr(plan.steps[1]))
+        self.assertEqual("id", plan.target.distkey.name)
+        self.assertEqual(["id"], [column.name for column in plan.target.sortkeys])
+
+    def test_encoding_forces_deep_copy(self):
+        existing = table("events", RedshiftTableColumn("name", RedshiftVarcharType(10),
+                                                       encoding="bytedict"))
+        plan = redshift_migrate.MigrationPlan(existing, table(
+            "events", RedshiftTableColumn("name", RedshiftVarcharType(40))))
+        self.assertEqual("deep_copy", plan.strategy)
+
+    def test_apply_alter_in_autocommit(self):
+        plan = redshift_migrate.MigrationPlan(self.existing, table(
+            "events", RedshiftTableColumn("name", RedshiftVarcharType(40))))
+        conn = MockMigrateConn()
+        plan.apply(conn)
+        self.assertEqual([(True, plan.steps[0])], conn.executed)
+        self.assertFalse(conn.autocommit)
+
+    def test_apply_deep_copy_in_transaction(self):
+        plan = redshift_migrate.MigrationPlan(self.existing, table(
+            "events", RedshiftTableColumn("id", RedshiftBigIntType())))
+        conn = MockMigrateConn()
+        plan.apply(conn)
+        self.assertEqual([(False, step) for step in plan.steps], conn.executed)
+        self.assertEqual(1, conn.commits)
+
+
+class TestEvolvingLoader(unittest.TestCase):
+
+    def test_creates_table_from_first_chunk(self):
+        conn = MockMigrateConn()
+        loader = redshift_migrate.EvolvingLoader(conn, "public", "events", ["id", "note"],
+                                                 chunk_size=2)
+        stats = loader.load([("1", ""), ("2", "")])
+        self.assertEqual(1, len(conn.executed))
+        self.assertEqual(RedshiftVarcharType(1), loader.table_def.get_column("note").column_type)
+        self.assertEqual((2, 1), (stats.rows, stats.batches))
+        self.assertEqual([], loader.plans)
+
+    def test_migrates_before_chunk_that_needs_it(self):
+        conn = MockMigrateConn()
+        existing = table("events",
+                         RedshiftTableColumn("id", RedshiftIntType()),
+                         RedshiftTableColumn("name", RedshiftVarcharType(3)))
+        loader = redshift_migrate.EvolvingLoader(conn, "public", "events",
+                                                 ["name", "id", "flag"],
+                                                 table_def=existing, chunk_size=2)
+        stats = loader.load([("abc", "10", ""), ("ab", "11", ""),
+                             ("abcdef", "12", ""), ("", "13", "")])
+        self.assertEqual(["alter", "alter"], [plan.strategy for plan in loader.plans])
+        self.assertEqual([["add flag RedshiftVarcharType(1)"],
+                          ["widen name RedshiftVarcharType(3) -> RedshiftVarcharType(6)"]],
+                         [[repr(change) for change in plan.changes] for plan in loader.plans])
+        self.assertEqual(RedshiftVarcharType(6), loader.table_def.get_column("name").column_type)
+        self.assertEqual((4, 2), (stats.rows, stats.batches))
+        self.assertEqual(2, len(conn.copied))
+        self.assertEqual("abcdef,12,\n,13,\n", conn.copied[1][1].replace("\r", ""))
+
+    def test_valid_chunks_do_not_migrate(self):
+        conn = MockMigrateConn()
+        existing = table("events",
+                         RedshiftTableColumn("at", RedshiftTimestampType()),
+                         RedshiftTableColumn("day", RedshiftDateType()),
+                         RedshiftTableColumn("price", RedshiftDecimalType((10, 2)),
+                                             null_strings=["NA"]))
+        loader = redshift_migrate.EvolvingLoader(conn, "public", "events",
+                                                 ["at", "day", "price"],
+                                                 table_def=existing, chunk_size=2)
+        stats = loader.load([("2020-01-01 10:00:00", "2020-01-10", "12345678.12"),
+                             ("2020-01-20T10:00:00.5", "2020-01-20", "-1.5"),
+                             ("", "", "NA")])
+        self.assertEqual([], loader.plans)
+        self.assertEqual([], conn.executed)
+        self.assertEqual(3, stats.rows)
+
+
+@unittest.skipUnless(os.environ.get("SCHEMATIC_TEST_CONN_STRING"),
+                     "Set SCHEMATIC_TEST_CONN_STRING to test against PostgreSQL")
+class TestMigrationPlanPostgres(unittest.TestCase):
+    """Test applying migrations to a PostgreSQL stand-in for Redshift"""
+
+    def setUp(self):
+        import psycopg2
+        self.conn = psycopg2.connect(os.environ["SCHEMATIC_TEST_CONN_STRING"])
+        self.existing = table("migrate_test",
+                              RedshiftTableColumn("id", RedshiftIntType()),
+                              RedshiftTableColumn("name", RedshiftVarcharType(3)))
+        with self.conn.cursor() as curs:
+            curs.execute("DROP TABLE IF EXISTS public.migrate_test")
+            curs.execute("CREATE TABLE public.migrate_test (id INT, name VARCHAR(3))")
+            curs.execute("INSERT INTO public.migrate_test VALUES (1, 'abc'), (2, NULL)")
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.rollback()
+        with self.conn.cursor() as curs:
+            curs.execute("DROP TABLE IF EXISTS public.migrate_test")
+        self.conn.commit()
+        self.conn.close()
+
+    def column_types(self):
+        with self.conn.cursor() as curs:
+            curs.execute("""SELECT column_name, data_type, character_maximum_length
+                FROM information_schema.columns
+                WHERE table_schema = 'public' AND table_name = 'migrate_test'
+                ORDER BY ordinal_position""")
+            return curs.fetchall()
+
+    def rows(self):
+        with self.conn.cursor() as curs:
+            curs.execute("SELECT * FROM public.migrate_test ORDER BY id")
+            return curs.fetchall()
+
+    def test_apply_alter(self):
+        redshift_migrate.MigrationPlan(self.existing, table(
+            "migrate_test",
+            RedshiftTableColumn("name", RedshiftVarcharType(10)),
+            RedshiftTableColumn("flag", RedshiftBooleanType()))).apply(self.conn)
+        self.assertEqual([("id", "integer", None),
+                          ("name", "character varying", 10),
+                          ("flag", "boolean", None)],
+                         self.column_types())
+        self.assertEqual([(1, "abc", None), (2, None, None)], self.rows())
+
+    def test_apply_deep_copy(self):
+        redshift_migrate.MigrationPlan(self.existing, table(
+            "migrate_test",
+            RedshiftTableColumn("id", RedshiftDateType()),
+            RedshiftTableColumn("score", RedshiftDecimalType((5, 2))))).apply(self.conn)
+        self.assertEqual([("id", "character varying", 11),
+                          ("name", "character varying", 3),
+                          ("score", "numeric", None)],
+                         self.column_types())
+        self.assertEqual([("1", "abc", None), ("2", None, None)], self.rows())
+
+    def test_evolving_load(self):
+        loader = redshift_migrate.EvolvingLoader(self.conn, "public", "migrate_test",
+                                                 ["id", "name", "note"],
+                                                 table_def=self.existing, chunk_size=2)
+        loader.load([("3", "ab", ""), ("4", "abcdef", ""), ("5", "x", "hello")])
+        self.conn.commit()
+        self.assertEqual([("id", "integer", None),
+                          ("name", "character varying", 6),
+                          ("note", "character varying", 5)],
+                         self.column_types())
+        self.assertEqual([(1, "abc", None), (2, None, None), (3, "ab", None),
+                          (4, "abcdef", None), (5, "x", "hello")], self.rows())
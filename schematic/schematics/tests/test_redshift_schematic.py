@@ -20,8 +20,14 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
+import datetime
+import decimal
+import io
+import os
 import unittest
 import re
+from unittest import mock
+import schematic
 from psycopg2 import sql
 from schematic.schematics.redshift_schematic import *
 
@@ -56,6 +62,25 @@ class TestRedshiftTableColumnMethods(unittest.TestCase):
             encoding='LZO',
             notnull=False)
 
+    def _column_sql(self, *constraints):
+        return sql.SQL(" ").join([sql.SQL("{name} {column_type}").format(
+            name=sql.Identifier("test"),
+            column_type=sql.SQL("INT"))] + [sql.SQL(c) for c in constraints])
+
+    def test_create_sql_no_constraints(self):
+        column = RedshiftTableColumn("test", RedshiftIntType())
+        self.assertEqual(column.create_sql(), self._column_sql())
+
+    def test_create_sql_notnull_primary_key(self):
+        column = RedshiftTableColumn("test", RedshiftIntType(),
+                                     notnull=True, primary_key=True, unique=True)
+        self.assertEqual(column.create_sql(),
+                         self._column_sql("NOT NULL", "PRIMARY KEY"))
+
+    def test_create_sql_unique(self):
+        column = RedshiftTableColumn("test", RedshiftIntType(), unique=True)
+        self.assertEqual(column.create_sql(), self._column_sql("UNIQUE"))
+
 
 ROWS = [("varchar_defaults",
          "character varying(256)",
@@ -110,6 +135,103 @@ class MockConnObject():
         self.cursor = MockCursorObject
 
 
+class MockCopyCursor():
+    """A mock cursor that records what's sent to copy_expert"""
+
+    def __init__(self, conn, name=None):
+        self.conn = conn
+        self.name = name
+        self.itersize = 2000
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.conn.closed_cursors.append(self.name)
+
+    def execute(self, statement, params=None):
+        self.conn.executed.append(statement)
+        self.rows = iter(self.conn.rows)
+
+    def __iter__(self):
+        return self.rows
+
+    def fetchmany(self, size):
+        return [row for _, row in zip(range(size), self.rows)]
+
+    def copy_expert(self, statement, file):
+        self.conn.copies.append((statement, file.read()))
+
+
+class MockCopyConn():
+    def __init__(self, rows=()):
+        self.executed = []
+        self.copies = []
+        self.rows = rows
+        self.closed_cursors = []
+
+    def cursor(self, name=None, *args, **kwargs):
+        return MockCopyCursor(self, name)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+@unittest.skipUnless(os.environ.get("SCHEMATIC_TEST_CONN_STRING"),
+                     "Set SCHEMATIC_TEST_CONN_STRING to test against PostgreSQL")
+class TestRedshiftTableDefinitionPostgres(unittest.TestCase):
+    """Test loading against a PostgreSQL stand-in for Redshift"""
+
+    def setUp(self):
+        import psycopg2
+        self.conn = psycopg2.connect(os.environ["SCHEMATIC_TEST_CONN_STRING"])
+        with self.conn.cursor() as curs:
+            curs.execute("CREATE TEMP TABLE load_test (id INT, name VARCHAR(5))")
+        self.table_def = RedshiftTableDefinition(
+            "pg_temp", "load_test",
+            [RedshiftTableColumn("id", RedshiftIntType()),
+             RedshiftTableColumn("name", RedshiftVarcharType(5), null_strings=["NA"])])
+
+    def tearDown(self):
+        self.conn.rollback()
+        self.conn.close()
+
+    def test_load_rows(self):
+        rows = [(str(i), "NA" if i % 2 else "x,\"y") for i in range(1000)]
+        stats = self.table_def.load_rows(self.conn, rows, buffer_size=1000)
+        self.assertEqual(stats.rows, 1000)
+        self.assertGreater(stats.batches, 1)
+        with self.conn.cursor() as curs:
+            curs.execute("SELECT count(*), count(name), max(name) FROM load_test")
+            self.assertEqual(curs.fetchone(), (1000, 500, 'x,"y'))
+
+    def test_get_rows(self):
+        rows = [(i, None if i % 2 else "x") for i in range(1000)]
+        self.table_def.load_rows(self.conn, [(str(i), "NA" if name is None else name)
+                                             for i, name in rows])
+        self.assertEqual(rows, list(self.table_def.get_rows(self.conn, itersize=100)))
+        batches = list(self.table_def.get_rows(self.conn, itersize=300, columnar=True))
+        self.assertEqual([300, 300, 300, 100], [len(ids) for ids, _ in batches])
+        self.assertEqual([i for i, _ in rows], [i for ids, _ in batches for i in ids])
+
+    def test_merge_rows(self):
+        self.table_def.load_rows(self.conn, [("1", "a"), ("2", "b"), ("", "c")])
+        stats = self.table_def.merge_rows(self.conn,
+                                          [("2", "bb"), ("3", "NA"), ("", "d")],
+                                          keys=["id"])
+        self.assertEqual((3, 1), (stats.rows, stats.replaced))
+        with self.conn.cursor() as curs:
+            curs.execute("SELECT * FROM load_test ORDER BY id, name")
+            self.assertEqual([(1, "a"), (2, "bb"), (3, None), (None, "c"), (None, "d")],
+                             curs.fetchall())
+            curs.execute("SELECT count(*) FROM pg_tables WHERE tablename LIKE '%staging%'")
+            self.assertEqual((0,), curs.fetchone())
+
+
 class TestRedshiftTableDefinitionMethods(unittest.TestCase):
     """Test all the methods for the RedshiftTableDefinition class"""
 
@@ -187,6 +309,198 @@ class TestRedshiftTableDefinitionMethods(unittest.TestCase):
     #     self.fail("TODO")
 
 
+    def test_copy_sql_emits_consistent_datetime_formats(self):
+        table_def = RedshiftTableDefinition("test", "dates", [
+            RedshiftTableColumn("d1", RedshiftDateType(), datetime_format="MM/DD/YYYY"),
+            RedshiftTableColumn("d2", RedshiftDateType(), datetime_format="MM/DD/YYYY"),
+            RedshiftTableColumn("t1", RedshiftTimestampType(),
+                                datetime_format="YYYY-MM-DD HH:MI:SS"),
+            RedshiftTableColumn("t2", RedshiftTimestampTZType())])
+        copy_sql = repr(table_def.copy_sql("s3://bucket/prefix",
+                                           iam_role="arn:role",
+                                           options=["GZIP"]))
+        self.assertIn("SQL('DATEFORMAT'), SQL(' '), Literal('MM/DD/YYYY')", copy_sql)
+        self.assertIn("SQL('TIMEFORMAT'), SQL(' '), Literal('auto')", copy_sql)
+        self.assertIn("Literal('s3://bucket/prefix')", copy_sql)
+        self.assertIn("Literal('arn:role')", copy_sql)
+        self.assertIn("SQL('GZIP')", copy_sql)
+
+    def test_null_as_none_with_multiple_sentinels(self):
+        table_def = RedshiftTableDefinition("test", "nulls", [
+            RedshiftTableColumn("a", RedshiftIntType(), null_strings=["NA"]),
+            RedshiftTableColumn("b", RedshiftIntType(), null_strings=["-"])])
+        self.assertIsNone(table_def.null_as())
+        self.assertNotIn("NULL AS", repr(table_def.copy_sql("s3://bucket")))
+
+    def test_load_rows_streams_buffered_copies(self):
+        table_def = RedshiftTableDefinition("test", "load", [
+            RedshiftTableColumn("id", RedshiftIntType()),
+            RedshiftTableColumn("name", RedshiftVarcharType(5), null_strings=["NA"])])
+        conn = MockCopyConn()
+        progress = []
+        rows = [(str(i), "NA" if i % 2 else "a,b") for i in range(10)]
+        stats = table_def.load_rows(conn, rows, buffer_size=20,
+                                    progress=lambda s: progress.append(s.rows))
+        self.assertEqual(stats.rows, 10)
+        self.assertEqual(stats.batches, len(conn.copies))
+        self.assertGreater(stats.batches, 1)
+        self.assertEqual(progress[-1], 10)
+        data = "".join(copied for _, copied in conn.copies)
+        self.assertEqual(data.splitlines()[:2], ['0,"a,b"', "1,"])
+        self.assertEqual(conn.copies[0][0], table_def.copy_stdin_sql())
+
+    def test_load_rows_adapts_batch_size(self):
+        table_def = RedshiftTableDefinition("test", "load", [
+            RedshiftTableColumn("id", RedshiftIntType())])
+        conn = MockCopyConn()
+        batch_size = schematic.AdaptiveBatchSize(initial_size=10, min_size=10, max_size=80)
+        stats = table_def.load_rows(conn, [(str(i),) for i in range(1000)],
+                                    batch_size=batch_size)
+        self.assertEqual(stats.batches, len(batch_size.batches))
+        self.assertEqual(10, batch_size.batches[0]["size"])
+        self.assertLessEqual(max(len(copied) for _, copied in conn.copies), 80 + 5)
+
+    def test_load_rows_backs_off_on_error(self):
+        table_def = RedshiftTableDefinition("test", "load", [
+            RedshiftTableColumn("id", RedshiftIntType())])
+        conn = MockCopyConn()
+        batch_size = schematic.AdaptiveBatchSize(initial_size=80, min_size=10)
+        with mock.patch.object(MockCopyCursor, "copy_expert", side_effect=OSError("timeout")):
+            with self.assertRaises(OSError):
+                table_def.load_rows(conn, [("1",)], batch_size=batch_size)
+        self.assertEqual(40, batch_size.size)
+
+    def test_load_rows_no_rows(self):
+        conn = MockCopyConn()
+        stats = self.mock_table_all_columns.load_rows(conn, [])
+        self.assertEqual((stats.rows, stats.batches), (0, 0))
+        self.assertEqual(conn.copies, [])
+
+    def test_merge_keys(self):
+        self.assertEqual([self.mock_columns_dict["varchar_no_defaults"]],
+                         self.mock_table_all_columns.merge_keys())
+        self.assertEqual([self.mock_columns_dict["boolean_defaults"]],
+                         self.mock_table_all_columns.merge_keys(["BOOLEAN_DEFAULTS"]))
+        with self.assertRaises(ValueError):
+            self.mock_table_all_columns.merge_keys(["missing"])
+        with self.assertRaises(ValueError):
+            RedshiftTableDefinition("test", "nokeys", [
+                RedshiftTableColumn("id", RedshiftIntType())]).merge_keys()
+
+    def test_merge_sql(self):
+        table_def = RedshiftTableDefinition("test", "events", [
+            RedshiftTableColumn("id", RedshiftIntType()),
+            RedshiftTableColumn("day", RedshiftDateType()),
+            RedshiftTableColumn("name", RedshiftVarcharType(5))])
+        create, delete, insert, drop = [repr(statement) for statement in
+                                        table_def.merge_sql("stage", keys=["id", "day"])]
+        self.assertIn("SQL('CREATE TEMP TABLE '), Identifier('stage'), SQL(' (LIKE '), "
+                      "Identifier('test', 'events')", create)
+        self.assertIn("SQL(' AND ')", delete)
+        self.assertIn("Identifier('day'), SQL(' = '), Identifier('stage'), SQL('.'), "
+                      "Identifier('day')", delete)
+        self.assertIn("SQL('INSERT INTO '), Identifier('test', 'events')", insert)
+        self.assertEqual("Composed([SQL('DROP TABLE '), Identifier('stage')])", drop)
+
+    def test_merge_rows_loads_staging_table_first(self):
+        table_def = RedshiftTableDefinition("test", "events", [
+            RedshiftTableColumn("id", RedshiftIntType(), primary_key=True),
+            RedshiftTableColumn("name", RedshiftVarcharType(5))])
+        conn = MockCopyConn()
+        stats = table_def.merge_rows(conn, [("1", "a"), ("2", "b")])
+        self.assertEqual((2, 1), (stats.rows, stats.batches))
+        self.assertEqual(4, len(conn.executed))
+        self.assertIn("CREATE TEMP TABLE", repr(conn.executed[0]))
+        self.assertIn("DELETE FROM", repr(conn.executed[1]))
+        self.assertIn("COPY", repr(conn.copies[0][0]))
+        self.assertNotIn("Identifier('test'", repr(conn.copies[0][0]))
+        self.assertEqual("1,a\r\n2,b\r\n", conn.copies[0][1])
+
+    def test_get_rows_uses_named_cursor(self):
+        table_def = RedshiftTableDefinition("test", "rows", [
+            RedshiftTableColumn("id", RedshiftIntType()),
+            RedshiftTableColumn("name", RedshiftVarcharType(5))])
+        rows = [(i, "n{}".format(i)) for i in range(5)]
+        conn = MockCopyConn(rows)
+        self.assertEqual(list(table_def.get_rows(conn, itersize=2)), rows)
+        self.assertEqual(conn.executed, [table_def.select_sql()])
+        self.assertEqual(len(conn.closed_cursors), 1)
+        self.assertTrue(conn.closed_cursors[0].startswith("schematic_"))
+
+    def test_get_rows_columnar(self):
+        table_def = RedshiftTableDefinition("test", "rows", [
+            RedshiftTableColumn("id", RedshiftIntType()),
+            RedshiftTableColumn("name", RedshiftVarcharType(5))])
+        conn = MockCopyConn([(i, "n{}".format(i)) for i in range(5)])
+        self.assertEqual(list(table_def.get_rows(conn, itersize=2, columnar=True)),
+                         [([0, 1], ["n0", "n1"]),
+                          ([2, 3], ["n2", "n3"]),
+                          ([4], ["n4"])])
+
+    def test_get_rows_closes_cursor_early(self):
+        conn = MockCopyConn([(i,) for i in range(5)])
+        rows = self.mock_table_all_columns.get_rows(conn)
+        next(rows)
+        rows.close()
+        self.assertEqual(len(conn.closed_cursors), 1)
+
+    def test_copy_sql_omits_formats_without_datetime_columns(self):
+        table_def = RedshiftTableDefinition("test", "ints", [
+            RedshiftTableColumn("i", RedshiftIntType())])
+        self.assertEqual(table_def._copy_format_sql("DATEFORMAT"), sql.SQL(""))
+
+
+class MockCatalogCursor(MockCursorObject):
+    """A mock cursor that returns pg_table_def rows for two tables"""
+
+    def execute(self, sql):
+        self.executed_with = sql
+        self.rows = [("first",) + row for row in ROWS] + \
+            [("second",) + ROWS[2]]
+
+
+class MockCatalogConn():
+    def __init__(self):
+        self.cursor = MockCatalogCursor
+        self.rolled_back = False
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+class TestReflectSchema(unittest.TestCase):
+    """Test reflecting whole schemas from pg_table_def"""
+
+    def test_reflect_schema(self):
+        table_defs = reflect_schema(MockCatalogConn(), "mock")
+        self.assertEqual(["first", "second"], list(table_defs))
+        self.assertEqual(table_defs["first"],
+                         RedshiftTableDefinition.from_source(MockConnObject(), "mock", "first"))
+        self.assertEqual(["boolean_defaults"], table_defs["second"].column_names())
+        self.assertEqual("mock", table_defs["second"].schema)
+
+    def test_reflect_schema_shares_parsed_types(self):
+        columns = reflect_schema(MockCatalogConn(), "mock")["first"].columns
+        self.assertIs(columns[0].column_type, columns[1].column_type)
+
+    def test_reflect_schema_no_tables(self):
+        self.assertEqual({}, reflect_schema(MockCatalogConn(), "mock", tables=[]))
+
+    def test_reflect_schemas_uses_pool(self):
+        connections = [MockCatalogConn(), MockCatalogConn()]
+        mock_pool = mock.Mock()
+        mock_pool.getconn.side_effect = connections
+        with mock.patch("schematic.schematics.redshift_schematic.pool.ThreadedConnectionPool",
+                        return_value=mock_pool) as pool_class:
+            reflected = reflect_schemas("dbname=test", ["a", "b"], pool_size=2)
+        pool_class.assert_called_once_with(1, 2, "dbname=test")
+        self.assertEqual(["a", "b"], list(reflected))
+        self.assertEqual("b", reflected["b"]["first"].schema)
+        self.assertEqual(2, mock_pool.putconn.call_count)
+        self.assertTrue(all(conn.rolled_back for conn in connections))
+        mock_pool.closeall.assert_called_once_with()
+
+
 class TestRedshiftVarcharTypeMethods(unittest.TestCase):
     """Test all the methods for the RedshiftVarcharType class"""
 
@@ -328,6 +642,12 @@ class TestRedshiftDecimalTypeMethods(unittest.TestCase):
         self.assertFalse(
             RedshiftDecimalType()._value_is_compatible_superset("12.0.0"))
 
+    def test_value_is_compatible_checks_digits_on_each_side(self):
+        column_type = RedshiftDecimalType((10, 2))
+        self.assertTrue(column_type.value_is_compatible("12345678.12"))
+        self.assertFalse(column_type.value_is_compatible("123456789.1"))
+        self.assertFalse(column_type.value_is_compatible("1.123"))
+
     def test_get_parameter_no_decimal_returns_precision(self):
         self.assertEqual((5, 0),
                          RedshiftDecimalType.get_parameter_for_value("12345"))
@@ -375,6 +695,141 @@ class TestRedshiftSmallIntType(unittest.TestCase):
 class TestRedshiftSchematic(unittest.TestCase):
     """Test all the methods for the redshift Schematic class"""
 
+    def test_table_def_from_rows_detects_keys(self):
+        rows = [("1", "a", "x"), ("2", "a", ""), ("3", "b", "y")]
+        table_def = RedshiftSchematic().table_def_from_rows(
+            schema="test", name="keys", fieldnames=["id", "code", "opt"],
+            rows=rows, detect_keys=True)
+        id_col, code_col, opt_col = table_def.columns
+        self.assertTrue(id_col.primary_key and id_col.notnull)
+        self.assertFalse(code_col.unique or code_col.primary_key)
+        self.assertTrue(code_col.notnull)
+        self.assertTrue(opt_col.unique)
+        self.assertFalse(opt_col.notnull or opt_col.primary_key)
+
+    def test_table_def_from_rows_rejects_within_tolerance(self):
+        handler = io.StringIO()
+        rejects = schematic.RejectWriter(handler, header=False)
+        rows = [("1", "a"), ("2", "b"), ("oops", "c"), ("4", "d")]
+        table_def = RedshiftSchematic().table_def_from_rows(
+            schema="test", name="t", fieldnames=["n", "s"], rows=rows,
+            tolerance=1, rejects=rejects)
+        self.assertEqual(table_def.columns[0].column_type, RedshiftBigIntType())
+        self.assertEqual(handler.getvalue(), "3,n,oops\r\n")
+        self.assertEqual(rejects.counts, {"n": 1, "s": 0})
+
+    def test_table_def_from_rows_widens_beyond_count_tolerance(self):
+        rows = [("1",), ("x",), ("2.5",), ("3.5",), ("z",)]
+        rejects = schematic.RejectWriter(io.StringIO())
+        table_def = RedshiftSchematic().table_def_from_rows(
+            schema="test", name="t", fieldnames=["n"], rows=rows,
+            tolerance=1, rejects=rejects)
+        self.assertEqual(table_def.columns[0].column_type,
+                         RedshiftVarcharType(3))
+        self.assertEqual(rejects.counts, {"n": 0})
+
+    def test_table_def_from_rows_rejects_smallest_group(self):
+        rows = [("1",), ("x",), ("2.5",), ("3.5",)]
+        handler = io.StringIO()
+        table_def = RedshiftSchematic().table_def_from_rows(
+            schema="test", name="t", fieldnames=["n"], rows=rows,
+            tolerance=1, rejects=schematic.RejectWriter(handler, header=False))
+        self.assertEqual(table_def.columns[0].column_type,
+                         RedshiftDoublePrecisionType())
+        self.assertEqual(handler.getvalue(), "2,n,x\r\n")
+
+    def test_table_def_from_rows_rejects_values_before_narrower_group(self):
+        rows = [("2.5",), ("a\nb",), ("1",), ("2",), ("3",)]
+        handler = io.StringIO()
+        table_def = RedshiftSchematic().table_def_from_rows(
+            schema="test", name="t", fieldnames=["n"], rows=rows,
+            tolerance=2, rejects=schematic.RejectWriter(handler, header=False))
+        self.assertEqual(table_def.columns[0].column_type, RedshiftBigIntType())
+        self.assertEqual(handler.getvalue(), '1,n,2.5\r\n2,n,"a\nb"\r\n')
+
+    def test_table_def_from_rows_fractional_tolerance(self):
+        rows = [(str(i),) for i in range(2, 100)] + [("x",), ("z",)]
+        table_def = RedshiftSchematic().table_def_from_rows(
+            schema="test", name="t", fieldnames=["n"], rows=rows,
+            tolerance=0.01)
+        self.assertEqual(table_def.columns[0].column_type, RedshiftVarcharType(2))
+        table_def = RedshiftSchematic().table_def_from_rows(
+            schema="test", name="t", fieldnames=["n"], rows=rows,
+            tolerance={"n": 0.02})
+        self.assertEqual(table_def.columns[0].column_type, RedshiftBigIntType())
+
+    def test_datetime_format_validator(self):
+        validator = datetime_format_validator("MM/DD/YYYY HH12:MI:SS AM")
+        self.assertTrue(validator("01/31/2019 11:59:01 PM"))
+        self.assertTrue(validator("01/31/2019 11:59:01.123 AM"))
+        self.assertFalse(validator("13/31/2019 11:59:01 PM"))
+        self.assertFalse(validator("01/31/2019 11:59:01 PM extra"))
+
+    def test_table_def_from_rows_detects_date_format(self):
+        rows = [("2019-01-01", "01/02/2019"), ("2019-01-02", "2019-01-03")]
+        table_def = RedshiftSchematic().table_def_from_rows(
+            schema="test", name="t", fieldnames=["a", "b"], rows=rows)
+        self.assertEqual(table_def.columns[0].column_type, RedshiftDateType())
+        self.assertEqual(table_def.columns[0].datetime_format, "YYYY-MM-DD")
+        self.assertEqual(table_def.columns[1].column_type, RedshiftDateType())
+        self.assertIsNone(table_def.columns[1].datetime_format)
+
+    def test_table_def_from_rows_detects_date_format_with_tolerance(self):
+        rows = [("01/02/2019",), ("bad",), ("12/31/2019",)]
+        table_def = RedshiftSchematic().table_def_from_rows(
+            schema="test", name="t", fieldnames=["a"], rows=rows, tolerance=1)
+        self.assertEqual(table_def.columns[0].datetime_format, "MM/DD/YYYY")
+
+    def test_table_def_from_rows_no_format_for_other_types(self):
+        table_def = RedshiftSchematic().table_def_from_rows(
+            schema="test", name="t", fieldnames=["a"], rows=[("20190101",)])
+        self.assertIsNone(table_def.columns[0].datetime_format)
+
+    def test_detect_null_strings_widening_candidates(self):
+        self.assertEqual(
+            RedshiftSchematic().detect_null_strings(
+                ["1", "NA", "2", "\\N", "NA", "None"]),
+            ["NA", "\\N"])
+
+    def test_detect_null_strings_ignores_candidates_fitting_type(self):
+        self.assertEqual(
+            RedshiftSchematic().detect_null_strings(["US", "NA", "-"]), [])
+
+    def test_table_def_from_rows_detects_null_strings(self):
+        rows = [("1", "a"), ("NA", "NA"), ("3", "c")]
+        table_def = RedshiftSchematic().table_def_from_rows(
+            schema="test", name="t", fieldnames=["n", "s"], rows=rows,
+            detect_null_strings=True, sample_size=2)
+        self.assertEqual(table_def.columns[0].column_type, RedshiftBigIntType())
+        self.assertEqual(table_def.columns[0].null_strings, ["NA"])
+        self.assertEqual(table_def.columns[1].null_strings, [])
+        self.assertEqual(table_def.null_as(), "NA")
+
+    def test_detect_null_strings_ignores_all_candidate_column(self):
+        self.assertEqual(
+            RedshiftSchematic().detect_null_strings(["-", "-", "None"]), [])
+
+    def test_table_def_from_rows_all_candidate_column(self):
+        rows = [("1", "-"), ("2", "-")]
+        table_def = RedshiftSchematic().table_def_from_rows(
+            schema="test", name="t", fieldnames=["n", "s"], rows=rows,
+            detect_null_strings=True)
+        self.assertEqual(table_def.columns[1].column_type, RedshiftVarcharType(1))
+        self.assertEqual(table_def.columns[1].null_strings, [])
+        table_def.create_sql()
+
+    def test_table_def_from_rows_null_strings_not_detected_by_default(self):
+        rows = [("1",), ("NA",)]
+        table_def = RedshiftSchematic().table_def_from_rows(
+            schema="test", name="t", fieldnames=["n"], rows=rows)
+        self.assertEqual(table_def.columns[0].column_type, RedshiftVarcharType(2))
+
+    def test_table_def_from_rows_no_constraints_by_default(self):
+        table_def = RedshiftSchematic().table_def_from_rows(
+            schema="test", name="keys", fieldnames=["id"], rows=[("1",), ("2",)])
+        self.assertFalse(table_def.columns[0].notnull)
+        self.assertFalse(table_def.columns[0].primary_key)
+
     def test_get_type_returns_none_null_string(self):
         self.assertEqual(None,
                          RedshiftSchematic().get_type("None"))
@@ -512,11 +967,146 @@ class TestRedshiftSchematic(unittest.TestCase):
             RedshiftVarcharType(256))
 
 
+class TestDatetimeFormatParser(unittest.TestCase):
+
+    def test_parses_fields(self):
+        parse = datetime_format_parser("MM/DD/YYYY HH12:MI:SS AM")
+        self.assertEqual((2020, 1, 2, 0, 30, 1.0), parse("01/02/2020 12:30:01 AM"))
+        self.assertEqual((2020, 1, 2, 13, 30, 1.5), parse("01/02/2020 01:30:01.5 PM"))
+        self.assertIsNone(parse("2020-01-02"))
+
+    def test_short_years(self):
+        parse = datetime_format_parser("MM/DD/YY")
+        self.assertEqual([1999, 2001], [parse(v)[0] for v in ["01/01/99", "01/01/01"]])
+
+
+class TestTypedRows(unittest.TestCase):
+    """Test converting rows with compiled per-column converters"""
+
+    def setUp(self):
+        self.table_def = RedshiftTableDefinition("test", "typed", [
+            RedshiftTableColumn("id", RedshiftIntType()),
+            RedshiftTableColumn("price", RedshiftDecimalType((5, 2))),
+            RedshiftTableColumn("score", RedshiftDoublePrecisionType()),
+            RedshiftTableColumn("active", RedshiftBooleanType()),
+            RedshiftTableColumn("day", RedshiftDateType(), datetime_format="MM/DD/YY"),
+            RedshiftTableColumn("at", RedshiftTimestampType()),
+            RedshiftTableColumn("note", RedshiftVarcharType(8), null_strings=["NA"])])
+
+    def test_converts_each_type(self):
+        row = ("1.0", "3.25", "1e3", "yes", "01/02/99", "2020-01-02T10:11:12.5", "hi")
+        self.assertEqual([(1, decimal.Decimal("3.25"), 1000.0, True, datetime.date(1999, 1, 2),
+                           datetime.datetime(2020, 1, 2, 10, 11, 12, 500000), "hi")],
+                         list(self.table_def.typed_rows([row])))
+
+    def test_null_strings_become_none(self):
+        row = ("", "None", "Null", "", "", "", "NA")
+        self.assertEqual([(None,) * 7], list(self.table_def.typed_rows([row])))
+
+    def test_datetime_formats_without_a_known_format(self):
+        convert = RedshiftTimestampType().converter()
+        self.assertEqual(datetime.datetime(2020, 1, 2, 13, 30, 1),
+                         convert("2020-01-02 01:30:01 PM"))
+        convert = RedshiftTimestampTZType().converter()
+        self.assertEqual(datetime.timezone(datetime.timedelta(hours=5)),
+                         convert("2020-01-02 10:11:12+05:00").tzinfo)
+
+    def test_invalid_values_raise_valueerror(self):
+        for column_type, value in [(RedshiftIntType(), "1.5"),
+                                   (RedshiftDecimalType((5, 2)), "abc"),
+                                   (RedshiftBooleanType(), "maybe"),
+                                   (RedshiftDateType(), "2020-13-01")]:
+            with self.assertRaises(ValueError):
+                column_type.converter()(value)
+
+
+class TestTypeStringParser(unittest.TestCase):
+    """Test parsing pg_table_def type strings"""
+
+    def test_parses_every_type(self):
+        for type_string, column_type in [
+                ("character varying(256)", RedshiftVarcharType(256)),
+                ("character(10)", RedshiftCharType(10)),
+                ("timestamp with time zone", RedshiftTimestampTZType()),
+                ("timestamp without time zone", RedshiftTimestampType()),
+                ("date", RedshiftDateType()),
+                ("numeric(18,2)", RedshiftDecimalType((18, 2))),
+                ("double precision", RedshiftDoublePrecisionType()),
+                ("real", RedshiftRealType()),
+                ("bigint", RedshiftBigIntType()),
+                ("integer", RedshiftIntType()),
+                ("smallint", RedshiftSmallIntType()),
+                ("boolean", RedshiftBooleanType())]:
+            parsed = TYPE_STRING_PARSER.parse(type_string)
+            self.assertIs(type(parsed), type(column_type), type_string)
+            self.assertEqual(parsed, column_type)
+
+    def test_matches_whole_string(self):
+        for type_string in ["int", "bigint[]", "time without time zone", "dates", "varchar"]:
+            with self.assertRaises(ValueError):
+                TYPE_STRING_PARSER.parse(type_string)
+        with self.assertRaises(ValueError):
+            RedshiftIntType.from_pg_table_def("bigint")
+
+    def test_interns_types_in_bounded_cache(self):
+        parser = TypeStringParser([RedshiftVarcharType, RedshiftIntType], maxsize=1)
+        first = parser.parse("integer")
+        self.assertIs(first, parser.parse("integer"))
+        parser.parse("character varying(5)")
+        self.assertIsNot(first, parser.parse("integer"))
+        self.assertEqual(1, parser.parse.cache_info().maxsize)
+
+
+class TestCommonTypes(unittest.TestCase):
+    """Test finding the types that can hold the values of two types"""
+
+    def test_common_type(self):
+        for first, second, common in [
+                (RedshiftVarcharType(10), RedshiftVarcharType(20), RedshiftVarcharType(20)),
+                (RedshiftIntType(), RedshiftBigIntType(), RedshiftBigIntType()),
+                (RedshiftSmallIntType(), RedshiftBooleanType(), RedshiftBigIntType()),
+                (RedshiftDateType(), RedshiftTimestampTZType(), RedshiftTimestampTZType()),
+                (RedshiftDateType(), RedshiftTimestampType(), RedshiftTimestampTZType()),
+                (RedshiftBigIntType(), RedshiftDecimalType((10, 2)), RedshiftDecimalType((21, 2))),
+                (RedshiftDecimalType((10, 2)), RedshiftDecimalType((6, 4)), RedshiftDecimalType((12, 4))),
+                (RedshiftBooleanType(), RedshiftVarcharType(3), RedshiftVarcharType(5)),
+                (RedshiftDateType(), RedshiftBigIntType(), RedshiftVarcharType(20)),
+                (RedshiftCharType(2), RedshiftCharType(8), RedshiftCharType(8)),
+                (RedshiftCharType(2), RedshiftVarcharType(1), RedshiftVarcharType(2))]:
+            for a, b in [(first, second), (second, first)]:
+                self.assertTrue(common.is_same(a.common_type(b)),
+                                "{} {} {}".format(a, b, a.common_type(b)))
+
+    def test_can_hold(self):
+        self.assertTrue(RedshiftVarcharType(20).can_hold(RedshiftVarcharType(10)))
+        self.assertFalse(RedshiftVarcharType(10).can_hold(RedshiftVarcharType(20)))
+        self.assertTrue(RedshiftBigIntType().can_hold(RedshiftIntType()))
+        self.assertFalse(RedshiftIntType().can_hold(RedshiftBigIntType()))
+        self.assertFalse(RedshiftDecimalType((10, 2)).can_hold(RedshiftDecimalType((10, 4))))
+
+    def test_diff(self):
+        existing = RedshiftTableDefinition("public", "t", [
+            RedshiftTableColumn("id", RedshiftIntType()),
+            RedshiftTableColumn("name", RedshiftVarcharType(10)),
+            RedshiftTableColumn("old", RedshiftDateType())])
+        required = RedshiftTableDefinition("public", "t", [
+            RedshiftTableColumn("ID", RedshiftSmallIntType()),
+            RedshiftTableColumn("name", RedshiftVarcharType(30)),
+            RedshiftTableColumn("new", RedshiftBooleanType())])
+        changes = existing.diff(required)
+        self.assertEqual(["name", "new"], [change.name for change in changes])
+        self.assertIs(changes[0].existing, existing.columns[1])
+        self.assertEqual(RedshiftVarcharType(30), changes[0].column_type)
+        self.assertTrue(changes[1].is_addition())
+        self.assertEqual(RedshiftBooleanType(), changes[1].column_type)
+
+
 class TestDatePatterns(unittest.TestCase):
 
     def setUp(self):
         self.valid_time_strings = [
             "T19:14:32.123453",
+            " 19:14:32",
             " 01:58:32 AM",
             "T12:29 PM"]
         self.invalid_time_strings = [
@@ -527,6 +1117,9 @@ class TestDatePatterns(unittest.TestCase):
             "3.14159"]
         self.valid_date_strings = [
             "2019-03-09",
+            "2019-03-10",
+            "20190120",
+            "12/20/2019",
             "20190622",
             "11/2/19",
             "12/04/2019",
@@ -608,3 +1201,29 @@ class TestDatePatterns(unittest.TestCase):
                     self.matches(
                         pattern, valid_string), msg="pattern: {} string: {}".format(
                         pattern, valid_string))
+
+    def test_valid_values_convert(self):
+        date_strings = self.valid_date_strings + ["today", "tomorrow", "yesterday"]
+        timestamp_strings = [date_string + time_string
+                             for date_string in date_strings
+                             for time_string in self.valid_time_strings]
+        timestamptz_strings = [timestamp_string + timezone_string
+                               for timestamp_string in timestamp_strings
+                               for timezone_string in self.valid_timezone_strings]
+        for column_type, values in [
+                (RedshiftDateType(), date_strings),
+                (RedshiftTimestampType(), timestamp_strings),
+                (RedshiftTimestampTZType(), timestamp_strings + timestamptz_strings)]:
+            convert = column_type.converter()
+            for value in values:
+                self.assertTrue(column_type.value_is_compatible(value), msg=value)
+                self.assertIsNotNone(convert(value), msg=value)
+
+    def test_valid_values_convert_to_their_fields(self):
+        convert = RedshiftTimestampTZType().converter()
+        self.assertEqual(datetime.datetime(2020, 1, 5, 12), convert("01/05/20 12:00:00"))
+        self.assertEqual(datetime.datetime(2020, 1, 1, 13, 30), convert("2020-01-01 01:30 PM"))
+        self.assertEqual(datetime.datetime(2019, 11, 2, 12, 29, tzinfo=datetime.timezone(
+            datetime.timedelta(hours=8))), convert("11/2/19T12:29 PM+08:00"))
+        self.assertEqual(datetime.date.today() - datetime.timedelta(days=1),
+                         RedshiftDateType().converter()("yesterday"))
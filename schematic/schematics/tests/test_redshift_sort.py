@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2019 Cody J. Hanson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from schematic.schematics import redshift_sort
+from schematic.schematics.redshift_schematic import *
+import os
+import pickle
+import random
+import tempfile
+import unittest
+
+
+class TestSortKeys(unittest.TestCase):
+
+    def test_column_sort_key_by_type(self):
+        ints = redshift_sort.ColumnSortKey(RedshiftTableColumn("i", RedshiftIntType()))
+        self.assertEqual(["2", "10", "x", ""], sorted(["", "10", "x", "2"], key=ints))
+        decimals = redshift_sort.ColumnSortKey(
+            RedshiftTableColumn("d", RedshiftDecimalType((5, 2))))
+        self.assertEqual(["-1.5", "9.99", "10"], sorted(["10", "9.99", "-1.5"], key=decimals))
+        strings = redshift_sort.ColumnSortKey(RedshiftTableColumn("s", RedshiftVarcharType(5)))
+        self.assertEqual(["10", "9"], sorted(["9", "10"], key=strings))
+
+    def test_column_sort_key_whole_numbers_and_nan(self):
+        ints = redshift_sort.ColumnSortKey(RedshiftTableColumn("i", RedshiftIntType()))
+        self.assertEqual(["2", "1e1", "11.0", "1.5"],
+                         sorted(["1.5", "11.0", "1e1", "2"], key=ints))
+        doubles = redshift_sort.ColumnSortKey(
+            RedshiftTableColumn("d", RedshiftDoublePrecisionType()))
+        self.assertEqual(["-1", "2.5", "NaN", ""],
+                         sorted(["NaN", "", "2.5", "-1"], key=doubles))
+
+    def test_column_sort_key_for_datetime_format(self):
+        dates = redshift_sort.ColumnSortKey(
+            RedshiftTableColumn("d", RedshiftDateType(), datetime_format="MM/DD/YYYY"))
+        self.assertEqual(["12/31/1999", "01/01/2000", "NA"],
+                         sorted(["01/01/2000", "NA", "12/31/1999"], key=dates))
+        dates = pickle.loads(pickle.dumps(dates))
+        self.assertLess(dates("12/31/1999"), dates("01/01/2000"))
+
+    def test_row_sort_key(self):
+        table_def = RedshiftTableDefinition("public", "events", [
+            RedshiftTableColumn("name", RedshiftVarcharType(5)),
+            RedshiftTableColumn("id", RedshiftIntType(), sortkey=1)])
+        self.assertEqual(((0, 2),), redshift_sort.RowSortKey(table_def)(("a", "2")))
+        self.assertEqual(((0, 2), (0, "a")),
+                         redshift_sort.RowSortKey(table_def, ["id", "NAME"])(("a", "2")))
+        with self.assertRaises(ValueError):
+            redshift_sort.RowSortKey(table_def, ["missing"])
+        with self.assertRaises(ValueError):
+            redshift_sort.RowSortKey(RedshiftTableDefinition("public", "plain", []))
+
+
+class TestExternalSort(unittest.TestCase):
+
+    def setUp(self):
+        self.table_def = RedshiftTableDefinition("public", "events", [
+            RedshiftTableColumn("id", RedshiftIntType(), sortkey=1),
+            RedshiftTableColumn("seq", RedshiftIntType())])
+        self.key = redshift_sort.RowSortKey(self.table_def)
+        random.seed(0)
+        self.rows = [(str(random.randint(0, 100)), str(i)) for i in range(2000)]
+
+    def test_sorts_in_memory(self):
+        self.assertEqual(sorted(self.rows, key=self.key),
+                         list(redshift_sort.external_sort(self.rows, self.key, run_rows=5000)))
+
+    def test_spills_runs_and_merges_stably(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            rows = list(redshift_sort.external_sort(self.rows, self.key, run_rows=300,
+                                                    processes=2, tmp_dir=tmp))
+            self.assertEqual([], os.listdir(tmp))
+        self.assertEqual(sorted(self.rows, key=self.key), rows)
+
+    def test_empty(self):
+        self.assertEqual([], list(redshift_sort.external_sort([], self.key)))
@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2019 Cody J. Hanson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from schematic.schematics import redshift_staging
+import csv
+import gzip
+import json
+import os
+import tempfile
+import unittest
+import boto3
+try:
+    import moto
+except ImportError:
+    moto = None
+from psycopg2 import sql
+from schematic.schematics import redshift_schematic
+
+
+class MockSliceCursor():
+
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, query):
+        self.executed.append(query)
+
+    def fetchone(self):
+        return (4,)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class MockCopyCursor(MockSliceCursor):
+
+    def __init__(self, executed):
+        self.executed = executed
+
+
+class MockSliceConn():
+
+    def cursor(self):
+        return MockSliceCursor()
+
+
+class TestSplitCSV(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.tmp_dir.name, "events.csv")
+        with open(self.csv_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["id", "user", "value"])
+            for i in range(1000):
+                writer.writerow([i, "user{}".format(i % 7), i * 2])
+        self.out_dir = os.path.join(self.tmp_dir.name, "parts")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def read_parts(self, staged_parts):
+        rows = []
+        for path, _, _ in staged_parts.parts:
+            with gzip.open(path, 'rt', newline='') as f:
+                rows.append(list(csv.reader(f)))
+        return rows
+
+    def test_get_slice_count(self):
+        self.assertEqual(4, redshift_staging.get_slice_count(MockSliceConn()))
+
+    def test_split_csv(self):
+        staged_parts = redshift_staging.split_csv(self.csv_path,
+                                                  self.out_dir,
+                                                  4,
+                                                  processes=2)
+        self.assertEqual(4, len(staged_parts.parts))
+        self.assertEqual(1000, staged_parts.row_count())
+        parts = self.read_parts(staged_parts)
+        self.assertEqual([str(i) for i in range(1000)],
+                         [row[0] for part in parts for row in part])
+        self.assertTrue(all(abs(len(part) - 250) < 50 for part in parts))
+
+    def test_split_csv_by_distkey(self):
+        staged_parts = redshift_staging.split_csv(self.csv_path,
+                                                  self.out_dir,
+                                                  3,
+                                                  distkey="user",
+                                                  processes=1)
+        parts = self.read_parts(staged_parts)
+        self.assertEqual(1000, sum(len(part) for part in parts))
+        users = [set(row[1] for row in part) for part in parts]
+        for i, part_users in enumerate(users):
+            for other in users[i + 1:]:
+                self.assertFalse(part_users & other)
+        self.assertEqual(["events.manifest"] +
+                         ["events.part{:04d}.csv.gz".format(i) for i in range(3)],
+                         sorted(os.listdir(self.out_dir)))
+
+    def test_split_csv_uncompressed(self):
+        staged_parts = redshift_staging.split_csv(self.csv_path,
+                                                  self.out_dir,
+                                                  2,
+                                                  compression=None,
+                                                  processes=1)
+        with open(staged_parts.parts[0][0]) as f:
+            self.assertEqual("0,user0,0\n", f.readline())
+        self.assertEqual(["MANIFEST"], staged_parts.copy_options())
+
+    def test_manifest(self):
+        staged_parts = redshift_staging.split_csv(self.csv_path,
+                                                  self.out_dir,
+                                                  2,
+                                                  processes=1,
+                                                  url_prefix="s3://bucket/events/")
+        with open(staged_parts.manifest_path) as f:
+            manifest = json.load(f)
+        self.assertEqual(
+            [{"url": "s3://bucket/events/events.part{:04d}.csv.gz".format(i),
+              "mandatory": True,
+              "meta": {"content_length": os.path.getsize(staged_parts.parts[i][0])}}
+             for i in range(2)],
+            manifest["entries"])
+        self.assertEqual(["MANIFEST", "GZIP"], staged_parts.copy_options())
+
+    def test_split_csv_rewrites_null_strings(self):
+        with open(self.csv_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["id", "user", "value"])
+            for i in range(100):
+                writer.writerow([i, "user{}".format(i % 7), "NA" if i % 2 else "None"])
+        table_def = redshift_schematic.RedshiftTableDefinition(
+            schema="public",
+            name="events",
+            columns=[redshift_schematic.RedshiftTableColumn(
+                "id", redshift_schematic.RedshiftBigIntType()),
+                redshift_schematic.RedshiftTableColumn(
+                "user", redshift_schematic.RedshiftVarcharType(8)),
+                redshift_schematic.RedshiftTableColumn(
+                "value", redshift_schematic.RedshiftBigIntType(), null_strings=["NA"])])
+        for distkey in [None, "user"]:
+            staged_parts = redshift_staging.split_csv(self.csv_path,
+                                                      self.out_dir,
+                                                      3,
+                                                      distkey=distkey,
+                                                      processes=1,
+                                                      table_def=table_def)
+            self.assertTrue(staged_parts.nulls_rewritten)
+            self.assertEqual(100, staged_parts.row_count())
+            rows = [row for part in self.read_parts(staged_parts) for row in part]
+            self.assertEqual(100, len(rows))
+            self.assertEqual({""}, set(row[2] for row in rows))
+
+    def test_copy_from_manifest_requires_rewritten_nulls(self):
+        staged_parts = redshift_staging.split_csv(self.csv_path, self.out_dir, 2,
+                                                  processes=1)
+        table_def = redshift_schematic.RedshiftTableDefinition(
+            schema="public", name="events", columns=[])
+        with self.assertRaises(ValueError):
+            redshift_staging.copy_from_manifest(MockSliceConn(), table_def,
+                                                "s3://bucket/events.manifest",
+                                                staged_parts)
+
+    def test_split_csv_errors(self):
+        with self.assertRaises(ValueError):
+            redshift_staging.split_csv(self.csv_path, self.out_dir, 2, compression="lz4")
+        with self.assertRaises(ValueError):
+            redshift_staging.split_csv(self.csv_path, self.out_dir, 2, distkey="missing")
+
+
+@unittest.skipUnless(moto, "moto is required for S3 tests")
+class TestUploadParts(unittest.TestCase):
+
+    def setUp(self):
+        self.mock_aws = moto.mock_aws()
+        self.mock_aws.start()
+        self.s3 = boto3.client("s3", region_name="us-east-1")
+        self.s3.create_bucket(Bucket="bucket")
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        csv_path = os.path.join(self.tmp_dir.name, "events.csv")
+        with open(csv_path, 'w') as f:
+            f.write("id,value\n")
+            for i in range(100):
+                f.write("{},{}\n".format(i, i * 2))
+        self.table_def = redshift_schematic.RedshiftTableDefinition(
+            schema="public",
+            name="events",
+            columns=[redshift_schematic.RedshiftTableColumn(
+                name, redshift_schematic.RedshiftBigIntType(), null_strings=["NA"])
+                for name in ["id", "value"]])
+        self.staged_parts = redshift_staging.split_csv(
+            csv_path, os.path.join(self.tmp_dir.name, "parts"), 3, processes=1,
+            table_def=self.table_def)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+        self.mock_aws.stop()
+
+    def test_upload_parts(self):
+        manifest_url = redshift_staging.upload_parts(self.staged_parts,
+                                                     "bucket",
+                                                     "loads/events",
+                                                     s3_client=self.s3,
+                                                     max_workers=2,
+                                                     multipart_chunk_size=5 * 1024 * 1024)
+        self.assertEqual("s3://bucket/loads/events/events.manifest", manifest_url)
+        keys = sorted(obj["Key"] for obj in
+                      self.s3.list_objects_v2(Bucket="bucket")["Contents"])
+        self.assertEqual(["loads/events/events.manifest"] +
+                         ["loads/events/events.part{:04d}.csv.gz".format(i)
+                          for i in range(3)],
+                         keys)
+        manifest = json.loads(self.s3.get_object(
+            Bucket="bucket", Key="loads/events/events.manifest")["Body"].read())
+        self.assertEqual(["s3://bucket/" + key for key in keys[1:]],
+                         [entry["url"] for entry in manifest["entries"]])
+        part = self.s3.get_object(Bucket="bucket", Key=keys[1])["Body"].read()
+        self.assertTrue(gzip.decompress(part).startswith(b"0,0\r\n"))
+
+    def test_copy_from_manifest(self):
+        executed = []
+
+        class MockCopyConn():
+            def cursor(self):
+                return MockCopyCursor(executed)
+
+        table_def = self.table_def
+        redshift_staging.copy_from_manifest(MockCopyConn(),
+                                            table_def,
+                                            "s3://bucket/events.manifest",
+                                            self.staged_parts,
+                                            iam_role="arn:aws:iam::0:role/copy")
+        self.assertEqual([table_def.copy_sql("s3://bucket/events.manifest",
+                                             iam_role="arn:aws:iam::0:role/copy",
+                                             options=["MANIFEST", "GZIP"],
+                                             null_as=False)],
+                         executed)
+
+
+@unittest.skipUnless(moto, "moto is required for S3 tests")
+class TestUnloadTable(unittest.TestCase):
+
+    def setUp(self):
+        self.mock_aws = moto.mock_aws()
+        self.mock_aws.start()
+        self.s3 = boto3.client("s3", region_name="us-east-1")
+        self.s3.create_bucket(Bucket="bucket")
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.table_def = redshift_schematic.RedshiftTableDefinition(
+            schema="public",
+            name="events",
+            columns=[redshift_schematic.RedshiftTableColumn(
+                name, redshift_schematic.RedshiftBigIntType())
+                for name in ["id", "value"]])
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+        self.mock_aws.stop()
+
+    def mock_unload(self, prefix, slices):
+        """Write parts and a manifest like a parallel UNLOAD would."""
+        entries = []
+        for i in range(slices):
+            key = "{}000{}_part_00.gz".format(prefix, i)
+            self.s3.put_object(Bucket="bucket", Key=key, Body=gzip.compress(
+                "".join("{},{}\n".format(j, i) for j in range(i * 10, i * 10 + 10))
+                .encode("utf-8")))
+            entries.append({"url": "s3://bucket/" + key})
+        self.s3.put_object(Bucket="bucket", Key=prefix + "manifest",
+                           Body=json.dumps({"entries": entries}))
+
+    def test_unload_table(self):
+        executed = []
+        test = self
+
+        class MockUnloadCursor(MockCopyCursor):
+            def execute(self, query):
+                executed.append(query)
+                test.mock_unload("unloads/events_", 4)
+
+        class MockUnloadConn():
+            def cursor(self):
+                return MockUnloadCursor(executed)
+
+        self.table_def.unload_sql = lambda conn, destination, **kwargs: (destination, kwargs)
+        unloaded_table = redshift_staging.unload_table(MockUnloadConn(),
+                                                       self.table_def,
+                                                       "bucket",
+                                                       "unloads/events_",
+                                                       iam_role="arn:aws:iam::0:role/unload",
+                                                       s3_client=self.s3,
+                                                       max_workers=2)
+        self.assertEqual([("s3://bucket/unloads/events_",
+                           {"iam_role": "arn:aws:iam::0:role/unload",
+                            "credentials": None,
+                            "options": ["PARALLEL ON", "MANIFEST", "ALLOWOVERWRITE", "GZIP"]})],
+                         executed)
+        self.assertIs(self.table_def, unloaded_table.table_def)
+        self.assertEqual(["id", "value"], unloaded_table.column_names())
+        out_dir = os.path.join(self.tmp_dir.name, "parts")
+        rows = list(unloaded_table.get_rows(out_dir))
+        self.assertEqual([(str(j), str(j // 10)) for j in range(40)], rows)
+        self.assertEqual([], os.listdir(out_dir))
+
+
+@unittest.skipUnless(os.environ.get("SCHEMATIC_TEST_CONN_STRING"),
+                     "Set SCHEMATIC_TEST_CONN_STRING to test against PostgreSQL")
+class TestUnloadSQLPostgres(unittest.TestCase):
+
+    def test_unload_sql(self):
+        import psycopg2
+        table_def = redshift_schematic.RedshiftTableDefinition(
+            schema="public",
+            name="events",
+            columns=[redshift_schematic.RedshiftTableColumn(
+                name, redshift_schematic.RedshiftBigIntType())
+                for name in ["id", "it's"]])
+        with psycopg2.connect(os.environ["SCHEMATIC_TEST_CONN_STRING"]) as conn:
+            unload_sql = table_def.unload_sql(conn, "s3://bucket/unloads/events_",
+                                              iam_role="arn:aws:iam::0:role/unload")
+            self.assertEqual(
+                """UNLOAD ('SELECT "id","it''s" FROM "public"."events"')
+        TO 's3://bucket/unloads/events_' IAM_ROLE 'arn:aws:iam::0:role/unload'
+        FORMAT AS CSV PARALLEL ON MANIFEST GZIP;""",
+                unload_sql.as_string(conn))
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2019 Cody J. Hanson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from schematic.schematics import row_dedupe
+import io
+import os
+import tempfile
+import unittest
+
+
+class TestDeduplicator(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = [("1", "a"), ("2", "b"), ("1", "a"), ("1", "z"), ("3", "c"), ("2", "b")]
+
+    def test_whole_rows(self):
+        with row_dedupe.Deduplicator() as dedupe:
+            self.assertEqual([("1", "a"), ("2", "b"), ("1", "z"), ("3", "c")],
+                             list(dedupe.filter_rows(self.rows)))
+            self.assertEqual((6, 2), (dedupe.rows, dedupe.duplicates))
+
+    def test_values_containing_separators_are_distinct(self):
+        rows = [("a\x1fb", "c"), ("a", "b\x1fc"), ("a,b", "c"), ("a", "b,c")]
+        with row_dedupe.Deduplicator() as dedupe:
+            self.assertEqual(rows, list(dedupe.filter_rows(rows)))
+
+    def test_key_columns_and_report(self):
+        handler = io.StringIO()
+        with row_dedupe.Deduplicator(key_indexes=[0], handler=handler,
+                                     fieldnames=["id", "name"]) as dedupe:
+            self.assertEqual([("1", "a"), ("2", "b"), ("3", "c")],
+                             list(dedupe.filter_rows(self.rows)))
+        self.assertEqual(["row_number,id,name", "3,1,a", "4,1,z", "6,2,b"],
+                         handler.getvalue().splitlines())
+
+    def test_spills_to_disk(self):
+        rows = [(str(i % 500),) for i in range(2000)]
+        with tempfile.TemporaryDirectory() as tmp:
+            for bloom_capacity in [None, 500]:
+                with row_dedupe.Deduplicator(max_keys=64, spill_dir=tmp,
+                                             bloom_capacity=bloom_capacity) as dedupe:
+                    self.assertEqual(rows[:500], list(dedupe.filter_rows(rows)))
+                    self.assertEqual(1500, dedupe.duplicates)
+                    self.assertGreater(dedupe.spilled, 400)
+                    self.assertEqual(1, len(os.listdir(tmp)))
+                self.assertEqual([], os.listdir(tmp))
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2019 Cody J. Hanson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from schematic.schematics import snapshot_delta
+from schematic.schematics.snapshot_delta import INSERT, UPDATE
+import os
+import tempfile
+import unittest
+
+
+class TestSnapshotDelta(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.day1 = os.path.join(self.tmp.name, "day1.idx")
+        self.day2 = os.path.join(self.tmp.name, "day2.idx")
+        with snapshot_delta.SnapshotDelta(self.day1, key_index=1, batch_size=2) as changes:
+            self.first = list(changes.changed_rows(
+                [("a", "1"), ("b", "2"), ("c", "3"), ("d", "4")]))
+            self.first_deleted = list(changes.deleted_keys())
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_first_snapshot_is_all_inserts(self):
+        self.assertEqual([INSERT] * 4, [action for action, _ in self.first])
+        self.assertEqual([], self.first_deleted)
+
+    def test_changes_since_previous_snapshot(self):
+        with snapshot_delta.SnapshotDelta(self.day2, self.day1,
+                                          key_index=1, batch_size=2) as changes:
+            changed = list(changes.changed_rows(
+                [("a", "1"), ("B", "2"), ("d", "4"), ("e", "5")]))
+            deleted = list(changes.deleted_keys())
+            self.assertEqual([(UPDATE, ("B", "2")), (INSERT, ("e", "5"))], changed)
+            self.assertEqual(["3"], deleted)
+            self.assertEqual((1, 1, 2, 1), (changes.inserted, changes.updated,
+                                            changes.unchanged, changes.deleted))
+
+    def test_index_is_replaced(self):
+        with snapshot_delta.SnapshotDelta(self.day1, key_index=1) as changes:
+            list(changes.changed_rows([("z", "9")]))
+        with snapshot_delta.SnapshotDelta(self.day2, self.day1, key_index=1) as changes:
+            self.assertEqual([], list(changes.changed_rows([("z", "9")])))
+            self.assertEqual([], list(changes.deleted_keys()))
+
+    def test_missing_previous_index(self):
+        with self.assertRaises(FileNotFoundError):
+            snapshot_delta.SnapshotDelta(self.day2, os.path.join(self.tmp.name, "nope.idx"))
+
+    def test_row_hash_separates_values(self):
+        self.assertNotEqual(snapshot_delta.row_hash(("ab", "c")),
+                            snapshot_delta.row_hash(("a", "bc")))
+        self.assertNotEqual(snapshot_delta.row_hash(("a\x1fb", "c")),
+                            snapshot_delta.row_hash(("a", "b\x1fc")))
+        self.assertEqual(snapshot_delta.ROW_HASH_BYTES,
+                         len(snapshot_delta.row_hash(("a",))))
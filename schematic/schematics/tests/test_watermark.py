@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2019 Cody J. Hanson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from schematic.schematics import csv_schematic, watermark
+from schematic.schematics.redshift_schematic import *
+import os
+import tempfile
+import unittest
+
+
+class MockLoadCursor():
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def copy_expert(self, statement, buffer):
+        self.conn.copied.append(buffer.read())
+
+
+class MockLoadConn():
+
+    def __init__(self):
+        self.copied = []
+        self.commits = 0
+
+    def cursor(self):
+        return MockLoadCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+
+class TestWatermark(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.tmp.name, "events.csv")
+        self.write_csv(range(1, 101))
+        self.store = watermark.WatermarkStore(os.path.join(self.tmp.name, "watermarks.db"))
+        self.table_def = RedshiftTableDefinition("public", "events", [
+            RedshiftTableColumn("id", RedshiftIntType()),
+            RedshiftTableColumn("name", RedshiftVarcharType(10))])
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def write_csv(self, ids):
+        with open(self.csv_path, "w") as f:
+            f.write("id,name\n")
+            for i in ids:
+                f.write("{},n{}\n".format(i, i))
+
+    def test_watermark_key(self):
+        def key(column_type, **kwargs):
+            return watermark.watermark_key(RedshiftTableColumn("c", column_type, **kwargs))
+        self.assertEqual(1000, key(RedshiftBigIntType())("1e3"))
+        self.assertLess(key(RedshiftDecimalType((5, 2)))("9.5"),
+                        key(RedshiftDecimalType((5, 2)))("10"))
+        self.assertLess(key(RedshiftDateType(), datetime_format="MM/DD/YYYY")("12/31/2019"),
+                        key(RedshiftDateType(), datetime_format="MM/DD/YYYY")("01/02/2020"))
+        self.assertLess(key(RedshiftTimestampTZType())("2020-01-01 10:00:00+02:00"),
+                        key(RedshiftTimestampTZType())("2020-01-01 09:00:00"))
+        self.assertEqual(str, key(RedshiftVarcharType(10)))
+
+    def test_sorted_offset_after(self):
+        for value, first in [("0", "1"), ("9", "10"), ("99", "100")]:
+            offset = watermark.sorted_offset_after(self.csv_path, 0, value, int)
+            self.assertEqual(first, next(csv_schematic.read_rows(self.csv_path, offset))[0])
+        offset = watermark.sorted_offset_after(self.csv_path, 0, "100", int)
+        self.assertEqual(os.path.getsize(self.csv_path), offset)
+
+    def test_sorted_offset_after_skips_nulls(self):
+        ids = ["", "1", "None", "2.0", "", "3", "4", "", "", "5", "None"]
+        self.write_csv(ids)
+        key = watermark.watermark_key(RedshiftTableColumn("id", RedshiftIntType()))
+        for value, first in [("0", "1"), ("1", "2.0"), ("2", "3"), ("4", "5")]:
+            offset = watermark.sorted_offset_after(self.csv_path, 0, value, key)
+            self.assertEqual(first, [row[0] for row in csv_schematic.read_rows(
+                self.csv_path, offset) if row[0] not in ("", "None")][0])
+        for value in [None, "0", "2", "4", "5"]:
+            self.assertEqual(list(watermark.rows_after(self.csv_path, 0, value, key)),
+                             list(watermark.rows_after(self.csv_path, 0, value, key,
+                                                       is_sorted=True)))
+
+    def test_rows_after_matches_for_sorted_and_unsorted(self):
+        for value in [None, "0", "50", "100"]:
+            self.assertEqual(list(watermark.rows_after(self.csv_path, 0, value, int)),
+                             list(watermark.rows_after(self.csv_path, 0, value, int,
+                                                       is_sorted=True)))
+        self.assertEqual([("100", "n100")],
+                         list(watermark.rows_after(self.csv_path, 0, "99", int, is_sorted=True)))
+
+    def test_rows_after_unsorted(self):
+        self.write_csv([5, 1, 8, 3])
+        self.assertEqual(["5", "8"],
+                         [row[0] for row in watermark.rows_after(self.csv_path, 0, "3", int)])
+
+    def test_store_rejects_other_column(self):
+        self.store.set("public.events", "id", "10")
+        self.assertEqual("10", self.store.get("public.events", "id"))
+        self.assertIsNone(self.store.get("public.other", "id"))
+        with self.assertRaises(ValueError):
+            self.store.get("public.events", "name")
+
+    def test_append_rows_after_watermark(self):
+        conn = MockLoadConn()
+        stats, high = watermark.append_rows_after_watermark(
+            conn, self.table_def, self.csv_path, "id", self.store, is_sorted=True)
+        self.assertEqual((100, "100", 1), (stats.rows, high, conn.commits))
+        self.write_csv(range(1, 106))
+        stats, high = watermark.append_rows_after_watermark(
+            conn, self.table_def, self.csv_path, "id", self.store, is_sorted=True)
+        self.assertEqual((5, "105"), (stats.rows, high))
+        self.assertEqual("101,n101", conn.copied[-1].splitlines()[0])
+        self.assertEqual("105", self.store.get("public.events", "id"))
+        stats, high = watermark.append_rows_after_watermark(
+            conn, self.table_def, self.csv_path, "id", self.store)
+        self.assertEqual((0, "105"), (stats.rows, high))
+
+    def test_append_rows_after_non_iso_date_watermark(self):
+        with open(self.csv_path, "w") as f:
+            f.write("day,name\n12/30/2019,a\n12/31/2019,b\n01/02/2020,c\n")
+        table_def = RedshiftTableDefinition("public", "days", [
+            RedshiftTableColumn("day", RedshiftDateType(), datetime_format="MM/DD/YYYY"),
+            RedshiftTableColumn("name", RedshiftVarcharType(10))])
+        self.store.set("public.days", "day", "12/31/2019")
+        for is_sorted in (True, False):
+            key = watermark.watermark_key(table_def.columns[0])
+            self.assertEqual([("01/02/2020", "c")],
+                             list(watermark.rows_after(self.csv_path, 0, "12/31/2019",
+                                                       key, is_sorted)))
+        conn = MockLoadConn()
+        stats, high = watermark.append_rows_after_watermark(
+            conn, table_def, self.csv_path, "day", self.store, is_sorted=True)
+        self.assertEqual((1, "01/02/2020"), (stats.rows, high))
+        self.assertEqual("01/02/2020", self.store.get("public.days", "day"))
+
+    def test_append_unknown_column(self):
+        with self.assertRaises(ValueError):
+            watermark.append_rows_after_watermark(
+                MockLoadConn(), self.table_def, self.csv_path, "missing", self.store)
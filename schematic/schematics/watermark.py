@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2019 Cody J. Hanson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Incremental appends of the rows beyond a high-watermark.
+
+A WatermarkStore records the largest value of a monotonic column, such as an
+id or an update timestamp, loaded into each table, so the next load of an
+ever-growing file only has to append the rows beyond it.
+"""
+import csv
+import datetime
+import mmap
+import os
+import sqlite3
+import time
+from schematic.schematics import csv_schematic, redshift_schematic
+
+
+def watermark_key(column):
+    """Get the function that orders values of a watermark column.
+
+    Numbers are compared as numbers, dates and timestamps as the dates and
+    times they're parsed to in the column's datetime_format, and everything
+    else as strings. Timestamps with a time zone are compared in UTC.
+
+    Args:
+      column: The RedshiftTableColumn
+    Returns:
+      A function from a string value to something comparable
+    """
+    column_type = column.column_type
+    if isinstance(column_type, redshift_schematic.RedshiftAbstractIntType):
+        return redshift_schematic._to_int
+    if isinstance(column_type, redshift_schematic.RedshiftAbstractDecimalType):
+        return redshift_schematic._to_decimal
+    if isinstance(column_type, redshift_schematic.RedshiftAbstractDatetimeType):
+        convert = column.converter()
+
+        def key(value):
+            converted = convert(value)
+            if getattr(converted, "tzinfo", None) is not None:
+                converted = converted.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+            return converted
+        return key
+    return str
+
+
+class WatermarkStore():
+    """The high-watermark of each table, kept in a SQLite database."""
+
+    def __init__(self, path):
+        """
+        Args:
+          path: Path to the SQLite database
+        """
+        self.db = sqlite3.connect(path)
+        with self.db:
+            self.db.execute("""CREATE TABLE IF NOT EXISTS watermarks (
+                tablename TEXT PRIMARY KEY, column_name TEXT, value TEXT, updated_at REAL)""")
+
+    def get(self, tablename, column_name):
+        """Get the watermark of a table.
+
+        Args:
+          tablename: The schema-qualified name of the table
+          column_name: The name of the watermark column
+        Returns:
+          The watermark, as a string, or None if there isn't one
+        Raises:
+          ValueError: If the table's watermark is for a different column
+        """
+        stored = self.db.execute(
+            "SELECT column_name, value FROM watermarks WHERE tablename = ?",
+            (tablename,)).fetchone()
+        if stored is None:
+            return None
+        if stored[0] != column_name:
+            raise ValueError("The watermark for {} is on {}, not {}".format(
+                tablename, stored[0], column_name))
+        return stored[1]
+
+    def set(self, tablename, column_name, value):
+        """Record the watermark of a table."""
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?, ?)",
+                            (tablename, column_name, value, time.time()))
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _line_start(mapped, position, data_start):
+    """The offset of the first line that starts at or after position."""
+    if position <= data_start or mapped[position - 1:position] == b"\n":
+        return position
+    newline = mapped.find(b"\n", position)
+    return len(mapped) if newline == -1 else newline + 1
+
+
+def _probe_value(mapped, start, column_index, null_strings, encoding):
+    """Get the first non-null value in the column at or after a line start.
+
+    Returns:
+      A (line start, value) tuple, or (end of file, None) if there isn't one
+    """
+    while start < len(mapped):
+        end = mapped.find(b"\n", start)
+        end = len(mapped) if end == -1 else end
+        row = next(csv.reader([mapped[start:end].decode(encoding)]), ())
+        if len(row) > column_index and row[column_index] not in null_strings:
+            return start, row[column_index]
+        start = end + 1
+    return len(mapped), None
+
+
+def sorted_offset_after(file_path, column_index, watermark, key=str, encoding="utf-8",
+                        null_strings=redshift_schematic.RedshiftSchematic.null_strings):
+    """Binary search a CSV file sorted on a column for its first row beyond a
+    watermark, by probing rows at byte offsets of the memory-mapped file.
+    Rows with a null in the column are skipped over, wherever they're sorted.
+
+    Like chunk_offsets, this assumes quoted values don't contain newlines.
+
+    Args:
+      file_path: Path to the CSV file, with a header
+      column_index: The position of the sorted column in each row
+      watermark: The largest value already loaded, as a string
+      key: A function ordering the column's values, e.g. from watermark_key
+      encoding: The file's encoding
+      null_strings: Values to treat as null
+    Returns:
+      The byte offset of the first row beyond the watermark, e.g. for read_rows
+    """
+    watermark = key(watermark)
+    null_strings = frozenset(null_strings).union([""])
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            data_start = mapped.find(b"\n") + 1 or len(mapped)
+            low, high = data_start, len(mapped)
+            while low < high:
+                start, value = _probe_value(
+                    mapped, _line_start(mapped, (low + high) // 2, data_start),
+                    column_index, null_strings, encoding)
+                if value is None or key(value) > watermark:
+                    high = (low + high) // 2
+                else:
+                    low = start + 1
+            return _line_start(mapped, low, data_start)
+
+
+def rows_after(file_path, column_index, watermark, key=str, is_sorted=False,
+               null_strings=redshift_schematic.RedshiftSchematic.null_strings):
+    """Read the rows of a CSV file beyond a watermark. Rows with a null
+    in the watermark column are skipped.
+
+    Args:
+      file_path: Path to the CSV file, with a header
+      column_index: The position of the watermark column in each row
+      watermark: The largest value already loaded, as a string, or None
+                 to read every row
+      key: A function ordering the column's values, e.g. from watermark_key
+      is_sorted: Whether the file is sorted on the column, so the first row
+                 beyond the watermark can be found with a binary search
+      null_strings: Values to treat as null
+    Yields:
+      Tuples of values
+    """
+    null_strings = frozenset(null_strings)
+    if watermark is not None and is_sorted:
+        offset = sorted_offset_after(file_path, column_index, watermark, key,
+                                     null_strings=null_strings)
+        for row in csv_schematic.read_rows(file_path, offset):
+            if row[column_index] not in null_strings:
+                yield row
+        return
+    if watermark is not None:
+        watermark = key(watermark)
+    rows = csv_schematic.read_rows(file_path)
+    next(rows, None)
+    for row in rows:
+        value = row[column_index]
+        if value not in null_strings and (watermark is None or key(value) > watermark):
+            yield row
+
+
+def append_rows_after_watermark(conn, table_def, file_path, column_name, store,
+                                is_sorted=False,
+                                buffer_size=redshift_schematic.DEFAULT_LOAD_BUFFER_SIZE,
+                                progress=None):
+    """Load the rows of a CSV file beyond the table's watermark, then commit
+    and move the watermark to the largest value loaded.
+
+    The watermark is only recorded once the rows are committed, so a failure
+    in between means the rows are loaded again next time rather than lost.
+
+    Args:
+      conn: A psycopg2.connection to a PostgreSQL-compatible destination
+      table_def: The RedshiftTableDefinition of the table, with its columns
+                 in the same order as the file's
+      file_path: Path to the CSV file, with a header
+      column_name: The name of the watermark column
+      store: A WatermarkStore
+      is_sorted: See rows_after
+      buffer_size: The size of each COPY, in bytes
+      progress: A function to call with the schematic.LoadStats after each COPY
+    Returns:
+      A (schematic.LoadStats, watermark) tuple
+    Raises:
+      ValueError: If the table has no such column, or its watermark is on another one
+    """
+    column = table_def.get_column(column_name)
+    if column is None:
+        raise ValueError("{} has no column {}".format(table_def.name, column_name))
+    column_index = table_def.columns.index(column)
+    key = watermark_key(column)
+    watermark = store.get(table_def.name, column.name)
+    highest = [watermark, None if watermark is None else key(watermark)]
+
+    def track(rows):
+        for row in rows:
+            value = key(row[column_index])
+            if highest[1] is None or value > highest[1]:
+                highest[:] = [row[column_index], value]
+            yield row
+    null_strings = table_def.null_string_sets()[column_index]
+    stats = table_def.load_rows(conn,
+                                track(rows_after(file_path, column_index, watermark,
+                                                 key, is_sorted, null_strings)),
+                                buffer_size=buffer_size,
+                                progress=progress)
+    conn.commit()
+    if highest[0] is not None and highest[0] != watermark:
+        store.set(table_def.name, column.name, highest[0])
+    return stats, highest[0]
@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2019 Cody J. Hanson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Probabilistic and memory-bounded data structures used while
+scanning large sources.
+
+Values are hashed with python's builtin hash(), which is stable
+for the lifetime of a process, so none of these structures should
+be persisted or shared across processes. row_digest is stable
+everywhere, for hashes that are.
+"""
+import hashlib
+import math
+import os
+import tempfile
+from array import array
+
+HASH_MASK = 0xFFFFFFFFFFFFFFFF
+DEFAULT_DISTINCT_MEMORY_LIMIT = 1000000
+# A DistinctTracker whose HyperLogLog estimate is this far below the number of
+# values added has duplicates. HyperLogLog's error is about 1%, so it's safe.
+DISTINCT_ESTIMATE_MARGIN = 0.1
+
+
+def hash64(value):
+    """Get an unsigned 64-bit hash for a hashable value.
+
+    Args:
+      value: The value to hash, e.g. a string or tuple of strings
+    Returns:
+      An int between 0 and 2**64 - 1
+    """
+    return hash(value) & HASH_MASK
+
+
+def row_digest(values, digest_size=16):
+    """Hash a row of strings into a digest that's the same in every process.
+
+    Each value is prefixed with its length, so values can't run together,
+    e.g. ('a,b', 'c') and ('a', 'b,c') hash differently.
+
+    Args:
+      values: An iterable of strings
+      digest_size: The size of the digest, in bytes, at least 8
+    Returns:
+      digest_size bytes
+    """
+    hashed = hashlib.blake2b(digest_size=digest_size)
+    for value in values:
+        encoded = value.encode("utf-8")
+        hashed.update(len(encoded).to_bytes(8, "little"))
+        hashed.update(encoded)
+    return hashed.digest()
+
+
+def digest64(digest):
+    """Get an unsigned 64-bit hash from a digest, e.g. from row_digest.
+
+    Returns:
+      An int between 0 and 2**64 - 1
+    """
+    return int.from_bytes(digest[:8], "little")
+
+
+class BloomFilter():
+    """A Bloom filter over 64-bit hashes.
+
+    Attributes:
+      capacity: The number of items the filter was sized for
+      error_rate: The false positive rate at capacity
+      num_bits: The size of the bit array
+      num_hashes: The number of bit positions set for each item
+    """
+
+    def __init__(self, capacity=10000000, error_rate=0.01):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) /
+                                   (math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(
+            self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, hashed):
+        low, high = hashed & 0xFFFFFFFF, hashed >> 32
+        for i in range(self.num_hashes):
+            yield (low + i * high) % self.num_bits
+
+    def add_hash(self, hashed):
+        """Add an already hashed item to the filter.
+
+        Args:
+          hashed: A 64-bit hash, as returned by hash64
+        Returns:
+          True if the item may already have been in the filter,
+          False if it definitely wasn't.
+        """
+        seen = True
+        for position in self._positions(hashed):
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                seen = False
+                self.bits[byte] |= 1 << bit
+        return seen
+
+    def contains_hash(self, hashed):
+        """Check whether an already hashed item may be in the filter.
+
+        Args:
+          hashed: A 64-bit hash, as returned by hash64
+        Returns:
+          False if the item definitely isn't in the filter, otherwise True
+        """
+        for position in self._positions(hashed):
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                return False
+        return True
+
+    def add_digest(self, digest):
+        """Add an item by its digest, e.g. from row_digest. See add_hash."""
+        return self.add_hash(digest64(digest))
+
+    def contains_digest(self, digest):
+        """Check whether an item may be in the filter by its digest.
+        See contains_hash."""
+        return self.contains_hash(digest64(digest))
+
+    def add(self, value):
+        return self.add_hash(hash64(value))
+
+    def __contains__(self, value):
+        return self.contains_hash(hash64(value))
+
+
+class HyperLogLog():
+    """A HyperLogLog cardinality estimator over 64-bit hashes.
+
+    Attributes:
+      precision: Number of hash bits used to pick a register.
+                 Standard error is roughly 1.04 / sqrt(2 ** precision).
+    """
+
+    def __init__(self, precision=14):
+        if not 4 <= precision <= 18:
+            raise ValueError("HyperLogLog precision must be between 4 and 18")
+        self.precision = precision
+        self.num_registers = 1 << precision
+        self.registers = bytearray(self.num_registers)
+
+    def add_hash(self, hashed):
+        """Add an already hashed item.
+
+        Args:
+          hashed: A 64-bit hash, as returned by hash64
+        """
+        index = hashed >> (64 - self.precision)
+        remaining = (hashed << self.precision) & HASH_MASK
+        rank = 65 - remaining.bit_length() if remaining else 65 - self.precision
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def add(self, value):
+        self.add_hash(hash64(value))
+
+    def estimate(self):
+        """Estimate the number of distinct items added.
+
+        Returns:
+          An int
+        """
+        m = self.num_registers
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            return int(round(m * math.log(m / zeros)))
+        return int(round(raw))
+
+
+class DistinctBudget():
+    """A limit on the number of hashes held in memory by a group of
+    DistinctTrackers, e.g. the ones for every column of a table. When the
+    group reaches it, the tracker holding the most hashes spills them.
+
+    Attributes:
+      memory_limit: Maximum number of hashes held in memory by all the trackers
+      used: The number of hashes they hold now
+      trackers: The DistinctTrackers sharing this budget
+    """
+
+    def __init__(self, memory_limit=DEFAULT_DISTINCT_MEMORY_LIMIT):
+        self.memory_limit = memory_limit
+        self.used = 0
+        self.trackers = []
+
+    def reserve(self):
+        """Account for a hash added to one of the trackers."""
+        self.used += 1
+        if self.used >= self.memory_limit:
+            max(self.trackers, key=lambda tracker: len(tracker._hashes))._over_limit()
+
+
+class DistinctTracker():
+    """Tracks whether every value added to it is distinct.
+
+    Hashes are kept in an exact in-memory set until its DistinctBudget
+    is used up, at which point they are spilled to hash-partitioned
+    files on disk and checked one partition at a time in is_unique().
+    If spilling is disabled, or the spill files grow beyond
+    max_spill_bytes, the tracker falls back to a Bloom filter, which
+    can only err towards reporting duplicates. Before spilling, a
+    HyperLogLog estimate of the distinct count well below the number
+    of values added means there are duplicates, so the tracker stops
+    without writing anything to disk.
+
+    Attributes:
+      memory_limit: Maximum number of hashes held in memory by the trackers
+                    sharing this one's budget
+      budget: The DistinctBudget this tracker shares with others
+      spill: Whether to spill hashes to disk when over memory_limit
+      spill_dir: Directory to create spill files in, or None for the default
+      partitions: Number of spill files
+      max_spill_bytes: Maximum total size of spill files, or None for no limit
+      count: The number of values added
+      exact: False once the tracker has fallen back to a Bloom filter
+      duplicate_found: True once a duplicate has been seen
+    """
+
+    def __init__(self,
+                 memory_limit=DEFAULT_DISTINCT_MEMORY_LIMIT,
+                 spill=True,
+                 spill_dir=None,
+                 partitions=64,
+                 max_spill_bytes=None,
+                 bloom_capacity=10000000,
+                 bloom_error_rate=0.001,
+                 budget=None):
+        """
+        Args:
+          memory_limit: Maximum number of hashes to hold in memory,
+                        if budget is None
+          budget: A DistinctBudget to share with other trackers, or None
+                  for one of this tracker's own
+          Other arguments: See Attributes
+        """
+        self.budget = budget if budget is not None else DistinctBudget(memory_limit)
+        self.budget.trackers.append(self)
+        self.memory_limit = self.budget.memory_limit
+        self.spill = spill
+        self.spill_dir = spill_dir
+        self.partitions = partitions
+        self.max_spill_bytes = max_spill_bytes
+        self.bloom_capacity = bloom_capacity
+        self.bloom_error_rate = bloom_error_rate
+        self.count = 0
+        self.exact = True
+        self.duplicate_found = False
+        self.hll = HyperLogLog()
+        self._hashes = set()
+        self._bloom = None
+        self._spill_tmpdir = None
+        self._spilled_bytes = 0
+
+    def add(self, value):
+        """Add a value.
+
+        Args:
+          value: A hashable value
+        """
+        hashed = hash64(value)
+        self.count += 1
+        self.hll.add_hash(hashed)
+        if self.duplicate_found:
+            return
+        if not self.exact:
+            if self._bloom.add_hash(hashed):
+                self.duplicate_found = True
+            return
+        if hashed in self._hashes:
+            self.duplicate_found = True
+            self._discard()
+            return
+        self._hashes.add(hashed)
+        self.budget.reserve()
+
+    def _over_limit(self):
+        """Free this tracker's hashes for its budget."""
+        if self.hll.estimate() < self.count * (1 - DISTINCT_ESTIMATE_MARGIN):
+            self.duplicate_found = True
+            self._discard()
+        elif self.spill:
+            self._spill()
+        else:
+            self._fall_back_to_bloom()
+
+    def _clear_hashes(self):
+        self.budget.used -= len(self._hashes)
+        self._hashes = set()
+
+    def _partition_path(self, partition):
+        return os.path.join(self._spill_tmpdir.name,
+                            "{}.bin".format(partition))
+
+    def _spill(self):
+        if self._spill_tmpdir is None:
+            self._spill_tmpdir = tempfile.TemporaryDirectory(
+                prefix="schematic-distinct-", dir=self.spill_dir)
+        buckets = [array('Q') for _ in range(self.partitions)]
+        for hashed in self._hashes:
+            buckets[hashed % self.partitions].append(hashed)
+        for partition, bucket in enumerate(buckets):
+            if bucket:
+                with open(self._partition_path(partition), 'ab') as f:
+                    bucket.tofile(f)
+        self._spilled_bytes += len(self._hashes) * 8
+        self._clear_hashes()
+        if self.max_spill_bytes is not None and \
+                self._spilled_bytes > self.max_spill_bytes:
+            self._fall_back_to_bloom()
+
+    def _spilled_partitions(self):
+        for partition in range(self.partitions):
+            path = self._partition_path(partition)
+            if os.path.exists(path):
+                hashes = array('Q')
+                with open(path, 'rb') as f:
+                    hashes.frombytes(f.read())
+                yield hashes
+
+    def _fall_back_to_bloom(self):
+        self._bloom = BloomFilter(capacity=self.bloom_capacity,
+                                  error_rate=self.bloom_error_rate)
+        for hashed in self._hashes:
+            self._bloom.add_hash(hashed)
+        if self._spill_tmpdir is not None:
+            for hashes in self._spilled_partitions():
+                for hashed in hashes:
+                    if self._bloom.add_hash(hashed):
+                        self.duplicate_found = True
+        self.exact = False
+        self._discard()
+
+    def _discard(self):
+        self._clear_hashes()
+        if self.duplicate_found:
+            self._bloom = None
+        if self._spill_tmpdir is not None:
+            self._spill_tmpdir.cleanup()
+            self._spill_tmpdir = None
+
+    def is_unique(self):
+        """Check whether any values were added and every one was distinct.
+
+        Resolves any spilled partitions, so this may read from disk.
+
+        Returns:
+          A boolean
+        """
+        if self.duplicate_found or not self.count:
+            return False
+        if self._spill_tmpdir is not None:
+            self._spill()
+            if self.duplicate_found or not self.exact:
+                return not self.duplicate_found
+            for hashes in self._spilled_partitions():
+                if len(frozenset(hashes)) != len(hashes):
+                    self.duplicate_found = True
+                    self._discard()
+                    break
+        return not self.duplicate_found
+
+    def estimate(self):
+        """Estimate the number of distinct values added.
+
+        Returns:
+          An int
+        """
+        return self.hll.estimate()
@@ -20,6 +20,7 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
+import io
 import unittest
 import schematic
 
@@ -333,6 +334,10 @@ class TestTableDefinitionMethods(unittest.TestCase):
             self.table_definition.get_rows(
                 "dummy_arg", dummy_kwarg="dummy_kwarg")
 
+    def test_typed_rows_defaults_to_strings(self):
+        self.assertEqual([("a", "1", "")],
+                         list(self.table_definition.typed_rows([("a", "1", "")])))
+
 
 class TestSchematicMethods(unittest.TestCase):
     """
@@ -414,3 +419,100 @@ class TestTopLevelFunctions(unittest.TestCase):
                          schematic.schematics.RedshiftSchematic)
         self.assertEqual(schematic.get_schematic_by_name("csv"),
                          schematic.schematics.CSVSchematic)
+
+
+class TestColumnProfileMethods(unittest.TestCase):
+
+    def test_is_notnull_false_without_rows(self):
+        self.assertFalse(schematic.ColumnProfile("test").is_notnull())
+
+    def test_is_notnull_false_with_nulls(self):
+        profile = schematic.ColumnProfile("test")
+        profile.row_count = 2
+        profile.null_count = 1
+        self.assertFalse(profile.is_notnull())
+
+    def test_is_unique_false_without_tracker(self):
+        self.assertFalse(schematic.ColumnProfile("test").is_unique())
+
+    def test_is_unique_uses_tracker(self):
+        profile = schematic.ColumnProfile(
+            "test", distinct=schematic.DistinctTracker())
+        profile.distinct.add("a")
+        self.assertTrue(profile.is_unique())
+
+    def test_negative_tolerance_raises_valueerror(self):
+        with self.assertRaises(ValueError):
+            schematic.ColumnProfile("test", tolerance=-1)
+
+    def test_fractional_tolerance_over_one_raises_valueerror(self):
+        with self.assertRaises(ValueError):
+            schematic.ColumnProfile("test", tolerance=1.5)
+
+    def test_reject_limit_fraction_of_rows(self):
+        profile = schematic.ColumnProfile("test", tolerance=0.1)
+        profile.row_count = 55
+        self.assertEqual(profile.reject_limit(), 5)
+
+
+    def test_iter_rejects_yields_samples_of_rejected_buckets(self):
+        profile = schematic.ColumnProfile("test", tolerance=1)
+        kept = schematic.TypeBucket(None, max_samples=1, index=0)
+        rejected = schematic.TypeBucket(None, max_samples=1, index=1)
+        for row_number, bucket in enumerate([kept, rejected, kept], 1):
+            bucket.add(row_number, str(row_number), None)
+            profile.sample(bucket, row_number, str(row_number))
+        self.assertFalse(kept.sampled)
+        profile.rejected = {1}
+        self.assertEqual(list(profile.iter_rejects()), [(2, "2")])
+        profile.close()
+        self.assertIsNone(profile.samples)
+
+
+class TestRejectWriterMethods(unittest.TestCase):
+
+    def test_write_rows_and_counts(self):
+        handler = io.StringIO()
+        rejects = schematic.RejectWriter(handler)
+        rejects.write("a", [(3, "x"), (9, "y")])
+        rejects.write("b", [])
+        self.assertEqual(handler.getvalue(),
+                         "row_number,column,value\r\n3,a,x\r\n9,a,y\r\n")
+        self.assertEqual(rejects.counts, {"a": 2, "b": 0})
+        self.assertEqual(rejects.total(), 2)
+
+
+class TestAdaptiveBatchSizeMethods(unittest.TestCase):
+
+    def test_grows_until_throughput_plateaus(self):
+        batch_size = schematic.AdaptiveBatchSize(initial_size=100, min_size=10, max_size=10000)
+        # 10 bytes/s per byte of batch up to 400 bytes, then no better
+        for _ in range(5):
+            size = batch_size.size
+            batch_size.record(1, size, size / (10.0 * min(size, 400)))
+        self.assertTrue(batch_size.settled)
+        self.assertEqual(400, batch_size.size)
+        self.assertEqual([100, 200, 400, 800, 400],
+                         [batch["size"] for batch in batch_size.batches])
+
+    def test_capped_at_max_size(self):
+        batch_size = schematic.AdaptiveBatchSize(initial_size=100, min_size=10, max_size=300)
+        for rate in [1.0, 2.0, 3.0, 4.0]:
+            batch_size.record(1, batch_size.size, batch_size.size / (rate * batch_size.size))
+        self.assertEqual(300, batch_size.size)
+
+    def test_ignores_partial_batches(self):
+        batch_size = schematic.AdaptiveBatchSize(initial_size=100, min_size=10)
+        batch_size.record(1, 10, 1.0)
+        self.assertEqual(100, batch_size.size)
+        self.assertEqual(1, len(batch_size.batches))
+
+    def test_backs_off_when_slow_or_failing(self):
+        batch_size = schematic.AdaptiveBatchSize(initial_size=800, min_size=100,
+                                                 slow_seconds=5.0)
+        batch_size.record(1, 800, 10.0)
+        self.assertEqual(400, batch_size.size)
+        for _ in range(5):
+            batch_size.backoff()
+        self.assertEqual(100, batch_size.size)
+        self.assertFalse(batch_size.settled)
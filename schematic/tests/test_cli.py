@@ -21,6 +21,8 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 import schematic
+import os
+import tempfile
 import unittest
 from click.testing import CliRunner
 
@@ -33,3 +35,26 @@ class TestCLICommands(unittest.TestCase):
     def test_top_level_runs(self):
         result = self.runner.invoke(schematic.cli, [])
         self.assertEqual(result.exit_code, 0)
+
+    def test_delta(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = {name: os.path.join(tmp, name) for name in
+                     ["day1.csv", "day2.csv", "day1.idx", "day2.idx", "out.csv", "deleted.csv"]}
+            with open(paths["day1.csv"], "w") as f:
+                f.write("id,name\n1,a\n2,b\n3,c\n")
+            with open(paths["day2.csv"], "w") as f:
+                f.write("id,name\n1,a\n2,B\n4,d\n")
+            result = self.runner.invoke(schematic.cli, [
+                "delta", paths["day1.csv"], paths["out.csv"],
+                "--key", "id", "--index", paths["day1.idx"]])
+            self.assertEqual(result.exit_code, 0, result.output)
+            result = self.runner.invoke(schematic.cli, [
+                "delta", paths["day2.csv"], paths["out.csv"], "--key", "id",
+                "--index", paths["day2.idx"], "--previous", paths["day1.idx"],
+                "--deleted", paths["deleted.csv"]])
+            self.assertEqual(result.exit_code, 0, result.output)
+            self.assertIn("1 inserted, 1 updated, 1 deleted", result.output)
+            with open(paths["out.csv"]) as f:
+                self.assertEqual("id,name\n2,B\n4,d\n", f.read())
+            with open(paths["deleted.csv"]) as f:
+                self.assertEqual("id\n3\n", f.read())
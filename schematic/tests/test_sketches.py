@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2019 Cody J. Hanson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import unittest
+import schematic
+
+
+class TestBloomFilterMethods(unittest.TestCase):
+
+    def test_contains_added_values(self):
+        bloom = schematic.BloomFilter(capacity=1000)
+        for i in range(1000):
+            bloom.add(str(i))
+        for i in range(1000):
+            self.assertIn(str(i), bloom)
+
+    def test_add_returns_false_for_new_value(self):
+        bloom = schematic.BloomFilter(capacity=1000)
+        self.assertFalse(bloom.add("new"))
+        self.assertTrue(bloom.add("new"))
+
+    def test_false_positive_rate_near_error_rate(self):
+        bloom = schematic.BloomFilter(capacity=10000, error_rate=0.01)
+        for i in range(10000):
+            bloom.add(str(i))
+        false_positives = sum(
+            1 for i in range(10000, 20000) if str(i) in bloom)
+        self.assertLess(false_positives, 300)
+
+
+    def test_digests(self):
+        bloom = schematic.BloomFilter(capacity=1000, error_rate=0.01)
+        digests = [schematic.row_digest((str(i),)) for i in range(2000)]
+        self.assertFalse(bloom.add_digest(digests[0]))
+        for digest in digests[:1000]:
+            bloom.add_digest(digest)
+        self.assertTrue(all(bloom.contains_digest(digest) for digest in digests[:1000]))
+        self.assertLess(sum(bloom.contains_digest(digest) for digest in digests[1000:]), 30)
+
+
+class TestRowDigest(unittest.TestCase):
+
+    def test_values_are_length_prefixed(self):
+        self.assertNotEqual(schematic.row_digest(("a\x1fb", "c")),
+                            schematic.row_digest(("a", "b\x1fc")))
+        self.assertNotEqual(schematic.row_digest(("ab", "")),
+                            schematic.row_digest(("a", "b")))
+
+    def test_digest_size(self):
+        self.assertEqual(8, len(schematic.row_digest(("a",), digest_size=8)))
+
+
+class TestHyperLogLogMethods(unittest.TestCase):
+
+    def test_estimate_small_cardinality(self):
+        hll = schematic.HyperLogLog()
+        for i in range(100):
+            hll.add(str(i))
+            hll.add(str(i))
+        self.assertAlmostEqual(hll.estimate(), 100, delta=5)
+
+    def test_estimate_large_cardinality(self):
+        hll = schematic.HyperLogLog()
+        for i in range(200000):
+            hll.add(str(i))
+        self.assertAlmostEqual(hll.estimate(), 200000, delta=200000 * 0.05)
+
+    def test_invalid_precision_raises_valueerror(self):
+        with self.assertRaises(ValueError):
+            schematic.HyperLogLog(precision=2)
+
+
+class TestDistinctTrackerMethods(unittest.TestCase):
+
+    def test_is_unique_in_memory(self):
+        tracker = schematic.DistinctTracker()
+        for i in range(100):
+            tracker.add(str(i))
+        self.assertTrue(tracker.is_unique())
+        tracker.add("5")
+        self.assertFalse(tracker.is_unique())
+
+    def test_is_unique_after_spilling(self):
+        tracker = schematic.DistinctTracker(memory_limit=10, partitions=4)
+        for i in range(1000):
+            tracker.add(str(i))
+        self.assertTrue(tracker.exact)
+        self.assertTrue(tracker.is_unique())
+
+    def test_duplicate_found_across_spills(self):
+        tracker = schematic.DistinctTracker(memory_limit=10, partitions=4)
+        for i in range(1000):
+            tracker.add(str(i))
+        tracker.add("3")
+        self.assertFalse(tracker.is_unique())
+
+    def test_falls_back_to_bloom_without_spill(self):
+        tracker = schematic.DistinctTracker(memory_limit=10,
+                                            spill=False,
+                                            bloom_capacity=10000)
+        for i in range(1000):
+            tracker.add(str(i))
+        self.assertFalse(tracker.exact)
+        tracker.add("999")
+        self.assertFalse(tracker.is_unique())
+
+    def test_falls_back_to_bloom_over_max_spill_bytes(self):
+        tracker = schematic.DistinctTracker(memory_limit=10,
+                                            max_spill_bytes=100,
+                                            bloom_capacity=10000)
+        for i in range(1000):
+            tracker.add(str(i))
+        self.assertFalse(tracker.exact)
+        tracker.add("1")
+        self.assertFalse(tracker.is_unique())
+
+    def test_not_unique_without_values(self):
+        self.assertFalse(schematic.DistinctTracker().is_unique())
+
+    def test_budget_shared_between_trackers(self):
+        budget = schematic.DistinctBudget(memory_limit=100)
+        trackers = [schematic.DistinctTracker(budget=budget, partitions=4)
+                    for _ in range(3)]
+        for i in range(1000):
+            for tracker in trackers:
+                tracker.add(str(i))
+                self.assertLess(budget.used, 100)
+        self.assertEqual(budget.used, sum(len(tracker._hashes) for tracker in trackers))
+        self.assertTrue(all(tracker.is_unique() for tracker in trackers))
+
+    def test_estimate_stops_tracker_with_duplicates_before_spilling(self):
+        tracker = schematic.DistinctTracker(memory_limit=100, partitions=4)
+        for i in range(100):
+            tracker.add(str(i))
+        self.assertIsNotNone(tracker._spill_tmpdir)
+        for i in range(100):
+            tracker.add(str(i))
+        self.assertTrue(tracker.duplicate_found)
+        self.assertIsNone(tracker._spill_tmpdir)
+        self.assertFalse(tracker.is_unique())
+
+    def test_estimate(self):
+        tracker = schematic.DistinctTracker(memory_limit=10)
+        for i in range(1000):
+            tracker.add(str(i % 500))
+        self.assertAlmostEqual(tracker.estimate(), 500, delta=25)
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2019 Cody J. Hanson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+import tempfile
+import unittest
+import schematic
+from schematic.schematics.redshift_schematic import *
+
+TEST_CSV = """id,name,score
+1,alice,1.5
+2,bob,2.5
+three,carol,3.5
+4,dave
+5,None,x
+"""
+
+
+class TestValidateMethods(unittest.TestCase):
+
+    def setUp(self):
+        self.table_def = RedshiftTableDefinition(
+            "test", "scores",
+            [RedshiftTableColumn("ID", RedshiftIntType(), notnull=True),
+             RedshiftTableColumn("score", RedshiftDoublePrecisionType()),
+             RedshiftTableColumn("name", RedshiftVarcharType(5))])
+        fd, self.path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, "w") as f:
+            f.write(TEST_CSV)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def check_report(self, report):
+        self.assertFalse(report.is_valid())
+        self.assertEqual(report.row_count, 5)
+        id_col, name_col, score_col = report.columns
+        self.assertEqual((id_col.count, id_col.examples), (1, [(3, "three")]))
+        self.assertEqual(name_col.count, 0)
+        self.assertEqual((score_col.count, score_col.examples), (1, [(5, "x")]))
+        self.assertEqual(report.bad_length_count, 1)
+        self.assertEqual(report.bad_length_examples, [4])
+
+    def test_validate_rows(self):
+        rows = [("1",), ("None",), ("x",)]
+        report = schematic.validate_rows([self.table_def.columns[0]], rows,
+                                         null_strings=["None"])
+        self.assertEqual(report.columns[0].examples, [(2, "None"), (3, "x")])
+
+    def test_validate_rows_decimal_date_timestamp(self):
+        columns = [RedshiftTableColumn("price", RedshiftDecimalType((10, 2))),
+                   RedshiftTableColumn("day", RedshiftDateType()),
+                   RedshiftTableColumn("at", RedshiftTimestampType())]
+        rows = [("12345678.12", "2020-01-10", "2020-01-01 10:00:00"),
+                ("-1.5", "2020-01-20", "2020-01-01T10:00:00.123"),
+                ("123456789.1", "2020-01-32", "2020-01-01 24:00:00"),
+                ("1.123", "2020-13-01", "2020-01-01")]
+        report = schematic.validate_rows(columns, rows)
+        self.assertEqual([column.examples for column in report.columns],
+                         [[(3, "123456789.1"), (4, "1.123")],
+                          [(3, "2020-01-32"), (4, "2020-13-01")],
+                          [(3, "2020-01-01 24:00:00"), (4, "2020-01-01")]])
+
+    def test_validate_csv_in_process(self):
+        self.check_report(schematic.validate_csv(
+            self.table_def, self.path, null_strings=["None"], processes=1,
+            chunk_size=10))
+
+    def test_validate_csv_process_pool(self):
+        self.check_report(schematic.validate_csv(
+            self.table_def, self.path, null_strings=["None"], processes=2,
+            chunk_size=10))
+
+    def test_validate_csv_valid(self):
+        with open(self.path, "w") as f:
+            f.write("id,name,score\n1,alice,1.5\n")
+        report = schematic.validate_csv(self.table_def, self.path, processes=1)
+        self.assertTrue(report.is_valid())
+
+    def test_validate_csv_raises_valueerror_mismatched_header(self):
+        with open(self.path, "w") as f:
+            f.write("id,other,score\n1,alice,1.5\n")
+        with self.assertRaises(ValueError):
+            schematic.validate_csv(self.table_def, self.path, processes=1)
+
+    def test_merge_offsets_row_numbers(self):
+        report = schematic.ValidationReport(["a"], max_examples=2)
+        first = schematic.ValidationReport(["a"])
+        first.row_count = 10
+        first.columns[0].count = 1
+        first.columns[0].examples = [(4, "x")]
+        second = schematic.ValidationReport(["a"])
+        second.row_count = 5
+        second.columns[0].count = 2
+        second.columns[0].examples = [(1, "y"), (2, "z")]
+        report.merge(first)
+        report.merge(second)
+        self.assertEqual(report.row_count, 15)
+        self.assertEqual(report.columns[0].count, 3)
+        self.assertEqual(report.columns[0].examples, [(4, "x"), (11, "y")])
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2019 Cody J. Hanson
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Check that data fits an existing TableDefinition without
+inferring anything.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from schematic import DictableMixin
+from schematic.schematics import csv_schematic
+
+
+class ColumnViolations(DictableMixin):
+    """The values in a column that don't fit its type.
+
+    Attributes:
+      name: The name of the column
+      count: The number of values that don't fit
+      examples: list of (row_number, value) tuples for the first values that don't fit
+    """
+
+    def __init__(self, name, count=0, examples=None):
+        self.name = name
+        self.count = count
+        self.examples = examples or []
+
+
+class ValidationReport(DictableMixin):
+    """The result of validating rows against a TableDefinition.
+
+    Row numbers are 1-indexed and don't count a header row.
+
+    Attributes:
+      row_count: The number of rows validated
+      columns: list of ColumnViolations, one for each column in the TableDefinition
+      bad_length_count: The number of rows with the wrong number of values
+      bad_length_examples: list of row numbers for the first rows with the
+                           wrong number of values
+      max_examples: The most examples to keep for each column
+    """
+
+    def __init__(self, column_names, max_examples=10):
+        self.row_count = 0
+        self.columns = [ColumnViolations(name) for name in column_names]
+        self.bad_length_count = 0
+        self.bad_length_examples = []
+        self.max_examples = max_examples
+
+    def is_valid(self):
+        """Whether every row fit the TableDefinition."""
+        return not self.bad_length_count and not any(
+            column.count for column in self.columns)
+
+    def violation_count(self):
+        """The total number of values that didn't fit."""
+        return sum(column.count for column in self.columns)
+
+    def merge(self, other):
+        """Add the results of validating the rows that follow this
+        report's rows, e.g. the next chunk of a file.
+
+        Args:
+          other: A ValidationReport for the same columns
+        """
+        offset = self.row_count
+        for column, other_column in zip(self.columns, other.columns):
+            column.count += other_column.count
+            room = self.max_examples - len(column.examples)
+            column.examples.extend(
+                (row_number + offset, value)
+                for row_number, value in other_column.examples[:room])
+        self.bad_length_count += other.bad_length_count
+        room = self.max_examples - len(self.bad_length_examples)
+        self.bad_length_examples.extend(
+            row_number + offset for row_number in other.bad_length_examples[:room])
+        self.row_count += other.row_count
+
+
+def validate_rows(columns, rows, null_strings=(), max_examples=10):
+    """Check that every value in rows fits the type of its column.
+
+    Null strings only fit columns without a NOT NULL constraint.
+
+    Args:
+      columns: list of TableColumns, in the same order as the values in each row
+      rows: An iterable of tuples of values
+      null_strings: Values to treat as null, besides each column's own null_strings
+      max_examples: The most offending values to keep for each column
+    Returns:
+      A ValidationReport
+    """
+    report = ValidationReport([column.name for column in columns],
+                              max_examples=max_examples)
+    null_strings = frozenset(null_strings)
+    checks = [(column.column_type.value_is_compatible,
+               null_strings.union(getattr(column, 'null_strings', ())),
+               getattr(column, 'notnull', False),
+               violations)
+              for column, violations in zip(columns, report.columns)]
+    num_columns = len(columns)
+    row_number = 0
+    for row_number, row in enumerate(rows, 1):
+        if len(row) != num_columns:
+            report.bad_length_count += 1
+            if len(report.bad_length_examples) < max_examples:
+                report.bad_length_examples.append(row_number)
+            continue
+        for (is_compatible, nulls, notnull, violations), value in zip(checks, row):
+            if value in nulls:
+                if not notnull:
+                    continue
+            elif is_compatible(value):
+                continue
+            violations.count += 1
+            if len(violations.examples) < max_examples:
+                violations.examples.append((row_number, value))
+    report.row_count = row_number
+    return report
+
+
+def _validate_chunk(args):
+    columns, file_path, start, end, null_strings, max_examples = args
+    return validate_rows(columns,
+                         csv_schematic.read_rows(file_path, start, end),
+                         null_strings=null_strings,
+                         max_examples=max_examples)
+
+
+def validate_csv(table_def,
+                 file_path,
+                 null_strings=(),
+                 processes=None,
+                 chunk_size=csv_schematic.DEFAULT_CHUNK_SIZE,
+                 max_examples=10):
+    """Check that every value in a CSV file fits the type of its column
+    in table_def, validating chunks of the file in a process pool.
+
+    The CSV's header is matched to table_def's columns by name, ignoring case.
+
+    Args:
+      table_def: The TableDefinition to validate against, e.g. from
+                 RedshiftTableDefinition.from_source
+      file_path: Path to the CSV file
+      null_strings: Values to treat as null
+      processes: The number of worker processes, or None for one per CPU.
+                 With 1, chunks are validated in this process.
+      chunk_size: The approximate size of each chunk, in bytes
+      max_examples: The most offending values to keep for each column
+    Returns:
+      A ValidationReport
+    Raises:
+      ValueError: If the CSV's header doesn't match table_def's columns
+    """
+    with open(file_path) as csv_file:
+        header = csv_schematic.CSVTableDefinition.from_source(
+            csv_file).column_names()
+    columns_by_name = {column.name.upper(): column for column in table_def.columns}
+    if len(header) != len(table_def.columns) or \
+            any(name.upper() not in columns_by_name for name in header):
+        raise ValueError(
+            "CSV columns {} don't match the columns of {}: {}".format(
+                header, table_def.name, table_def.column_names()))
+    columns = [columns_by_name[name.upper()] for name in header]
+    tasks = [(columns, file_path, start, end, tuple(null_strings), max_examples)
+             for start, end in csv_schematic.chunk_offsets(file_path, chunk_size)]
+    report = ValidationReport(header, max_examples=max_examples)
+    if processes == 1:
+        for chunk_report in map(_validate_chunk, tasks):
+            report.merge(chunk_report)
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            for chunk_report in executor.map(_validate_chunk, tasks):
+                report.merge(chunk_report)
+    return report